@@ -61,6 +61,22 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
 }
 
+# Cache odpowiedzi API i liczniki wersji modeli (TOOLS/wersje.py). Pamięć
+# procesu wystarcza dla jednego procesu - przy kilku workerach na jednym
+# serwerze użyć FileBasedCache (LOCATION: katalog), przy kilku serwerach
+# Redis / Memcached.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    }
+}
+TOOLS_CACHE_ODPOWIEDZI = 'default'
+
+# Broker zdarzeń czasu rzeczywistego (TOOLS/zdarzenia.py). LokalnyBroker działa
+# w obrębie jednego procesu - przy kilku procesach podać broker współdzielony.
+TOOLS_BROKER_ZDARZEN = 'TOOLS.zdarzenia.LokalnyBroker'
+
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
@@ -4,7 +4,8 @@ from .models import (
     Kategoria, Podkategoria, NarzedzieMagazynowe, EgzemplarzNarzedzia,
     Lokalizacja, Maszyna, HistoriaUzyciaNarzedzia, FakturaZakupu,
     Dostawca, Pracownik, Uszkodzenie, Zamowienie, PozycjaZamowienia,
-    RealizacjaZamowienia, PozycjaRealizacji
+    RealizacjaZamowienia, PozycjaRealizacji, StanMagazynowy, LicznikZamowien,
+    HistoriaCen, AktualnaCena, PrognozaZuzycia, WiadomoscEmail
 )
 
 
@@ -81,11 +82,27 @@ class EgzemplarzNarzedziaAdmin(admin.ModelAdmin):
     ordering = ['-data_zakupu']
 
 
+@admin.register(StanMagazynowy)
+class StanMagazynowyAdmin(admin.ModelAdmin):
+    list_display = ['narzedzie_typ', 'ilosc_nowych', 'ilosc_uzywanych_dostepnych', 'ilosc_w_uzyciu', 'calkowita_ilosc', 'data_aktualizacji']
+    search_fields = ['narzedzie_typ__opis', 'narzedzie_typ__numer_katalogowy']
+    raw_id_fields = ['narzedzie_typ']
+    readonly_fields = ['ilosc_nowych', 'ilosc_uzywanych_dostepnych', 'ilosc_w_uzyciu', 'calkowita_ilosc', 'data_aktualizacji']
+
+
+@admin.register(PrognozaZuzycia)
+class PrognozaZuzyciaAdmin(admin.ModelAdmin):
+    list_display = ['narzedzie_typ', 'zuzycie_dzienne', 'czas_dostawy_dni', 'zapas_bezpieczenstwa', 'zapotrzebowanie', 'data_obliczenia']
+    search_fields = ['narzedzie_typ__opis', 'narzedzie_typ__numer_katalogowy']
+    raw_id_fields = ['narzedzie_typ']
+    readonly_fields = ['zuzycie_dzienne', 'odchylenie_dzienne', 'czas_dostawy_dni', 'zapas_bezpieczenstwa', 'zapotrzebowanie', 'data_obliczenia']
+
+
 @admin.register(HistoriaUzyciaNarzedzia)
 class HistoriaUzyciaNarzedziaAdmin(admin.ModelAdmin):
     list_display = ['egzemplarz', 'pracownik', 'maszyna', 'data_wydania', 'data_zwrotu']
     list_filter = ['data_wydania', 'data_zwrotu', 'maszyna']
-    search_fields = ['egzemplarz__narzedzie_typ__opis', 'pracownik__nazwisko', 'pracownik__imie']
+    search_fields = ['narzedzie_typ__opis', 'pracownik__nazwisko', 'pracownik__imie']
     raw_id_fields = ['egzemplarz', 'maszyna', 'pracownik']
     date_hierarchy = 'data_wydania'
     ordering = ['-data_wydania']
@@ -118,6 +135,49 @@ class ZamowienieAdmin(admin.ModelAdmin):
     inlines = [PozycjaZamowieniaInline]
 
 
+@admin.register(WiadomoscEmail)
+class WiadomoscEmailAdmin(admin.ModelAdmin):
+    list_display = ['temat', 'odbiorca', 'status', 'liczba_prob', 'data_utworzenia', 'data_wyslania']
+    list_filter = ['status', 'data_utworzenia']
+    search_fields = ['temat', 'odbiorca', 'zamowienie__numer']
+    date_hierarchy = 'data_utworzenia'
+    raw_id_fields = ['zamowienie']
+    readonly_fields = ['tresc_html', 'liczba_prob', 'ostatni_blad', 'data_utworzenia', 'data_wyslania']
+    actions = ['ponow_wysylke']
+
+    @admin.action(description='Ponów wysyłkę zaznaczonych wiadomości')
+    def ponow_wysylke(self, request, queryset):
+        from django.utils import timezone
+        liczba = queryset.exclude(status='wyslana').update(
+            status='oczekuje', liczba_prob=0, nastepna_proba=timezone.now()
+        )
+        self.message_user(request, f'Ponowiono wysyłkę {liczba} wiadomości.')
+
+
+@admin.register(LicznikZamowien)
+class LicznikZamowienAdmin(admin.ModelAdmin):
+    list_display = ['rok', 'miesiac', 'ostatni_numer']
+    ordering = ['-rok', '-miesiac']
+
+
+@admin.register(HistoriaCen)
+class HistoriaCenAdmin(admin.ModelAdmin):
+    list_display = ['narzedzie_typ', 'dostawca', 'cena_jednostkowa', 'data_ceny']
+    list_filter = ['dostawca']
+    search_fields = ['narzedzie_typ__opis', 'narzedzie_typ__numer_katalogowy']
+    raw_id_fields = ['narzedzie_typ', 'dostawca', 'pozycja_zamowienia']
+    date_hierarchy = 'data_ceny'
+
+
+@admin.register(AktualnaCena)
+class AktualnaCenaAdmin(admin.ModelAdmin):
+    list_display = ['narzedzie_typ', 'dostawca', 'cena_jednostkowa', 'data_ceny']
+    list_filter = ['dostawca']
+    search_fields = ['narzedzie_typ__opis', 'narzedzie_typ__numer_katalogowy']
+    raw_id_fields = ['narzedzie_typ', 'dostawca']
+    readonly_fields = ['cena_jednostkowa', 'data_ceny']
+
+
 @admin.register(PozycjaZamowienia)
 class PozycjaZamowieniaAdmin(admin.ModelAdmin):
     list_display = ['zamowienie', 'narzedzie_typ', 'ilosc_zamowiona', 'jednostka', 'ilosc_w_komplecie', 'ilosc_dostarczona', 'zrealizowane']
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ToolsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'TOOLS'
+
+    def ready(self):
+        from . import signals  # noqa: F401
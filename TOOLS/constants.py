@@ -39,4 +39,8 @@ STANY_PO_ZWROCIE = [
     StanEgzemplarza.USZKODZONE_REGENERACJA,
 ]
 
+# Statusy zamówień, których niedostarczone pozycje liczą się jako "w drodze"
+STATUSY_ZAMOWIEN_W_DRODZE = ['sent', 'partially_received']
 
+# Statusy zamówień, które po wysłaniu emaila do dostawcy przechodzą w 'sent'
+STATUSY_ZAMOWIEN_PRZED_WYSYLKA = ['draft', 'verified']
@@ -0,0 +1,59 @@
+"""
+Optymalizacja limitów min/max narzędzi na podstawie historii wydań i uszkodzeń.
+
+Bez --zastosuj komenda tylko wypisuje propozycje (do przeglądu).
+
+Użycie:
+    python manage.py optymalizuj_limity
+    python manage.py optymalizuj_limity --dni 730
+    python manage.py optymalizuj_limity --zastosuj
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from TOOLS.services import OptymalizatorLimitowService
+
+
+class Command(BaseCommand):
+    help = 'Proponuje (i opcjonalnie zapisuje) limity min/max dla narzędzi z ruchem w historii.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dni',
+            type=int,
+            default=OptymalizatorLimitowService.OKRES_HISTORII_DNI,
+            help=f'Długość analizowanej historii w dniach (domyślnie {OptymalizatorLimitowService.OKRES_HISTORII_DNI})'
+        )
+        parser.add_argument(
+            '--zastosuj',
+            action='store_true',
+            help='Zapisz zaproponowane limity'
+        )
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        propozycje = OptymalizatorLimitowService.propozycje(okres_dni=options['dni'])
+
+        for p in propozycje:
+            self.stdout.write(
+                f"[{p['id']}] {p['opis'][:40]:<40} "
+                f"min {p['stan_minimalny']['obecny']} -> {p['stan_minimalny']['proponowany']}, "
+                f"max {p['stan_maksymalny']['obecny']} -> {p['stan_maksymalny']['proponowany']}, "
+                f"obsługa {p['poziom_obslugi']['obecny']:.0%} -> {p['poziom_obslugi']['proponowany']:.0%}, "
+                f"średni stan {p['sredni_stan']['obecny']} -> {p['sredni_stan']['proponowany']}"
+            )
+
+        self.stdout.write(f'Propozycji: {len(propozycje)} (w {time.monotonic() - start:.1f} s).')
+
+        if options['zastosuj'] and propozycje:
+            zastosowane, _ = OptymalizatorLimitowService.zastosuj([
+                {
+                    'id': p['id'],
+                    'stan_minimalny': p['stan_minimalny']['proponowany'],
+                    'stan_maksymalny': p['stan_maksymalny']['proponowany'],
+                }
+                for p in propozycje
+            ])
+            self.stdout.write(self.style.SUCCESS(f'Zapisano limity dla {len(zastosowane)} narzędzi.'))
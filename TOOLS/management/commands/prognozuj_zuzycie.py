@@ -0,0 +1,44 @@
+"""
+Wsadowe przeliczenie prognoz zużycia narzędzi (tabela PrognozaZuzycia).
+
+Przeznaczona do uruchamiania z harmonogramu, np. co noc (cron):
+    0 2 * * * cd /sciezka/do/projektu && python manage.py prognozuj_zuzycie
+
+Użycie:
+    python manage.py prognozuj_zuzycie
+    python manage.py prognozuj_zuzycie --dni 180
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from TOOLS.services import PrognozaZuzyciaService
+
+
+class Command(BaseCommand):
+    help = 'Przelicza prognozy zużycia i zapotrzebowania dla wszystkich narzędzi.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dni',
+            type=int,
+            default=PrognozaZuzyciaService.OKRES_HISTORII_DNI,
+            help=f'Długość analizowanej historii w dniach (domyślnie {PrognozaZuzyciaService.OKRES_HISTORII_DNI})'
+        )
+        parser.add_argument(
+            '--paczka',
+            type=int,
+            default=1000,
+            help='Liczba prognoz zapisywanych jednym poleceniem (domyślnie 1000)'
+        )
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        przeliczone = PrognozaZuzyciaService.przelicz_wszystkie(
+            okres_dni=options['dni'],
+            rozmiar_paczki=options['paczka']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Przeliczono prognozy dla {przeliczone} narzędzi w {time.monotonic() - start:.1f} s.'
+        ))
@@ -0,0 +1,27 @@
+"""
+Przebudowa zestawienia stanów magazynowych (tabela StanMagazynowy).
+
+Użycie:
+    python manage.py przebuduj_stany
+    python manage.py przebuduj_stany --paczka 500
+"""
+
+from django.core.management.base import BaseCommand
+
+from TOOLS.services import StanMagazynowyService
+
+
+class Command(BaseCommand):
+    help = 'Przelicza od zera tabelę StanMagazynowy dla wszystkich narzędzi (rebuild).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--paczka',
+            type=int,
+            default=1000,
+            help='Liczba narzędzi przeliczanych w jednej transakcji (domyślnie 1000)'
+        )
+
+    def handle(self, *args, **options):
+        przeliczone = StanMagazynowyService.przebuduj(rozmiar_paczki=options['paczka'])
+        self.stdout.write(self.style.SUCCESS(f'Przeliczono stany dla {przeliczone} narzędzi.'))
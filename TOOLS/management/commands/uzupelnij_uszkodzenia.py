@@ -0,0 +1,28 @@
+"""
+Uzupełnienie migawek danych egzemplarzy we wpisach archiwum uszkodzeń
+zgłoszonych przed ich wprowadzeniem (narzędzie, lokalizacja, maszyna, stan).
+
+Użycie:
+    python manage.py uzupelnij_uszkodzenia
+    python manage.py uzupelnij_uszkodzenia --paczka 500
+"""
+
+from django.core.management.base import BaseCommand
+
+from TOOLS.services import UszkodzenieService
+
+
+class Command(BaseCommand):
+    help = 'Zapisuje migawkę danych egzemplarza we wpisach archiwum uszkodzeń, które jej nie mają.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--paczka',
+            type=int,
+            default=1000,
+            help='Liczba wpisów uzupełnianych w jednej transakcji (domyślnie 1000)'
+        )
+
+    def handle(self, *args, **options):
+        uzupelnione = UszkodzenieService.uzupelnij_archiwum(rozmiar_paczki=options['paczka'])
+        self.stdout.write(self.style.SUCCESS(f'Uzupełniono {uzupelnione} wpisów archiwum uszkodzeń.'))
@@ -0,0 +1,25 @@
+"""
+Czyszczenie śladów usuniętych obiektów (tabela UsunietyObiekt) starszych
+niż okres retencji synchronizacji przyrostowej - klient z tak starym
+tokenem i tak dostaje pełną listę.
+
+Przeznaczona do uruchamiania z harmonogramu, np. raz na dobę (cron):
+    30 2 * * * cd /sciezka/do/projektu && python manage.py wyczysc_usuniete
+
+Użycie:
+    python manage.py wyczysc_usuniete
+"""
+
+from django.core.management.base import BaseCommand
+
+from TOOLS.services import SledzenieZmianService
+
+
+class Command(BaseCommand):
+    help = 'Usuwa ślady usuniętych obiektów starsze niż okres retencji synchronizacji.'
+
+    def handle(self, *args, **options):
+        usuniete = SledzenieZmianService.wyczysc()
+        self.stdout.write(self.style.SUCCESS(
+            f'Usunięto {usuniete} śladów starszych niż {SledzenieZmianService.RETENCJA.days} dni.'
+        ))
@@ -0,0 +1,72 @@
+"""
+Wysyłka wiadomości z kolejki email (tabela WiadomoscEmail).
+
+Bez opcji wysyła wszystkie wiadomości gotowe do wysyłki i kończy pracę -
+do uruchamiania z harmonogramu, np. co minutę (cron):
+    * * * * * cd /sciezka/do/projektu && python manage.py wyslij_emaile
+
+Z opcją --petla działa jako stały proces (np. usługa systemd).
+
+Użycie:
+    python manage.py wyslij_emaile
+    python manage.py wyslij_emaile --petla --interwal 10
+    python manage.py wyslij_emaile --watki 2
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from TOOLS.services import WysylkaEmailService
+
+
+class Command(BaseCommand):
+    help = 'Wysyła oczekujące wiadomości z kolejki email.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--petla',
+            action='store_true',
+            help='Działaj bez końca, sprawdzając kolejkę co --interwal sekund'
+        )
+        parser.add_argument(
+            '--interwal',
+            type=float,
+            default=30,
+            help='Odstęp między sprawdzeniami kolejki w trybie --petla (domyślnie 30 s)'
+        )
+        parser.add_argument(
+            '--paczka',
+            type=int,
+            default=WysylkaEmailService.ROZMIAR_PACZKI,
+            help=f'Liczba wiadomości wysyłanych jednym połączeniem (domyślnie {WysylkaEmailService.ROZMIAR_PACZKI})'
+        )
+
+        parser.add_argument(
+            '--watki',
+            type=int,
+            default=1,
+            help=f'Liczba równoległych połączeń SMTP (najwyżej {WysylkaEmailService.MAKS_WATKOW}, domyślnie 1)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            wyslane, bledy = self._oproznij(options['paczka'], options['watki'])
+            if wyslane or bledy or not options['petla']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Wysłano {wyslane} wiadomości, nieudanych prób: {bledy}.'
+                ))
+            if not options['petla']:
+                return
+            time.sleep(options['interwal'])
+
+    @staticmethod
+    def _oproznij(paczka, watki):
+        """Wysyła paczki, dopóki w kolejce są wiadomości gotowe do wysyłki."""
+        wyslane = bledy = 0
+        while True:
+            wynik = WysylkaEmailService.przetworz(limit=paczka, watki=watki)
+            wyslane += wynik['wyslane']
+            bledy += wynik['bledy']
+            if wynik['wyslane'] + wynik['bledy'] < paczka:
+                return wyslane, bledy
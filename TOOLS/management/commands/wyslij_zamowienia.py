@@ -0,0 +1,40 @@
+"""
+Wysyłka wszystkich zamówień roboczych (status 'draft') do dostawców.
+
+Wiadomości wysyłane są od razu, jedną sesją SMTP (lub kilkoma równolegle
+z opcją --watki); nieudane zostają w kolejce email i ponowi je
+komenda wyslij_emaile.
+
+Użycie:
+    python manage.py wyslij_zamowienia
+    python manage.py wyslij_zamowienia --watki 2
+"""
+
+from django.core.management.base import BaseCommand
+
+from TOOLS.services import WysylkaEmailService
+
+
+class Command(BaseCommand):
+    help = 'Wysyła emailem wszystkie zamówienia robocze do dostawców.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watki',
+            type=int,
+            default=1,
+            help=f'Liczba równoległych połączeń SMTP (najwyżej {WysylkaEmailService.MAKS_WATKOW}, domyślnie 1)'
+        )
+
+    def handle(self, *args, **options):
+        wyniki = WysylkaEmailService.wyslij_zamowienia(watki=options['watki'])
+        if not wyniki:
+            self.stdout.write('Brak zamówień roboczych do wysłania.')
+            return
+
+        for wynik in wyniki:
+            styl = self.style.SUCCESS if wynik['status'] == 'wyslane' else self.style.WARNING
+            self.stdout.write(styl(f"{wynik['numer']}: {wynik['message']}"))
+
+        wyslane = sum(1 for wynik in wyniki if wynik['status'] == 'wyslane')
+        self.stdout.write(self.style.SUCCESS(f'Wysłano {wyslane} z {len(wyniki)} zamówień.'))
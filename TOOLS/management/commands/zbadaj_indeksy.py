@@ -0,0 +1,293 @@
+"""
+Pomiar zapytań objętych indeksami złożonymi (migracje 0033_indeksy_zapytan
+i 0034_historia_narzedzie_typ): plany zapytań i czasy z indeksami i bez nich.
+
+Komenda zasila bazę danymi testowymi, mierzy zapytania serwisów i widoków
+z indeksami, usuwa je (przywracając zastąpione indeksy kluczy obcych),
+mierzy ponownie i wycofuje całą transakcję - dane i indeksy w bazie
+pozostają bez zmian. Wymaga bazy z transakcyjnym DDL (PostgreSQL, SQLite).
+
+Użycie:
+    python manage.py zbadaj_indeksy
+    python manage.py zbadaj_indeksy --narzedzia 2000 --egzemplarze 20
+    python manage.py zbadaj_indeksy --powtorzenia 50 --plany
+"""
+
+import random
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from TOOLS.models import (
+    Kategoria,
+    Podkategoria,
+    Dostawca,
+    Maszyna,
+    Pracownik,
+    NarzedzieMagazynowe,
+    EgzemplarzNarzedzia,
+    HistoriaUzyciaNarzedzia,
+    Zamowienie,
+    PozycjaZamowienia,
+)
+from TOOLS.services import SilnikStanow, PanelMagazynuService
+
+# Badane indeksy: (model, nazwa indeksu, pole klucza obcego, którego
+# pojedynczy indeks został przez niego zastąpiony - lub None)
+BADANE_INDEKSY = [
+    (EgzemplarzNarzedzia, 'egzemplarz_narz_stan', 'narzedzie_typ'),
+    (HistoriaUzyciaNarzedzia, 'historia_aktywne_data_id', None),
+    (HistoriaUzyciaNarzedzia, 'historia_egz_data_wydania', 'egzemplarz'),
+    (HistoriaUzyciaNarzedzia, 'historia_narz_data_wydania', None),
+    (PozycjaZamowienia, 'pozycjazam_narz_zam', 'narzedzie_typ'),
+]
+
+# Wielkość strony list API (KursorPagination)
+ROZMIAR_STRONY = 100
+
+
+class Command(BaseCommand):
+    help = 'Porównuje plany i czasy zapytań magazynu z indeksami złożonymi i bez nich (na danych testowych).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--narzedzia',
+            type=int,
+            default=1000,
+            help='Liczba typów narzędzi (domyślnie 1000)'
+        )
+        parser.add_argument(
+            '--egzemplarze',
+            type=int,
+            default=10,
+            help='Liczba egzemplarzy na narzędzie (domyślnie 10)'
+        )
+        parser.add_argument(
+            '--wypozyczenia',
+            type=int,
+            default=5,
+            help='Liczba wypożyczeń na egzemplarz (domyślnie 5)'
+        )
+        parser.add_argument(
+            '--powtorzenia',
+            type=int,
+            default=20,
+            help='Liczba pomiarów każdego zapytania - podawana jest mediana (domyślnie 20)'
+        )
+        parser.add_argument(
+            '--plany',
+            action='store_true',
+            help='Wypisz plany zapytań (EXPLAIN)'
+        )
+
+    def handle(self, *args, **options):
+        if not connection.features.can_rollback_ddl:
+            raise CommandError('Baza danych nie obsługuje DDL w transakcji - pomiar nie mógłby zostać wycofany.')
+
+        with transaction.atomic():
+            start = time.monotonic()
+            dane = self._zasil(options)
+            self._analizuj()
+            self.stdout.write(
+                f"Dane testowe: {dane['narzedzia']} narzędzi, {dane['egzemplarze']} egzemplarzy, "
+                f"{dane['wypozyczenia']} wypożyczeń, {dane['pozycje']} pozycji zamówień "
+                f"(w {time.monotonic() - start:.1f} s)."
+            )
+
+            scenariusze = self._scenariusze(dane)
+            po = self._zmierz(scenariusze, options['powtorzenia'])
+            self._usun_indeksy()
+            przed = self._zmierz(scenariusze, options['powtorzenia'])
+
+            for nazwa, _ in scenariusze:
+                czas_przed, plany_przed = przed[nazwa]
+                czas_po, plany_po = po[nazwa]
+                self.stdout.write(
+                    f"{nazwa:<50} przed {czas_przed:8.2f} ms   po {czas_po:8.2f} ms   "
+                    f"({czas_przed / czas_po if czas_po else 0:.1f}x)"
+                )
+                if options['plany']:
+                    self._wypisz_plany('przed', plany_przed)
+                    self._wypisz_plany('po', plany_po)
+
+            # Dane testowe i zmiany indeksów nie zostają w bazie
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Pomiar zakończony, zmiany wycofane.'))
+
+    def _zasil(self, options):
+        """Dane testowe o proporcjach magazynu (bulk_create - bez sygnałów)."""
+        los = random.Random(0)
+        znacznik = uuid.uuid4().hex[:8]
+
+        kategoria = Kategoria.objects.create(nazwa=f'Pomiar {znacznik}')
+        podkategoria = Podkategoria.objects.create(nazwa=f'Pomiar {znacznik}', kategoria=kategoria)
+        dostawcy = Dostawca.objects.bulk_create([
+            Dostawca(kod_dostawcy=f'pomiar-{znacznik}-{i}', nazwa_firmy=f'Dostawca {i}') for i in range(5)
+        ])
+        maszyny = Maszyna.objects.bulk_create([
+            Maszyna(nazwa=f'Pomiar {znacznik} {i}') for i in range(10)
+        ])
+        pracownicy = Pracownik.objects.bulk_create([
+            Pracownik(karta=f'pomiar-{znacznik}-{i}', nazwisko=f'Pracownik {i}', imie='Test') for i in range(20)
+        ])
+
+        narzedzia = NarzedzieMagazynowe.objects.bulk_create([
+            NarzedzieMagazynowe(podkategoria=podkategoria, opis=f'Narzędzie {i}')
+            for i in range(options['narzedzia'])
+        ])
+
+        stany = [stan for stan, _ in EgzemplarzNarzedzia.STAN_CHOICES]
+        egzemplarze = EgzemplarzNarzedzia.objects.bulk_create([
+            EgzemplarzNarzedzia(narzedzie_typ=narzedzie, stan=los.choice(stany))
+            for narzedzie in narzedzia
+            for _ in range(options['egzemplarze'])
+        ], batch_size=1000)
+
+        # Wszystkie wypożyczenia zwrócone poza ostatnim co dziesiątego egzemplarza
+        teraz = timezone.now()
+        wypozyczenia = []
+        for egzemplarz in egzemplarze:
+            otwarte = los.random() < 0.1
+            for nr in range(options['wypozyczenia']):
+                ostatnie = nr == options['wypozyczenia'] - 1
+                wypozyczenia.append(HistoriaUzyciaNarzedzia(
+                    egzemplarz=egzemplarz,
+                    narzedzie_typ_id=egzemplarz.narzedzie_typ_id,
+                    maszyna=los.choice(maszyny),
+                    pracownik=los.choice(pracownicy),
+                    data_zwrotu=None if otwarte and ostatnie else teraz,
+                ))
+        wypozyczenia = HistoriaUzyciaNarzedzia.objects.bulk_create(wypozyczenia, batch_size=1000)
+
+        aktywne = []
+        for historia in wypozyczenia:
+            if historia.data_zwrotu is None:
+                historia.egzemplarz.aktywne_wypozyczenie = historia
+                aktywne.append(historia.egzemplarz)
+        EgzemplarzNarzedzia.objects.bulk_update(aktywne, ['aktywne_wypozyczenie'], batch_size=1000)
+
+        # Numery w latach, których nie ma w rzeczywistych danych
+        statusy = [status for status, _ in Zamowienie.STATUS_CHOICES]
+        zamowienia = Zamowienie.objects.bulk_create([
+            Zamowienie(
+                numer=f'{1000 + i // 120}/{i // 10 % 12 + 1:02d}/{i:06d}',
+                dostawca=los.choice(dostawcy),
+                status=los.choice(statusy),
+            )
+            for i in range(max(options['narzedzia'] // 2, 1))
+        ], batch_size=1000)
+        pozycje = PozycjaZamowienia.objects.bulk_create([
+            PozycjaZamowienia(
+                zamowienie=zamowienie,
+                narzedzie_typ=narzedzie,
+                ilosc_zamowiona=los.randint(1, 20),
+                ilosc_dostarczona=0,
+            )
+            for zamowienie in zamowienia
+            for narzedzie in los.sample(narzedzia, min(5, len(narzedzia)))
+        ], batch_size=1000)
+
+        return {
+            'narzedzia': len(narzedzia),
+            'egzemplarze': len(egzemplarze),
+            'wypozyczenia': len(wypozyczenia),
+            'pozycje': len(pozycje),
+            'probka_narzedzi': [n.id for n in los.sample(narzedzia, min(50, len(narzedzia)))],
+            'egzemplarz': egzemplarze[len(egzemplarze) // 2] if egzemplarze else None,
+            'narzedzie_id': narzedzia[0].id if narzedzia else None,
+        }
+
+    def _analizuj(self):
+        """Aktualne statystyki tabel - planer ma wybierać indeksy jak na danych produkcyjnych."""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                for model in (EgzemplarzNarzedzia, HistoriaUzyciaNarzedzia, Zamowienie, PozycjaZamowienia):
+                    cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+            else:
+                cursor.execute('ANALYZE')
+
+    @staticmethod
+    def _scenariusze(dane):
+        """Zapytania w kształcie z serwisów i widoków (services.py, views.py)."""
+        probka = dane['probka_narzedzi']
+        egzemplarz = dane['egzemplarz']
+        pozycje_narzedzia = PozycjaZamowienia.objects.filter(
+            narzedzie_typ_id=dane['narzedzie_id']
+        ).values_list('zamowienie_id', flat=True).distinct()
+
+        return [
+            ('Stany magazynowe (SilnikStanow.dla_narzedzi)', lambda: SilnikStanow.dla_narzedzi(probka)),
+            ('Ilości w drodze (SilnikStanow.w_drodze)', lambda: SilnikStanow.w_drodze(probka)),
+            ('Aktywne wypożyczenia (panel magazynu)', PanelMagazynuService._wypozyczenia),
+            ('Historia ?w_uzyciu=true - pierwsza strona', lambda: list(
+                HistoriaUzyciaNarzedzia.objects.filter(data_zwrotu__isnull=True).order_by(
+                    '-data_wydania', '-id'
+                )[:ROZMIAR_STRONY]
+            )),
+            ('Historia narzędzia ?narzedzie_id= - pierwsza strona', lambda: list(
+                HistoriaUzyciaNarzedzia.objects.filter(narzedzie_typ_id=dane['narzedzie_id']).order_by(
+                    '-data_wydania', '-id'
+                )[:ROZMIAR_STRONY]
+            )),
+            ('Ostatnie wypożyczenie egzemplarza', lambda: egzemplarz.historia.order_by('-data_wydania').first()),
+            ('Zamówienia z narzędziem ?narzedzie_id=', lambda: list(
+                Zamowienie.objects.filter(id__in=pozycje_narzedzia).order_by(
+                    '-data_utworzenia', '-id'
+                )[:ROZMIAR_STRONY]
+            )),
+            ('Numer zamówienia - skan prefiksu', lambda: Zamowienie.objects.filter(
+                numer__startswith='1000/01/'
+            ).order_by('-numer').values_list('numer', flat=True).first()),
+        ]
+
+    def _zmierz(self, scenariusze, powtorzenia):
+        """Mediana czasu (ms) i plany zapytań każdego scenariusza."""
+        wynik = {}
+        for nazwa, funkcja in scenariusze:
+            zapytania = []
+
+            def zapamietaj(execute, sql, params, many, context):
+                zapytania.append((sql, params))
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(zapamietaj):
+                funkcja()
+
+            czasy = []
+            for _ in range(powtorzenia):
+                start = time.perf_counter()
+                funkcja()
+                czasy.append((time.perf_counter() - start) * 1000)
+
+            wynik[nazwa] = (statistics.median(czasy), [self._plan(sql, params) for sql, params in zapytania])
+        return wynik
+
+    @staticmethod
+    def _plan(sql, params):
+        explain = 'EXPLAIN ANALYZE' if connection.vendor == 'postgresql' else 'EXPLAIN QUERY PLAN'
+        with connection.cursor() as cursor:
+            cursor.execute(f'{explain} {sql}', params)
+            return '\n'.join(' '.join(str(kolumna) for kolumna in wiersz) for wiersz in cursor.fetchall())
+
+    def _wypisz_plany(self, etykieta, plany):
+        for plan in plany:
+            self.stdout.write(f'  [{etykieta}]')
+            for linia in plan.splitlines():
+                self.stdout.write(f'    {linia}')
+
+    @staticmethod
+    def _usun_indeksy():
+        """Stan bez indeksów złożonych, z pojedynczymi indeksami kluczy obcych."""
+        # Bez wejścia w kontekst - edytor SQLite nie pozwala na to wewnątrz transakcji,
+        # a pojedyncze CREATE / DROP INDEX tego nie wymagają
+        edytor = connection.schema_editor()
+        for model, nazwa, pole in BADANE_INDEKSY:
+            indeks = next(i for i in model._meta.indexes if i.name == nazwa)
+            edytor.remove_index(model, indeks)
+            if pole:
+                edytor.add_index(model, models.Index(fields=[pole], name=f'pomiar_{nazwa}'[:30]))
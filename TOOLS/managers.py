@@ -150,7 +150,7 @@ class HistoriaUzyciaQuerySet(models.QuerySet):
         """
         Filtruje historię dla konkretnego typu narzędzia.
         """
-        return self.filter(egzemplarz__narzedzie_typ_id=narzedzie_id)
+        return self.filter(narzedzie_typ_id=narzedzie_id)
 
 
 class HistoriaUzyciaManager(models.Manager):
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TOOLS', '0020_alter_egzemplarznarzedzia_stan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historiauzycianarzedzia',
+            name='pracownik_zwracajacy',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='historia_zwrotow', to='TOOLS.pracownik', verbose_name='Pracownik zwracający'),
+        ),
+        migrations.AddField(
+            model_name='pozycjazamowienia',
+            name='kategoria_nazwa',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='pozycjazamowienia',
+            name='narzedzie_opis',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='pozycjazamowienia',
+            name='numer_katalogowy',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='pozycjazamowienia',
+            name='podkategoria_nazwa',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='pozycjazamowienia',
+            name='wartosc_pozycji',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Wartość pozycji = ilość * cena jednostkowa', max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='zamowienie',
+            name='email_docelowy',
+            field=models.EmailField(blank=True, help_text='Email dostawcy w momencie tworzenia zamówienia', max_length=254, null=True),
+        ),
+        migrations.AddField(
+            model_name='zamowienie',
+            name='wartosc_zamowienia',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Łączna wartość zamówienia', max_digits=12),
+        ),
+        migrations.CreateModel(
+            name='PozycjaGeneratora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cena_jednostkowa', models.DecimalField(decimal_places=2, default=0, help_text='Cena jednostkowa w PLN', max_digits=10)),
+                ('ilosc_do_zamowienia', models.PositiveIntegerField(default=0, help_text='Obliczona lub ręcznie edytowana ilość')),
+                ('data_utworzenia', models.DateTimeField(auto_now_add=True)),
+                ('data_modyfikacji', models.DateTimeField(auto_now=True)),
+                ('dostawca', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pozycje_generatora', to='TOOLS.dostawca')),
+                ('narzedzie_typ', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pozycja_generatora', to='TOOLS.narzedziemagazynowe')),
+            ],
+            options={
+                'verbose_name_plural': 'Pozycje generatora zamówień',
+                'ordering': ['narzedzie_typ__podkategoria__kategoria__nazwa', 'narzedzie_typ__opis'],
+            },
+        ),
+    ]
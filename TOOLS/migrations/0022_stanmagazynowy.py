@@ -0,0 +1,65 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def wypelnij_stany(apps, schema_editor):
+    """Wypełnia zestawienie stanów dla istniejących narzędzi."""
+    NarzedzieMagazynowe = apps.get_model('TOOLS', 'NarzedzieMagazynowe')
+    EgzemplarzNarzedzia = apps.get_model('TOOLS', 'EgzemplarzNarzedzia')
+    HistoriaUzyciaNarzedzia = apps.get_model('TOOLS', 'HistoriaUzyciaNarzedzia')
+    StanMagazynowy = apps.get_model('TOOLS', 'StanMagazynowy')
+
+    ilosci = {
+        narzedzie_id: {'nowe': 0, 'uzywane': 0, 'w_uzyciu': 0}
+        for narzedzie_id in NarzedzieMagazynowe.objects.values_list('id', flat=True)
+    }
+
+    for wiersz in EgzemplarzNarzedzia.objects.filter(
+            stan__in=['nowe', 'uzywane']
+    ).values('narzedzie_typ_id', 'stan').annotate(suma=Sum('ilosc_w_komplecie')):
+        ilosci[wiersz['narzedzie_typ_id']][wiersz['stan']] = wiersz['suma'] or 0
+
+    for wiersz in HistoriaUzyciaNarzedzia.objects.filter(
+            data_zwrotu__isnull=True
+    ).values('egzemplarz__narzedzie_typ_id').annotate(suma=Sum('egzemplarz__ilosc_w_komplecie')):
+        ilosci[wiersz['egzemplarz__narzedzie_typ_id']]['w_uzyciu'] = wiersz['suma'] or 0
+
+    StanMagazynowy.objects.bulk_create([
+        StanMagazynowy(
+            narzedzie_typ_id=narzedzie_id,
+            ilosc_nowych=wartosci['nowe'],
+            ilosc_uzywanych_dostepnych=wartosci['uzywane'],
+            ilosc_w_uzyciu=wartosci['w_uzyciu'],
+            calkowita_ilosc=wartosci['nowe'] + wartosci['uzywane'],
+        )
+        for narzedzie_id, wartosci in ilosci.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TOOLS', '0021_historiauzycianarzedzia_pracownik_zwracajacy_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StanMagazynowy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ilosc_nowych', models.PositiveIntegerField(default=0)),
+                ('ilosc_uzywanych_dostepnych', models.PositiveIntegerField(default=0)),
+                ('ilosc_w_uzyciu', models.PositiveIntegerField(default=0)),
+                ('calkowita_ilosc', models.PositiveIntegerField(default=0, help_text='Nowe + używane (suma dostępnych sztuk)')),
+                ('data_aktualizacji', models.DateTimeField(auto_now=True)),
+                ('narzedzie_typ', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stan_magazynowy', to='TOOLS.narzedziemagazynowe')),
+            ],
+            options={
+                'verbose_name_plural': 'Stany magazynowe',
+            },
+        ),
+        migrations.RunPython(wypelnij_stany, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TOOLS', '0022_stanmagazynowy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LicznikZamowien',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rok', models.PositiveIntegerField()),
+                ('miesiac', models.PositiveSmallIntegerField()),
+                ('ostatni_numer', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Liczniki zamówień',
+                'ordering': ['-rok', '-miesiac'],
+                'unique_together': {('rok', 'miesiac')},
+            },
+        ),
+    ]
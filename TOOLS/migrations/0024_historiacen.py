@@ -0,0 +1,76 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def wypelnij_historie_cen(apps, schema_editor):
+    """Wypełnia historię cen i aktualne ceny z istniejących pozycji zamówień."""
+    PozycjaZamowienia = apps.get_model('TOOLS', 'PozycjaZamowienia')
+    HistoriaCen = apps.get_model('TOOLS', 'HistoriaCen')
+    AktualnaCena = apps.get_model('TOOLS', 'AktualnaCena')
+
+    aktualne = {}
+    wpisy = []
+
+    pozycje = PozycjaZamowienia.objects.filter(cena_jednostkowa__isnull=False).values_list(
+        'id', 'narzedzie_typ_id', 'zamowienie__dostawca_id', 'cena_jednostkowa', 'zamowienie__data_utworzenia'
+    ).order_by('zamowienie__data_utworzenia', 'id')
+
+    for pozycja_id, narzedzie_id, dostawca_id, cena, data in pozycje.iterator(chunk_size=2000):
+        wpisy.append(HistoriaCen(
+            narzedzie_typ_id=narzedzie_id,
+            dostawca_id=dostawca_id,
+            pozycja_zamowienia_id=pozycja_id,
+            cena_jednostkowa=cena,
+            data_ceny=data,
+        ))
+        # Pozycje posortowane rosnąco - ostatnia wygrywa
+        aktualne[(narzedzie_id, dostawca_id)] = (cena, data)
+
+    HistoriaCen.objects.bulk_create(wpisy, batch_size=1000)
+    AktualnaCena.objects.bulk_create([
+        AktualnaCena(narzedzie_typ_id=n, dostawca_id=d, cena_jednostkowa=cena, data_ceny=data)
+        for (n, d), (cena, data) in aktualne.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TOOLS', '0023_licznikzamowien'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoriaCen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cena_jednostkowa', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('data_ceny', models.DateTimeField()),
+                ('dostawca', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historia_cen', to='TOOLS.dostawca')),
+                ('narzedzie_typ', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historia_cen', to='TOOLS.narzedziemagazynowe')),
+                ('pozycja_zamowienia', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='wpis_historii_cen', to='TOOLS.pozycjazamowienia')),
+            ],
+            options={
+                'verbose_name_plural': 'Historia cen',
+                'ordering': ['-data_ceny', '-id'],
+                'indexes': [models.Index(fields=['narzedzie_typ', 'dostawca', '-data_ceny'], name='historiacen_narz_dost_data')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AktualnaCena',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cena_jednostkowa', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('data_ceny', models.DateTimeField()),
+                ('dostawca', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aktualne_ceny', to='TOOLS.dostawca')),
+                ('narzedzie_typ', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aktualne_ceny', to='TOOLS.narzedziemagazynowe')),
+            ],
+            options={
+                'verbose_name_plural': 'Aktualne ceny',
+                'unique_together': {('narzedzie_typ', 'dostawca')},
+            },
+        ),
+        migrations.RunPython(wypelnij_historie_cen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def oznacz_wszystkie(apps, schema_editor):
+    """Pierwsze uruchomienie generatora ocenia cały katalog."""
+    NarzedzieMagazynowe = apps.get_model('TOOLS', 'NarzedzieMagazynowe')
+    NarzedzieDoPrzeliczenia = apps.get_model('TOOLS', 'NarzedzieDoPrzeliczenia')
+
+    NarzedzieDoPrzeliczenia.objects.bulk_create([
+        NarzedzieDoPrzeliczenia(narzedzie_typ_id=narzedzie_id)
+        for narzedzie_id in NarzedzieMagazynowe.objects.values_list('id', flat=True)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TOOLS', '0024_historiacen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NarzedzieDoPrzeliczenia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_zmiany', models.DateTimeField(auto_now_add=True)),
+                ('narzedzie_typ', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='do_przeliczenia', to='TOOLS.narzedziemagazynowe')),
+            ],
+            options={
+                'verbose_name_plural': 'Narzędzia do przeliczenia w generatorze',
+            },
+        ),
+        migrations.RunPython(oznacz_wszystkie, migrations.RunPython.noop),
+    ]
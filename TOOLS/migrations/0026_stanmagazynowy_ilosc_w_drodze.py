@@ -0,0 +1,42 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:56
+
+from django.db import migrations, models
+
+
+def wypelnij_w_drodze(apps, schema_editor):
+    """Wylicza ilości w drodze z otwartych zamówień (wysłane / częściowo odebrane)."""
+    PozycjaZamowienia = apps.get_model('TOOLS', 'PozycjaZamowienia')
+    StanMagazynowy = apps.get_model('TOOLS', 'StanMagazynowy')
+
+    w_drodze = {}
+    pozycje = PozycjaZamowienia.objects.filter(
+        zamowienie__status__in=['sent', 'partially_received'],
+        zrealizowane=False
+    ).values_list('narzedzie_typ_id', 'ilosc_zamowiona', 'ilosc_dostarczona', 'jednostka', 'ilosc_w_komplecie')
+
+    for narzedzie_id, zamowiona, dostarczona, jednostka, w_komplecie in pozycje:
+        brakujace = max(zamowiona - dostarczona, 0)
+        if jednostka == 'kompl':
+            brakujace *= w_komplecie
+        w_drodze[narzedzie_id] = w_drodze.get(narzedzie_id, 0) + brakujace
+
+    stany = list(StanMagazynowy.objects.filter(narzedzie_typ_id__in=w_drodze))
+    for stan in stany:
+        stan.ilosc_w_drodze = w_drodze[stan.narzedzie_typ_id]
+    StanMagazynowy.objects.bulk_update(stany, ['ilosc_w_drodze'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TOOLS', '0025_narzedziedoprzeliczenia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stanmagazynowy',
+            name='ilosc_w_drodze',
+            field=models.PositiveIntegerField(default=0, help_text='Sztuki zamówione (wysłane / częściowo odebrane), jeszcze niedostarczone'),
+        ),
+        migrations.RunPython(wypelnij_w_drodze, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TOOLS', '0026_stanmagazynowy_ilosc_w_drodze'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrognozaZuzycia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zuzycie_dzienne', models.DecimalField(decimal_places=4, default=0, help_text='Średnie zużycie w sztukach na dzień', max_digits=10)),
+                ('odchylenie_dzienne', models.DecimalField(decimal_places=4, default=0, help_text='Odchylenie standardowe dziennego zużycia', max_digits=10)),
+                ('czas_dostawy_dni', models.PositiveIntegerField(default=0)),
+                ('zapas_bezpieczenstwa', models.PositiveIntegerField(default=0)),
+                ('zapotrzebowanie', models.PositiveIntegerField(default=0, help_text='Sztuki na czas dostawy i okres przeglądu wraz z zapasem bezpieczeństwa')),
+                ('data_obliczenia', models.DateTimeField(auto_now=True)),
+                ('narzedzie_typ', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='prognoza', to='TOOLS.narzedziemagazynowe')),
+            ],
+            options={
+                'verbose_name_plural': 'Prognozy zużycia',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TOOLS', '0027_prognozazuzycia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WiadomoscEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('odbiorca', models.EmailField(max_length=254)),
+                ('kopia', models.EmailField(blank=True, help_text='Adres DW', max_length=254)),
+                ('temat', models.CharField(max_length=255)),
+                ('tresc_html', models.TextField()),
+                ('status', models.CharField(choices=[('oczekuje', 'Oczekuje'), ('wysylanie', 'W trakcie wysyłki'), ('wyslana', 'Wysłana'), ('blad', 'Błąd')], default='oczekuje', max_length=20)),
+                ('liczba_prob', models.PositiveSmallIntegerField(default=0)),
+                ('nastepna_proba', models.DateTimeField(default=django.utils.timezone.now, help_text='Najwcześniejszy moment kolejnej próby wysyłki')),
+                ('ostatni_blad', models.TextField(blank=True)),
+                ('data_utworzenia', models.DateTimeField(auto_now_add=True)),
+                ('data_wyslania', models.DateTimeField(blank=True, null=True)),
+                ('zamowienie', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='wiadomosci_email', to='TOOLS.zamowienie')),
+            ],
+            options={
+                'verbose_name_plural': 'Wiadomości email',
+                'ordering': ['-data_utworzenia'],
+                'indexes': [models.Index(fields=['status', 'nastepna_proba'], name='wiadomosc_status_proba')],
+            },
+        ),
+    ]
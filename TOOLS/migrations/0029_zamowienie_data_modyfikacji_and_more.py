@@ -0,0 +1,28 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TOOLS', '0028_wiadomoscemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wiadomoscemail',
+            name='zalacznik_csv',
+            field=models.TextField(blank=True, help_text='Treść załącznika CSV (np. pozycje zamówienia)'),
+        ),
+        migrations.AddField(
+            model_name='wiadomoscemail',
+            name='zalacznik_nazwa',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='zamowienie',
+            name='data_modyfikacji',
+            field=models.DateTimeField(auto_now=True, help_text='Zmienia się także przy zmianie pozycji i dostawcy - klucz cache treści emaila'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TOOLS', '0029_zamowienie_data_modyfikacji_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historiauzycianarzedzia',
+            name='data_modyfikacji',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='narzedziemagazynowe',
+            name='data_modyfikacji',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='UsunietyObiekt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('typ', models.CharField(choices=[('narzedzie', 'Narzędzie magazynowe'), ('egzemplarz', 'Egzemplarz narzędzia'), ('historia', 'Historia użycia')], max_length=20)),
+                ('obiekt_id', models.BigIntegerField()),
+                ('data_usuniecia', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Usunięte obiekty',
+                'indexes': [models.Index(fields=['typ', 'data_usuniecia'], name='usunietyobiekt_typ_data')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:36
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def uzupelnij_date_zakupu(apps, schema_editor):
+    """Egzemplarze bez daty zakupu dostają datę modyfikacji - kursor stron nie obsługuje NULL."""
+    EgzemplarzNarzedzia = apps.get_model('TOOLS', 'EgzemplarzNarzedzia')
+    EgzemplarzNarzedzia.objects.filter(data_zakupu__isnull=True).update(data_zakupu=F('data_modyfikacji'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TOOLS', '0030_historiauzycianarzedzia_data_modyfikacji_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(uzupelnij_date_zakupu, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='egzemplarznarzedzia',
+            index=models.Index(fields=['-data_zakupu', '-id'], name='egzemplarz_data_zakupu_id'),
+        ),
+        migrations.AddIndex(
+            model_name='historiauzycianarzedzia',
+            index=models.Index(fields=['-data_wydania', '-id'], name='historia_data_wydania_id'),
+        ),
+        migrations.AddIndex(
+            model_name='realizacjazamowienia',
+            index=models.Index(fields=['-data_realizacji', '-id'], name='realizacja_data_id'),
+        ),
+        migrations.AddIndex(
+            model_name='uszkodzenie',
+            index=models.Index(fields=['-data_uszkodzenia', '-id'], name='uszkodzenie_data_id'),
+        ),
+        migrations.AddIndex(
+            model_name='zamowienie',
+            index=models.Index(fields=['-data_utworzenia', '-id'], name='zamowienie_data_id'),
+        ),
+    ]
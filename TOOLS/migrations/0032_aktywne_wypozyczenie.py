@@ -0,0 +1,50 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def ustaw_aktywne_wypozyczenia(apps, schema_editor):
+    """
+    Zamyka zdublowane otwarte wypożyczenia (starsze dostają datę zwrotu
+    równą wydaniu najnowszego) i ustawia egzemplarzom aktywne wypożyczenie.
+    """
+    HistoriaUzyciaNarzedzia = apps.get_model('TOOLS', 'HistoriaUzyciaNarzedzia')
+    EgzemplarzNarzedzia = apps.get_model('TOOLS', 'EgzemplarzNarzedzia')
+
+    otwarte = HistoriaUzyciaNarzedzia.objects.filter(data_zwrotu__isnull=True).values_list(
+        'id', 'egzemplarz_id', 'data_wydania'
+    ).order_by('egzemplarz_id', '-data_wydania', '-id')
+
+    aktywne = {}
+    for historia_id, egzemplarz_id, data_wydania in otwarte.iterator(chunk_size=2000):
+        if egzemplarz_id not in aktywne:
+            aktywne[egzemplarz_id] = (historia_id, data_wydania)
+        else:
+            HistoriaUzyciaNarzedzia.objects.filter(id=historia_id).update(data_zwrotu=aktywne[egzemplarz_id][1])
+
+    egzemplarze = [
+        EgzemplarzNarzedzia(id=egzemplarz_id, aktywne_wypozyczenie_id=historia_id)
+        for egzemplarz_id, (historia_id, _) in aktywne.items()
+    ]
+    EgzemplarzNarzedzia.objects.bulk_update(egzemplarze, ['aktywne_wypozyczenie'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TOOLS', '0031_indeksy_stronicowania'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='egzemplarznarzedzia',
+            name='aktywne_wypozyczenie',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='TOOLS.historiauzycianarzedzia'),
+        ),
+        migrations.RunPython(ustaw_aktywne_wypozyczenia, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='historiauzycianarzedzia',
+            constraint=models.UniqueConstraint(condition=models.Q(('data_zwrotu__isnull', True)), fields=('egzemplarz',), name='historia_jedno_aktywne_wypozyczenie'),
+        ),
+    ]
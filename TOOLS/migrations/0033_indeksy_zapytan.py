@@ -0,0 +1,46 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TOOLS', '0032_aktywne_wypozyczenie'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='egzemplarznarzedzia',
+            index=models.Index(fields=['narzedzie_typ', 'stan'], include=('ilosc_w_komplecie', 'aktywne_wypozyczenie'), name='egzemplarz_narz_stan'),
+        ),
+        migrations.AddIndex(
+            model_name='historiauzycianarzedzia',
+            index=models.Index(condition=models.Q(('data_zwrotu__isnull', True)), fields=['-data_wydania', '-id'], name='historia_aktywne_data_id'),
+        ),
+        migrations.AddIndex(
+            model_name='historiauzycianarzedzia',
+            index=models.Index(fields=['egzemplarz', '-data_wydania'], name='historia_egz_data_wydania'),
+        ),
+        migrations.AddIndex(
+            model_name='pozycjazamowienia',
+            index=models.Index(fields=['narzedzie_typ', 'zamowienie'], name='pozycjazam_narz_zam'),
+        ),
+        # Indeksy kluczy obcych zastąpione przez złożone (ta sama pierwsza kolumna)
+        migrations.AlterField(
+            model_name='egzemplarznarzedzia',
+            name='narzedzie_typ',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='egzemplarze', to='TOOLS.narzedziemagazynowe'),
+        ),
+        migrations.AlterField(
+            model_name='historiauzycianarzedzia',
+            name='egzemplarz',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='historia', to='TOOLS.egzemplarznarzedzia'),
+        ),
+        migrations.AlterField(
+            model_name='pozycjazamowienia',
+            name='narzedzie_typ',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='pozycje_zamowien', to='TOOLS.narzedziemagazynowe'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:52
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def uzupelnij_narzedzie_typ(apps, schema_editor):
+    """Wpisy historii dostają typ narzędzia swojego egzemplarza."""
+    HistoriaUzyciaNarzedzia = apps.get_model('TOOLS', 'HistoriaUzyciaNarzedzia')
+    EgzemplarzNarzedzia = apps.get_model('TOOLS', 'EgzemplarzNarzedzia')
+
+    HistoriaUzyciaNarzedzia.objects.update(narzedzie_typ_id=Subquery(
+        EgzemplarzNarzedzia.objects.filter(id=OuterRef('egzemplarz_id')).values('narzedzie_typ_id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TOOLS', '0033_indeksy_zapytan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historiauzycianarzedzia',
+            name='narzedzie_typ',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='historia_uzycia', to='TOOLS.narzedziemagazynowe'),
+        ),
+        migrations.RunPython(uzupelnij_narzedzie_typ, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='historiauzycianarzedzia',
+            name='narzedzie_typ',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='historia_uzycia', to='TOOLS.narzedziemagazynowe'),
+        ),
+        migrations.AddIndex(
+            model_name='historiauzycianarzedzia',
+            index=models.Index(fields=['narzedzie_typ', '-data_wydania', '-id'], name='historia_narz_data_wydania'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.23 on 2026-10-18 08:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TOOLS', '0034_historia_narzedzie_typ'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uszkodzenie',
+            name='kategoria_nazwa',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='uszkodzenie',
+            name='lokalizacja_nazwa',
+            field=models.CharField(blank=True, editable=False, max_length=160),
+        ),
+        migrations.AddField(
+            model_name='uszkodzenie',
+            name='maszyna_nazwa',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='uszkodzenie',
+            name='narzedzie_opis',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='uszkodzenie',
+            name='numer_katalogowy',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='uszkodzenie',
+            name='podkategoria_nazwa',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='uszkodzenie',
+            name='stan_egzemplarza',
+            field=models.CharField(blank=True, choices=[('nowe', 'Nowe'), ('uzywane', 'Używane'), ('uszkodzone', 'Uszkodzone'), ('uszkodzone_regeneracja', 'Uszkodzone do regeneracji')], editable=False, max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='uszkodzenie',
+            name='egzemplarz',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='uszkodzenia', to='TOOLS.egzemplarznarzedzia'),
+        ),
+    ]
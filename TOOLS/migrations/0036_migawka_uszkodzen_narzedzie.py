@@ -0,0 +1,38 @@
+# Generated by Django 4.2.23 on 2026-10-18 09:00
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def uzupelnij_narzedzie_typ(apps, schema_editor):
+    """Wpisy archiwum z egzemplarzem dostają jego typ narzędzia i wielkość kompletu."""
+    Uszkodzenie = apps.get_model('TOOLS', 'Uszkodzenie')
+    EgzemplarzNarzedzia = apps.get_model('TOOLS', 'EgzemplarzNarzedzia')
+
+    egzemplarz = EgzemplarzNarzedzia.objects.filter(id=OuterRef('egzemplarz_id'))
+    Uszkodzenie.objects.filter(egzemplarz__isnull=False).update(
+        narzedzie_typ_id=Subquery(egzemplarz.values('narzedzie_typ_id')[:1]),
+        ilosc_w_komplecie=Subquery(egzemplarz.values('ilosc_w_komplecie')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TOOLS', '0035_migawka_uszkodzen'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uszkodzenie',
+            name='ilosc_w_komplecie',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='uszkodzenie',
+            name='narzedzie_typ',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='uszkodzenia', to='TOOLS.narzedziemagazynowe'),
+        ),
+        migrations.RunPython(uzupelnij_narzedzie_typ, migrations.RunPython.noop),
+    ]
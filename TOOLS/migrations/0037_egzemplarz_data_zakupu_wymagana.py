@@ -0,0 +1,26 @@
+# Generated by Django 4.2.23 on 2026-10-18 12:10
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def uzupelnij_date_zakupu(apps, schema_editor):
+    """Egzemplarze bez daty zakupu dostają datę modyfikacji - przed zdjęciem NULL z kolumny."""
+    EgzemplarzNarzedzia = apps.get_model('TOOLS', 'EgzemplarzNarzedzia')
+    EgzemplarzNarzedzia.objects.filter(data_zakupu__isnull=True).update(data_zakupu=F('data_modyfikacji'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TOOLS', '0036_migawka_uszkodzen_narzedzie'),
+    ]
+
+    operations = [
+        migrations.RunPython(uzupelnij_date_zakupu, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='egzemplarznarzedzia',
+            name='data_zakupu',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+    ]
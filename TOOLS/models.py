@@ -2,6 +2,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 
 class Kategoria(models.Model):
@@ -143,6 +144,7 @@ class NarzedzieMagazynowe(models.Model):
         default='szt'
     )
     ilosc_w_opakowaniu = models.PositiveIntegerField(default=1)
+    data_modyfikacji = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name_plural = "Narzędzia magazynowe"
@@ -174,7 +176,8 @@ class EgzemplarzNarzedzia(models.Model):
     narzedzie_typ = models.ForeignKey(
         NarzedzieMagazynowe,
         on_delete=models.CASCADE,
-        related_name='egzemplarze'
+        related_name='egzemplarze',
+        db_index=False  # Pierwsza kolumna indeksu egzemplarz_narz_stan
     )
     stan = models.CharField(max_length=30, choices=STAN_CHOICES, default='nowe')
     lokalizacja = models.ForeignKey(
@@ -198,8 +201,19 @@ class EgzemplarzNarzedzia(models.Model):
         blank=True,
         related_name='egzemplarze'
     )
-    data_zakupu = models.DateTimeField(auto_now_add=True, null=True, blank=True)
+    # Bez NULL - pierwsza kolumna kursora stron listy egzemplarzy
+    data_zakupu = models.DateTimeField(auto_now_add=True)
     data_modyfikacji = models.DateTimeField(auto_now=True)
+    # Otwarte wypożyczenie (wpis historii bez daty zwrotu) - utrzymywane
+    # przez signals.py, "w użyciu" bez przeszukiwania historii
+    aktywne_wypozyczenie = models.OneToOneField(
+        'HistoriaUzyciaNarzedzia',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+'
+    )
     jednostka = models.CharField(
         max_length=10,
         choices=JEDNOSTKA_CHOICES,
@@ -210,6 +224,16 @@ class EgzemplarzNarzedzia(models.Model):
     class Meta:
         verbose_name_plural = "Egzemplarze narzędzi"
         ordering = ['-data_zakupu']
+        indexes = [
+            # Stronicowanie kursorem listy egzemplarzy
+            models.Index(fields=['-data_zakupu', '-id'], name='egzemplarz_data_zakupu_id'),
+            # Ilości wg stanów (SilnikStanow) - na PostgreSQL bez odczytu tabeli
+            models.Index(
+                fields=['narzedzie_typ', 'stan'],
+                include=['ilosc_w_komplecie', 'aktywne_wypozyczenie'],
+                name='egzemplarz_narz_stan',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.narzedzie_typ} - {self.stan} ({self.id})"
@@ -219,7 +243,16 @@ class HistoriaUzyciaNarzedzia(models.Model):
     egzemplarz = models.ForeignKey(
         EgzemplarzNarzedzia,
         on_delete=models.CASCADE,
-        related_name='historia'
+        related_name='historia',
+        db_index=False  # Pierwsza kolumna indeksu historia_egz_data_wydania
+    )
+    # Typ narzędzia egzemplarza (signals.py) - historia narzędzia bez złączenia z egzemplarzami
+    narzedzie_typ = models.ForeignKey(
+        NarzedzieMagazynowe,
+        on_delete=models.CASCADE,
+        related_name='historia_uzycia',
+        editable=False,
+        db_index=False  # Pierwsza kolumna indeksu historia_narz_data_wydania
     )
     maszyna = models.ForeignKey(
         Maszyna,
@@ -244,19 +277,43 @@ class HistoriaUzyciaNarzedzia(models.Model):
     data_wydania = models.DateTimeField(auto_now_add=True)
     data_zwrotu = models.DateTimeField(null=True, blank=True)
     uwagi = models.TextField(blank=True)
+    data_modyfikacji = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name_plural = "Historia użycia narzędzi"
         ordering = ['-data_wydania']
+        constraints = [
+            # Najwyżej jedno otwarte wypożyczenie egzemplarza
+            models.UniqueConstraint(
+                fields=['egzemplarz'],
+                condition=models.Q(data_zwrotu__isnull=True),
+                name='historia_jedno_aktywne_wypozyczenie',
+            ),
+        ]
+        indexes = [
+            # Stronicowanie kursorem historii
+            models.Index(fields=['-data_wydania', '-id'], name='historia_data_wydania_id'),
+            # Otwarte wypożyczenia od najnowszych (panel magazynu, ?w_uzyciu=true)
+            models.Index(
+                fields=['-data_wydania', '-id'],
+                condition=models.Q(data_zwrotu__isnull=True),
+                name='historia_aktywne_data_id',
+            ),
+            # Ostatnie wypożyczenie egzemplarza (archiwizacja uszkodzeń)
+            models.Index(fields=['egzemplarz', '-data_wydania'], name='historia_egz_data_wydania'),
+            # Historia narzędzia (szczegóły narzędzia, ?narzedzie_id=) w kolejności stronicowania
+            models.Index(fields=['narzedzie_typ', '-data_wydania', '-id'], name='historia_narz_data_wydania'),
+        ]
 
     def __str__(self):
         return f"{self.egzemplarz} -> {self.pracownik} ({self.data_wydania})"
 
 
 class Uszkodzenie(models.Model):
+    # Wpis archiwum zostaje po usunięciu (utylizacji) egzemplarza
     egzemplarz = models.ForeignKey(
         EgzemplarzNarzedzia,
-        on_delete=models.CASCADE,
+        on_delete=models.SET_NULL,
         related_name='uszkodzenia',
         null=True,
         blank=True
@@ -270,10 +327,37 @@ class Uszkodzenie(models.Model):
         blank=True,
         related_name='zgloszone_uszkodzenia'
     )
+    # Dane egzemplarza w momencie uszkodzenia (signals.py) - lista archiwum
+    # i prognoza zużycia bez sięgania do egzemplarza, narzędzia i historii użycia
+    narzedzie_typ = models.ForeignKey(
+        NarzedzieMagazynowe,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='uszkodzenia'
+    )
+    ilosc_w_komplecie = models.PositiveIntegerField(default=1, editable=False)
+    kategoria_nazwa = models.CharField(max_length=100, blank=True, editable=False)
+    podkategoria_nazwa = models.CharField(max_length=100, blank=True, editable=False)
+    narzedzie_opis = models.TextField(blank=True, editable=False)
+    numer_katalogowy = models.CharField(max_length=100, blank=True, editable=False)
+    lokalizacja_nazwa = models.CharField(max_length=160, blank=True, editable=False)
+    maszyna_nazwa = models.CharField(max_length=100, blank=True, editable=False)
+    stan_egzemplarza = models.CharField(
+        max_length=30,
+        choices=EgzemplarzNarzedzia.STAN_CHOICES,
+        blank=True,
+        editable=False
+    )
 
     class Meta:
         verbose_name_plural = "Uszkodzenia"
         ordering = ['-data_uszkodzenia']
+        indexes = [
+            # Stronicowanie kursorem listy uszkodzeń
+            models.Index(fields=['-data_uszkodzenia', '-id'], name='uszkodzenie_data_id'),
+        ]
 
     def __str__(self):
         return f"Uszkodzenie: {self.egzemplarz} - {self.data_uszkodzenia}"
@@ -297,6 +381,10 @@ class Zamowienie(models.Model):
     email_docelowy = models.EmailField(blank=True, null=True,
                                        help_text="Email dostawcy w momencie tworzenia zamówienia")
     data_utworzenia = models.DateTimeField(auto_now_add=True)
+    data_modyfikacji = models.DateTimeField(
+        auto_now=True,
+        help_text="Zmienia się także przy zmianie pozycji i dostawcy - klucz cache treści emaila"
+    )
     data_wyslania = models.DateTimeField(null=True, blank=True)
     wartosc_zamowienia = models.DecimalField(
         max_digits=12,
@@ -310,11 +398,33 @@ class Zamowienie(models.Model):
     class Meta:
         verbose_name_plural = "Zamówienia"
         ordering = ['-data_utworzenia']
+        indexes = [
+            # Stronicowanie kursorem listy zamówień
+            models.Index(fields=['-data_utworzenia', '-id'], name='zamowienie_data_id'),
+        ]
 
     def __str__(self):
         return f"{self.numer} - {self.dostawca.nazwa_firmy} ({self.status})"
 
 
+class LicznikZamowien(models.Model):
+    """
+    Licznik numeracji zamówień RRRR/MM/NNN - jeden wiersz na miesiąc.
+    Numery przydziela NumeracjaZamowienService (atomowy UPDATE licznika).
+    """
+    rok = models.PositiveIntegerField()
+    miesiac = models.PositiveSmallIntegerField()
+    ostatni_numer = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Liczniki zamówień"
+        unique_together = ['rok', 'miesiac']
+        ordering = ['-rok', '-miesiac']
+
+    def __str__(self):
+        return f"{self.rok}/{self.miesiac:02d}: {self.ostatni_numer}"
+
+
 class PozycjaZamowienia(models.Model):
     JEDNOSTKA_CHOICES = [
         ('szt', 'Sztuka'),
@@ -329,7 +439,8 @@ class PozycjaZamowienia(models.Model):
     narzedzie_typ = models.ForeignKey(
         NarzedzieMagazynowe,
         on_delete=models.PROTECT,
-        related_name='pozycje_zamowien'
+        related_name='pozycje_zamowien',
+        db_index=False  # Pierwsza kolumna indeksu pozycjazam_narz_zam
     )
     # Spłaszczone dane z generatora (snapshot w momencie tworzenia)
     kategoria_nazwa = models.CharField(max_length=200, blank=True)
@@ -358,6 +469,10 @@ class PozycjaZamowienia(models.Model):
     class Meta:
         verbose_name_plural = "Pozycje zamówień"
         ordering = ['zamowienie', 'id']
+        indexes = [
+            # Zamówienia z danym narzędziem i ilości "w drodze" - bez odczytu tabeli
+            models.Index(fields=['narzedzie_typ', 'zamowienie'], name='pozycjazam_narz_zam'),
+        ]
 
     def __str__(self):
         return f"{self.zamowienie.numer} - {self.narzedzie_opis} x{self.ilosc_zamowiona}"
@@ -382,6 +497,10 @@ class RealizacjaZamowienia(models.Model):
     class Meta:
         verbose_name_plural = "Realizacje zamówień"
         ordering = ['-data_realizacji']
+        indexes = [
+            # Stronicowanie kursorem listy realizacji
+            models.Index(fields=['-data_realizacji', '-id'], name='realizacja_data_id'),
+        ]
 
     def __str__(self):
         return f"Realizacja {self.zamowienie.numer} - {self.data_realizacji}"
@@ -450,4 +569,236 @@ class PozycjaGeneratora(models.Model):
         ordering = ['narzedzie_typ__podkategoria__kategoria__nazwa', 'narzedzie_typ__opis']
 
     def __str__(self):
-        return f"Generator: {self.narzedzie_typ.opis} - {self.ilosc_do_zamowienia} szt."
\ No newline at end of file
+        return f"Generator: {self.narzedzie_typ.opis} - {self.ilosc_do_zamowienia} szt."
+
+
+class NarzedzieDoPrzeliczenia(models.Model):
+    """
+    Narzędzia, których stan lub limity zmieniły się od ostatniego
+    uruchomienia generatora zamówień. Generator ocenia tylko te narzędzia
+    i czyści ich wpisy - przy braku zmian zwraca gotowe PozycjaGeneratora.
+    """
+    narzedzie_typ = models.OneToOneField(
+        NarzedzieMagazynowe,
+        on_delete=models.CASCADE,
+        related_name='do_przeliczenia',
+        unique=True
+    )
+    data_zmiany = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "Narzędzia do przeliczenia w generatorze"
+
+    def __str__(self):
+        return f"Do przeliczenia: {self.narzedzie_typ.opis}"
+
+
+class PrognozaZuzycia(models.Model):
+    """
+    Prognoza zużycia narzędzia - jeden wiersz na typ narzędzia.
+    Liczona wsadowo (komenda prognozuj_zuzycie) z historii uszkodzeń
+    i wydań oraz czasów dostaw; generator zamówień czyta gotowe
+    zapotrzebowanie zamiast liczyć je przy każdym otwarciu.
+    """
+    narzedzie_typ = models.OneToOneField(
+        NarzedzieMagazynowe,
+        on_delete=models.CASCADE,
+        related_name='prognoza',
+        unique=True
+    )
+    zuzycie_dzienne = models.DecimalField(
+        max_digits=10,
+        decimal_places=4,
+        default=0,
+        help_text="Średnie zużycie w sztukach na dzień"
+    )
+    odchylenie_dzienne = models.DecimalField(
+        max_digits=10,
+        decimal_places=4,
+        default=0,
+        help_text="Odchylenie standardowe dziennego zużycia"
+    )
+    czas_dostawy_dni = models.PositiveIntegerField(default=0)
+    zapas_bezpieczenstwa = models.PositiveIntegerField(default=0)
+    zapotrzebowanie = models.PositiveIntegerField(
+        default=0,
+        help_text="Sztuki na czas dostawy i okres przeglądu wraz z zapasem bezpieczeństwa"
+    )
+    data_obliczenia = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Prognozy zużycia"
+
+    def __str__(self):
+        return f"Prognoza: {self.narzedzie_typ.opis} - {self.zapotrzebowanie} szt."
+
+
+class StanMagazynowy(models.Model):
+    """
+    Zestawienie stanów magazynowych - jeden wiersz na typ narzędzia.
+    Utrzymywane transakcyjnie przy zmianach egzemplarzy i wypożyczeń
+    (StanMagazynowyService), dzięki czemu listy narzędzi czytają gotowe
+    ilości zamiast liczyć agregaty przy każdym zapytaniu.
+    """
+    narzedzie_typ = models.OneToOneField(
+        NarzedzieMagazynowe,
+        on_delete=models.CASCADE,
+        related_name='stan_magazynowy',
+        unique=True
+    )
+    ilosc_nowych = models.PositiveIntegerField(default=0)
+    ilosc_uzywanych_dostepnych = models.PositiveIntegerField(default=0)
+    ilosc_w_uzyciu = models.PositiveIntegerField(default=0)
+    calkowita_ilosc = models.PositiveIntegerField(
+        default=0,
+        help_text="Nowe + używane (suma dostępnych sztuk)"
+    )
+    ilosc_w_drodze = models.PositiveIntegerField(
+        default=0,
+        help_text="Sztuki zamówione (wysłane / częściowo odebrane), jeszcze niedostarczone"
+    )
+    data_aktualizacji = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Stany magazynowe"
+
+    def __str__(self):
+        return f"Stan: {self.narzedzie_typ.opis} - {self.calkowita_ilosc} szt."
+
+
+class HistoriaCen(models.Model):
+    """
+    Historia cen zakupu - jeden wpis na pozycję zamówienia z ceną.
+    Data ceny to data utworzenia zamówienia, więc kolejność wpisów
+    odpowiada kolejności zamówień u dostawcy.
+    """
+    narzedzie_typ = models.ForeignKey(
+        NarzedzieMagazynowe,
+        on_delete=models.CASCADE,
+        related_name='historia_cen'
+    )
+    dostawca = models.ForeignKey(
+        Dostawca,
+        on_delete=models.CASCADE,
+        related_name='historia_cen'
+    )
+    pozycja_zamowienia = models.OneToOneField(
+        PozycjaZamowienia,
+        on_delete=models.CASCADE,
+        related_name='wpis_historii_cen'
+    )
+    cena_jednostkowa = models.DecimalField(max_digits=10, decimal_places=2)
+    data_ceny = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = "Historia cen"
+        ordering = ['-data_ceny', '-id']
+        indexes = [
+            models.Index(fields=['narzedzie_typ', 'dostawca', '-data_ceny'], name='historiacen_narz_dost_data'),
+        ]
+
+    def __str__(self):
+        return f"{self.narzedzie_typ.opis} @ {self.dostawca.nazwa_firmy}: {self.cena_jednostkowa} zł"
+
+
+class AktualnaCena(models.Model):
+    """
+    Ostatnia cena narzędzia u danego dostawcy - jeden wiersz na parę
+    (narzędzie, dostawca). Odświeżana z HistoriaCen przy każdej zmianie
+    pozycji zamówień (CenyService), dzięki czemu generator pobiera ceny
+    wielu narzędzi jednym zapytaniem po indeksie.
+    """
+    narzedzie_typ = models.ForeignKey(
+        NarzedzieMagazynowe,
+        on_delete=models.CASCADE,
+        related_name='aktualne_ceny'
+    )
+    dostawca = models.ForeignKey(
+        Dostawca,
+        on_delete=models.CASCADE,
+        related_name='aktualne_ceny'
+    )
+    cena_jednostkowa = models.DecimalField(max_digits=10, decimal_places=2)
+    data_ceny = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = "Aktualne ceny"
+        unique_together = ['narzedzie_typ', 'dostawca']
+
+    def __str__(self):
+        return f"{self.narzedzie_typ.opis} @ {self.dostawca.nazwa_firmy}: {self.cena_jednostkowa} zł"
+
+
+class WiadomoscEmail(models.Model):
+    """
+    Kolejka wychodzących wiadomości email. Treść renderowana jest
+    w chwili dodania do kolejki, a wysyłką zajmuje się komenda
+    wyslij_emaile - żądanie HTTP nie czeka na serwer SMTP, a nieudane
+    próby są ponawiane z rosnącym odstępem.
+    """
+    STATUS_CHOICES = [
+        ('oczekuje', 'Oczekuje'),
+        ('wysylanie', 'W trakcie wysyłki'),
+        ('wyslana', 'Wysłana'),
+        ('blad', 'Błąd'),
+    ]
+
+    zamowienie = models.ForeignKey(
+        Zamowienie,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='wiadomosci_email'
+    )
+    odbiorca = models.EmailField()
+    kopia = models.EmailField(blank=True, help_text="Adres DW")
+    temat = models.CharField(max_length=255)
+    tresc_html = models.TextField()
+    zalacznik_nazwa = models.CharField(max_length=255, blank=True)
+    zalacznik_csv = models.TextField(blank=True, help_text="Treść załącznika CSV (np. pozycje zamówienia)")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='oczekuje')
+    liczba_prob = models.PositiveSmallIntegerField(default=0)
+    nastepna_proba = models.DateTimeField(
+        default=timezone.now,
+        help_text="Najwcześniejszy moment kolejnej próby wysyłki"
+    )
+    ostatni_blad = models.TextField(blank=True)
+    data_utworzenia = models.DateTimeField(auto_now_add=True)
+    data_wyslania = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "Wiadomości email"
+        ordering = ['-data_utworzenia']
+        indexes = [
+            models.Index(fields=['status', 'nastepna_proba'], name='wiadomosc_status_proba'),
+        ]
+
+    def __str__(self):
+        return f"{self.temat} -> {self.odbiorca} ({self.status})"
+
+
+class UsunietyObiekt(models.Model):
+    """
+    Ślad usunięcia obiektu dla synchronizacji przyrostowej (?since=).
+    Klient z tokenem sprzed usunięcia dostaje ID obiektu w liście
+    'usuniete'. Wpisy starsze niż SledzenieZmianService.RETENCJA czyści
+    komenda wyczysc_usuniete - starszy token oznacza pełne pobranie.
+    """
+    TYP_CHOICES = [
+        ('narzedzie', 'Narzędzie magazynowe'),
+        ('egzemplarz', 'Egzemplarz narzędzia'),
+        ('historia', 'Historia użycia'),
+    ]
+
+    typ = models.CharField(max_length=20, choices=TYP_CHOICES)
+    obiekt_id = models.BigIntegerField()
+    data_usuniecia = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "Usunięte obiekty"
+        indexes = [
+            models.Index(fields=['typ', 'data_usuniecia'], name='usunietyobiekt_typ_data'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_typ_display()} #{self.obiekt_id} ({self.data_usuniecia})"
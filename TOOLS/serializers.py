@@ -8,13 +8,119 @@ from .models import (
 )
 
 
-class KategoriaSimpleSerializer(serializers.ModelSerializer):
+def drzewo_sciezek(wartosc):
+    """
+    Parametr ?expand= / ?fields= jako drzewo nazw pól:
+    'a.b,c' -> {'a': {'b': {}}, 'c': {}}
+    """
+    drzewo = {}
+    for sciezka in (wartosc or '').split(','):
+        wezel = drzewo
+        for nazwa in sciezka.strip().split('.'):
+            if nazwa:
+                wezel = wezel.setdefault(nazwa, {})
+    return drzewo
+
+
+class RozwijanieMixin:
+    """
+    Pola wybierane parametrami ?fields= i ?expand=.
+
+    Zagnieżdżone serializery relacji domyślnie zwracają samo ID (lista ID
+    dla relacji wielokrotnych) - obiekt zwracany jest tylko dla relacji
+    wskazanych w ?expand=, np. ?expand=egzemplarz.narzedzie_typ,maszyna.
+    ?fields= ogranicza zwracane pola, np. ?fields=id,opis,podkategoria.nazwa
+    (ścieżki z kropką dotyczą rozwiniętych relacji). Pola tylko do zapisu
+    (*_id) są zawsze dostępne.
+
+    Dla zagnieżdżonych serializerów drzewa rozwinięć i pól przekazywane są
+    w argumentach rozwin / pola - parametry zapytania czyta tylko serializer
+    główny.
+    """
+
+    # Relacje (ścieżki ORM) potrzebne zawsze - np. w SerializerMethodField
+    relacje = ()
+
+    def __init__(self, *args, rozwin=None, pola=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if rozwin is None and pola is None and request is not None:
+            rozwin = drzewo_sciezek(request.query_params.get('expand'))
+            pola = drzewo_sciezek(request.query_params.get('fields')) or None
+        self._rozwin = rozwin or {}
+        self._pola = pola
+
+    def get_fields(self):
+        pola = super().get_fields()
+
+        for nazwa, pole in pola.items():
+            if not isinstance(pole, serializers.BaseSerializer):
+                continue
+            wiele = isinstance(pole, serializers.ListSerializer)
+            if nazwa in self._rozwin:
+                klasa = type(pole.child if wiele else pole)
+                pola[nazwa] = klasa(
+                    many=wiele,
+                    read_only=True,
+                    rozwin=self._rozwin[nazwa],
+                    pola=(self._pola or {}).get(nazwa) or None,
+                )
+            else:
+                pola[nazwa] = serializers.PrimaryKeyRelatedField(many=wiele, read_only=True)
+
+        if self._pola is not None:
+            pola = {nazwa: pole for nazwa, pole in pola.items() if nazwa in self._pola or pole.write_only}
+        return pola
+
+
+def relacje_zapytania(serializer):
+    """
+    Ścieżki select_related i prefetch_related dla pól serializera.
+
+    Obejmują rozwinięte relacje, pola ze źródłem w relacji (np.
+    source='podkategoria.kategoria.nazwa'), relacje wielokrotne zwracane
+    jako lista ID oraz RozwijanieMixin.relacje. Relacje za relacją
+    wielokrotną pobierane są przez prefetch_related.
+
+    Returns:
+        tuple: (lista ścieżek select_related, lista ścieżek prefetch_related)
+    """
+    select_related, prefetch_related = set(), set()
+
+    def dodaj(sciezka, wiele):
+        (prefetch_related if wiele else select_related).add('__'.join(sciezka))
+
+    def odwiedz(serializer, prefiks, wiele):
+        if isinstance(serializer, serializers.ListSerializer):
+            serializer = serializer.child
+
+        for relacja in getattr(serializer, 'relacje', ()):
+            dodaj(prefiks + relacja.split('__'), wiele)
+
+        for pole in serializer.fields.values():
+            if pole.write_only or pole.source == '*':
+                continue
+            sciezka = prefiks + pole.source_attrs
+            if isinstance(pole, serializers.BaseSerializer):
+                wiele_pola = wiele or isinstance(pole, serializers.ListSerializer)
+                dodaj(sciezka, wiele_pola)
+                odwiedz(pole, sciezka, wiele_pola)
+            elif isinstance(pole, serializers.ManyRelatedField):
+                dodaj(sciezka, True)
+            elif len(pole.source_attrs) > 1:
+                dodaj(sciezka[:-1], wiele)
+
+    odwiedz(serializer, [], False)
+    return sorted(select_related), sorted(prefetch_related)
+
+
+class KategoriaSimpleSerializer(RozwijanieMixin, serializers.ModelSerializer):
     class Meta:
         model = Kategoria
         fields = ['id', 'nazwa']
 
 
-class PodkategoriaSerializer(serializers.ModelSerializer):
+class PodkategoriaSerializer(RozwijanieMixin, serializers.ModelSerializer):
     kategoria_nazwa = serializers.CharField(source='kategoria.nazwa', read_only=True)
     kategoria = KategoriaSimpleSerializer(read_only=True)
     kategoria_id = serializers.PrimaryKeyRelatedField(
@@ -28,7 +134,7 @@ class PodkategoriaSerializer(serializers.ModelSerializer):
         fields = ['id', 'nazwa', 'kategoria', 'kategoria_id', 'kategoria_nazwa']
 
 
-class KategoriaSerializer(serializers.ModelSerializer):
+class KategoriaSerializer(RozwijanieMixin, serializers.ModelSerializer):
     podkategorie = PodkategoriaSerializer(many=True, read_only=True)
 
     class Meta:
@@ -36,31 +142,31 @@ class KategoriaSerializer(serializers.ModelSerializer):
         fields = ['id', 'nazwa', 'podkategorie']
 
 
-class DostawcaSerializer(serializers.ModelSerializer):
+class DostawcaSerializer(RozwijanieMixin, serializers.ModelSerializer):
     class Meta:
         model = Dostawca
         fields = '__all__'
 
 
-class LokalizacjaSerializer(serializers.ModelSerializer):
+class LokalizacjaSerializer(RozwijanieMixin, serializers.ModelSerializer):
     class Meta:
         model = Lokalizacja
         fields = '__all__'
 
 
-class MaszynaSerializer(serializers.ModelSerializer):
+class MaszynaSerializer(RozwijanieMixin, serializers.ModelSerializer):
     class Meta:
         model = Maszyna
         fields = '__all__'
 
 
-class PracownikSerializer(serializers.ModelSerializer):
+class PracownikSerializer(RozwijanieMixin, serializers.ModelSerializer):
     class Meta:
         model = Pracownik
         fields = '__all__'
 
 
-class FakturaZakupuSerializer(serializers.ModelSerializer):
+class FakturaZakupuSerializer(RozwijanieMixin, serializers.ModelSerializer):
     dostawca = DostawcaSerializer(read_only=True)
     dostawca_id = serializers.PrimaryKeyRelatedField(
         queryset=Dostawca.objects.all(),
@@ -73,7 +179,7 @@ class FakturaZakupuSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class NarzedzieMagazynoweSerializer(serializers.ModelSerializer):
+class NarzedzieMagazynoweSerializer(RozwijanieMixin, serializers.ModelSerializer):
     podkategoria = PodkategoriaSerializer(read_only=True)
     kategoria_nazwa = serializers.CharField(source='podkategoria.kategoria.nazwa', read_only=True)
     podkategoria_id = serializers.PrimaryKeyRelatedField(
@@ -103,13 +209,14 @@ class NarzedzieMagazynoweSerializer(serializers.ModelSerializer):
     ilosc_uzywanych_dostepnych = serializers.IntegerField(read_only=True)
     ilosc_w_uzyciu = serializers.IntegerField(read_only=True)
     calkowita_ilosc = serializers.IntegerField(read_only=True)
+    ilosc_w_drodze = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = NarzedzieMagazynowe
         fields = '__all__'
 
 
-class EgzemplarzNarzedziaSerializer(serializers.ModelSerializer):
+class EgzemplarzNarzedziaSerializer(RozwijanieMixin, serializers.ModelSerializer):
     narzedzie_typ = NarzedzieMagazynoweSerializer(read_only=True)
     narzedzie_typ_id = serializers.PrimaryKeyRelatedField(
         queryset=NarzedzieMagazynowe.objects.all(),
@@ -155,8 +262,19 @@ class EgzemplarzNarzedziaSerializer(serializers.ModelSerializer):
 
         return super().create(validated_data)
 
+    def update(self, instance, validated_data):
+        from .services import StanMagazynowyService
 
-class HistoriaUzyciaNarzedziaSerializer(serializers.ModelSerializer):
+        # Zmiana typu narzędzia - stary typ również wymaga przeliczenia stanu
+        poprzedni_typ_id = instance.narzedzie_typ_id
+        instance = super().update(instance, validated_data)
+        if instance.narzedzie_typ_id != poprzedni_typ_id:
+            StanMagazynowyService.przelicz([poprzedni_typ_id])
+
+        return instance
+
+
+class HistoriaUzyciaNarzedziaSerializer(RozwijanieMixin, serializers.ModelSerializer):
     egzemplarz = EgzemplarzNarzedziaSerializer(read_only=True)
     egzemplarz_id = serializers.PrimaryKeyRelatedField(
         queryset=EgzemplarzNarzedzia.objects.all(),
@@ -193,7 +311,7 @@ class HistoriaUzyciaNarzedziaSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class UszkodzenieSerializer(serializers.ModelSerializer):
+class UszkodzenieSerializer(RozwijanieMixin, serializers.ModelSerializer):
     egzemplarz = EgzemplarzNarzedziaSerializer(read_only=True)
     egzemplarz_id = serializers.PrimaryKeyRelatedField(
         queryset=EgzemplarzNarzedzia.objects.all(),
@@ -209,7 +327,8 @@ class UszkodzenieSerializer(serializers.ModelSerializer):
         allow_null=True
     )
 
-    # Dodatkowe pola dla ułatwienia wyświetlania
+    # Dodatkowe pola dla ułatwienia wyświetlania - z migawki zapisanej
+    # przy zgłoszeniu (UszkodzenieService), bez zapytań na wiersz
     kategoria_narzedzia = serializers.SerializerMethodField()
     opis_narzedzia = serializers.SerializerMethodField()
     numer_katalogowy = serializers.SerializerMethodField()
@@ -218,59 +337,62 @@ class UszkodzenieSerializer(serializers.ModelSerializer):
     ostatni_pracownik = serializers.SerializerMethodField()
     stan_egzemplarza = serializers.SerializerMethodField()
 
+    relacje = ('pracownik',)
+
     class Meta:
         model = Uszkodzenie
-        fields = '__all__'
+        # Kolumny migawki wystawione są tylko przez pola wyliczane powyżej
+        fields = [
+            'id', 'egzemplarz', 'egzemplarz_id', 'data_uszkodzenia', 'opis_uszkodzenia',
+            'pracownik', 'pracownik_id', 'kategoria_narzedzia', 'opis_narzedzia',
+            'numer_katalogowy', 'ostatnia_lokalizacja', 'maszyna_uszkodzenia',
+            'ostatni_pracownik', 'stan_egzemplarza',
+        ]
 
     def get_kategoria_narzedzia(self, obj):
-        if obj.egzemplarz and obj.egzemplarz.narzedzie_typ and obj.egzemplarz.narzedzie_typ.podkategoria:
-            return f"{obj.egzemplarz.narzedzie_typ.podkategoria.kategoria.nazwa} / {obj.egzemplarz.narzedzie_typ.podkategoria.nazwa}"
+        if obj.podkategoria_nazwa:
+            return f"{obj.kategoria_nazwa} / {obj.podkategoria_nazwa}"
         return '-'
 
     def get_opis_narzedzia(self, obj):
-        if obj.egzemplarz and obj.egzemplarz.narzedzie_typ:
-            return obj.egzemplarz.narzedzie_typ.opis
-        return '-'
+        return obj.narzedzie_opis or '-'
 
     def get_numer_katalogowy(self, obj):
-        if obj.egzemplarz and obj.egzemplarz.narzedzie_typ:
-            return obj.egzemplarz.narzedzie_typ.numer_katalogowy or None
-        return None
+        return obj.numer_katalogowy or None
 
     def get_ostatnia_lokalizacja(self, obj):
-        if obj.egzemplarz and obj.egzemplarz.lokalizacja:
-            lok = obj.egzemplarz.lokalizacja
-            return f"{lok.szafa}/{lok.kolumna}/{lok.polka}"
-        return None
+        return obj.lokalizacja_nazwa or None
 
     def get_maszyna_uszkodzenia(self, obj):
-        if obj.egzemplarz:
-            # Pobierz ostatnią historię użycia
-            ostatnia_historia = obj.egzemplarz.historia.order_by('-data_wydania').first()
-            if ostatnia_historia and ostatnia_historia.maszyna:
-                return ostatnia_historia.maszyna.nazwa
-        return None
+        return obj.maszyna_nazwa or None
 
     def get_ostatni_pracownik(self, obj):
-        # Zwraca pracownika przypisanego do uszkodzenia (który zgłosił)
+        # Pracownik przypisany do uszkodzenia (który zgłosił)
         if obj.pracownik:
-            return PracownikSerializer(obj.pracownik).data
-        return None
-
-    def get_stan_egzemplarza(self, obj):
-        if obj.egzemplarz:
-            # Mapowanie stanów na czytelne nazwy
-            stan_map = {
-                'nowe': 'Nowe',
-                'uzywane': 'Używane',
-                'uszkodzone': 'Uszkodzone',
-                'uszkodzone_regeneracja': 'Uszkodzone do regeneracji'
+            return {
+                'id': obj.pracownik.id,
+                'karta': obj.pracownik.karta,
+                'nazwisko': obj.pracownik.nazwisko,
+                'imie': obj.pracownik.imie,
             }
-            return stan_map.get(obj.egzemplarz.stan, obj.egzemplarz.stan)
         return None
 
-
-class PozycjaZamowieniaSerializer(serializers.ModelSerializer):
+    def get_stan_egzemplarza(self, obj):
+        # Bieżący stan egzemplarza (regeneracja zdejmuje wpis z listy odpadów),
+        # po usunięciu egzemplarza - stan z chwili uszkodzenia. Lista API
+        # dołącza sam stan (UszkodzenieViewSet), bez całego egzemplarza.
+        if not obj.egzemplarz_id:
+            stan = obj.stan_egzemplarza
+        elif hasattr(obj, 'stan_biezacy'):
+            stan = obj.stan_biezacy
+        else:
+            stan = obj.egzemplarz.stan
+        if not stan:
+            return None
+        return dict(EgzemplarzNarzedzia.STAN_CHOICES).get(stan, stan)
+
+
+class PozycjaZamowieniaSerializer(RozwijanieMixin, serializers.ModelSerializer):
     narzedzie_typ = NarzedzieMagazynoweSerializer(read_only=True)
     narzedzie_typ_id = serializers.PrimaryKeyRelatedField(
         queryset=NarzedzieMagazynowe.objects.all(),
@@ -283,7 +405,7 @@ class PozycjaZamowieniaSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class ZamowienieSerializer(serializers.ModelSerializer):
+class ZamowienieSerializer(RozwijanieMixin, serializers.ModelSerializer):
     dostawca = DostawcaSerializer(read_only=True)
     dostawca_id = serializers.PrimaryKeyRelatedField(
         queryset=Dostawca.objects.all(),
@@ -297,7 +419,7 @@ class ZamowienieSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class PozycjaRealizacjiSerializer(serializers.ModelSerializer):
+class PozycjaRealizacjiSerializer(RozwijanieMixin, serializers.ModelSerializer):
     pozycja_zamowienia = PozycjaZamowieniaSerializer(read_only=True)
     pozycja_zamowienia_id = serializers.PrimaryKeyRelatedField(
         queryset=PozycjaZamowienia.objects.all(),
@@ -318,7 +440,7 @@ class PozycjaRealizacjiSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class RealizacjaZamowieniaSerializer(serializers.ModelSerializer):
+class RealizacjaZamowieniaSerializer(RozwijanieMixin, serializers.ModelSerializer):
     zamowienie = ZamowienieSerializer(read_only=True)
     zamowienie_id = serializers.PrimaryKeyRelatedField(
         queryset=Zamowienie.objects.all(),
@@ -337,4 +459,27 @@ class RealizacjaZamowieniaSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = RealizacjaZamowienia
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class ZmianaPozycjiGeneratoraSerializer(serializers.Serializer):
+    """Zmiana jednej pozycji generatora zamówień (edycja zbiorcza)."""
+    id = serializers.IntegerField(help_text="ID narzędzia")
+    dostawca_id = serializers.IntegerField(required=False, allow_null=True)
+    numer_katalogowy = serializers.CharField(required=False, allow_blank=True, allow_null=True, max_length=100)
+    ilosc_do_zamowienia = serializers.IntegerField(required=False, min_value=0)
+    cena_jednostkowa = serializers.DecimalField(
+        required=False, allow_null=True, max_digits=10, decimal_places=2, min_value=0
+    )
+
+
+class ZmianaLimitowSerializer(serializers.Serializer):
+    """Zatwierdzona zmiana limitów min/max jednego narzędzia."""
+    id = serializers.IntegerField(help_text="ID narzędzia")
+    stan_minimalny = serializers.IntegerField(min_value=0)
+    stan_maksymalny = serializers.IntegerField(min_value=0)
+
+    def validate(self, data):
+        if data['stan_minimalny'] > data['stan_maksymalny']:
+            raise serializers.ValidationError('Stan minimalny nie może być większy niż maksymalny.')
+        return data
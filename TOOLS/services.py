@@ -5,57 +5,1860 @@ Logika biznesowa aplikacji.
 Separacja logiki od warstwy HTTP (views) i warstwy danych (models).
 """
 
-from django.db import transaction
+from django.conf import settings
+from django.db import IntegrityError, transaction
+import hashlib
+import math
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db.models import (
+    Case, Count, Exists, F, IntegerField, Min, OuterRef, Q, Subquery, Sum, Value, When, Window
+)
+from django.db.models.functions import Coalesce, Greatest, RowNumber, TruncDate, TruncWeek
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 
-from .models import (
-    EgzemplarzNarzedzia,
-    HistoriaUzyciaNarzedzia,
-    Uszkodzenie,
-    NarzedzieMagazynowe,
-    Pracownik,
-    Lokalizacja,
-)
-from .constants import STANY_DOSTEPNE_DO_WYDANIA, STANY_PO_ZWROCIE
+from .models import (
+    EgzemplarzNarzedzia,
+    HistoriaUzyciaNarzedzia,
+    Uszkodzenie,
+    NarzedzieMagazynowe,
+    Pracownik,
+    Lokalizacja,
+    StanMagazynowy,
+    PozycjaGeneratora,
+    PozycjaZamowienia,
+    Zamowienie,
+    LicznikZamowien,
+    HistoriaCen,
+    AktualnaCena,
+    NarzedzieDoPrzeliczenia,
+    Dostawca,
+    PrognozaZuzycia,
+    WiadomoscEmail,
+    UsunietyObiekt,
+    Kategoria,
+    Podkategoria,
+    Maszyna,
+)
+from .constants import (
+    StanEgzemplarza,
+    STANY_DOSTEPNE_DO_WYDANIA,
+    STANY_PO_ZWROCIE,
+    STATUSY_ZAMOWIEN_W_DRODZE,
+    STATUSY_ZAMOWIEN_PRZED_WYSYLKA,
+)
+from .wersje import pobierz_cache, podbij_wersje, wersje
+from .zdarzenia import opublikuj_po_zatwierdzeniu
+
+
+# ============================================================================
+# SILNIK OBLICZANIA STANÓW
+# ============================================================================
+
+class SilnikStanow:
+    """
+    Jedno miejsce obliczania ilości magazynowych wg stanów egzemplarzy.
+
+    Wszystkie ilości dla dowolnego zbioru narzędzi liczone są jednym
+    zapytaniem grupującym (SUM/COUNT ... FILTER), w dwóch jednostkach:
+    sztukach (suma ilosc_w_komplecie) i egzemplarzach (liczba kompletów/sztuk
+    jako rekordów). Z silnika korzystają: StanMagazynowyService, generator
+    zamówień i NarzedzieService.
+    """
+
+    # Klucze wyniku: <stan>_szt (sztuki) i <stan>_egz (liczba egzemplarzy)
+    STANY = {
+        'nowe': Q(stan=StanEgzemplarza.NOWE),
+        'uzywane': Q(stan=StanEgzemplarza.UZYWANE),
+        'uszkodzone': Q(stan=StanEgzemplarza.USZKODZONE),
+        'regeneracja': Q(stan=StanEgzemplarza.USZKODZONE_REGENERACJA),
+        'w_uzyciu': Q(aktywne_wypozyczenie__isnull=False),
+    }
+
+    @classmethod
+    def pusty_stan(cls):
+        """Zwraca słownik ilości z samymi zerami."""
+        stan = {}
+        for nazwa in cls.STANY:
+            stan[f'{nazwa}_szt'] = 0
+            stan[f'{nazwa}_egz'] = 0
+        stan['dostepne_szt'] = 0
+        stan['razem_egz'] = 0
+        return stan
+
+    @classmethod
+    def dla_narzedzi(cls, narzedzie_ids=None):
+        """
+        Oblicza ilości dla wskazanych typów narzędzi jednym zapytaniem.
+
+        Args:
+            narzedzie_ids: Iterowalna kolekcja ID narzędzi lub None (cały katalog)
+
+        Returns:
+            dict: {narzedzie_id: {'nowe_szt': int, 'nowe_egz': int, ...,
+                   'dostepne_szt': int, 'razem_egz': int}}
+                  Narzędzia bez egzemplarzy mają same zera.
+        """
+        egzemplarze = EgzemplarzNarzedzia.objects.all()
+        wynik = {}
+
+        if narzedzie_ids is not None:
+            narzedzie_ids = {i for i in narzedzie_ids if i}
+            if not narzedzie_ids:
+                return wynik
+            egzemplarze = egzemplarze.filter(narzedzie_typ_id__in=narzedzie_ids)
+            wynik = {narzedzie_id: cls.pusty_stan() for narzedzie_id in narzedzie_ids}
+
+        agregaty = {'razem_egz': Count('id')}
+        for nazwa, warunek in cls.STANY.items():
+            agregaty[f'{nazwa}_szt'] = Coalesce(Sum('ilosc_w_komplecie', filter=warunek), Value(0))
+            agregaty[f'{nazwa}_egz'] = Count('id', filter=warunek)
+
+        wiersze = egzemplarze.order_by().values('narzedzie_typ_id').annotate(**agregaty)
+
+        for wiersz in wiersze:
+            narzedzie_id = wiersz.pop('narzedzie_typ_id')
+            wiersz['dostepne_szt'] = wiersz['nowe_szt'] + wiersz['uzywane_szt']
+            wynik[narzedzie_id] = wiersz
+
+        return wynik
+
+    @classmethod
+    def dla_narzedzia(cls, narzedzie_id):
+        """Ilości dla pojedynczego narzędzia (patrz dla_narzedzi)."""
+        return cls.dla_narzedzi([narzedzie_id]).get(narzedzie_id, cls.pusty_stan())
+
+    @staticmethod
+    def w_drodze(narzedzie_ids=None):
+        """
+        Sztuki zamówione, ale jeszcze niedostarczone (zamówienia wysłane
+        i częściowo odebrane) - jedno zapytanie grupujące po narzędziu.
+
+        Pozycje w kompletach przeliczane są na sztuki (ilosc_w_komplecie).
+
+        Args:
+            narzedzie_ids: Iterowalna kolekcja ID narzędzi lub None (cały katalog)
+
+        Returns:
+            dict: {narzedzie_id: int} - tylko narzędzia z otwartymi zamówieniami
+        """
+        pozycje = PozycjaZamowienia.objects.filter(
+            zamowienie__status__in=STATUSY_ZAMOWIEN_W_DRODZE,
+            zrealizowane=False,
+            ilosc_zamowiona__gt=F('ilosc_dostarczona')
+        )
+        if narzedzie_ids is not None:
+            pozycje = pozycje.filter(narzedzie_typ_id__in={i for i in narzedzie_ids if i})
+
+        brakujace = F('ilosc_zamowiona') - F('ilosc_dostarczona')
+        wiersze = pozycje.order_by().values('narzedzie_typ_id').annotate(
+            sztuki=Sum(Case(
+                When(jednostka='kompl', then=brakujace * F('ilosc_w_komplecie')),
+                default=brakujace,
+                output_field=IntegerField()
+            ))
+        )
+
+        return {w['narzedzie_typ_id']: w['sztuki'] for w in wiersze}
+
+
+# ============================================================================
+# SERWIS ZESTAWIENIA STANÓW MAGAZYNOWYCH
+# ============================================================================
+
+class StanMagazynowyService:
+    """
+    Serwis utrzymujący tabelę StanMagazynowy (jeden wiersz na typ narzędzia).
+    Wywoływany przy każdej zmianie egzemplarzy i wypożyczeń (patrz signals.py).
+    Przeliczone narzędzia oznaczane są do ponownej oceny w generatorze.
+    """
+
+    @staticmethod
+    @transaction.atomic
+    def przelicz(narzedzie_ids):
+        """
+        Przelicza zestawienie stanów dla wskazanych typów narzędzi.
+
+        Blokuje wiersze narzędzi (SELECT ... FOR UPDATE), więc równoległe
+        przeliczenia tego samego narzędzia wykonują się kolejno. Ilości liczy
+        SilnikStanow (jedno zapytanie na egzemplarze, jedno na zamówienia
+        w drodze), a wynik zapisywany jest jednym poleceniem
+        INSERT ... ON CONFLICT UPDATE.
+
+        Args:
+            narzedzie_ids: Iterowalna kolekcja ID typów narzędzi
+
+        Returns:
+            int: Liczba przeliczonych narzędzi
+        """
+        ids = list(
+            NarzedzieMagazynowe.objects.select_for_update()
+            .filter(id__in={i for i in narzedzie_ids if i})
+            .values_list('id', flat=True)
+        )
+        if not ids:
+            return 0
+
+        ilosci = SilnikStanow.dla_narzedzi(ids)
+        w_drodze = SilnikStanow.w_drodze(ids)
+
+        StanMagazynowy.objects.bulk_create(
+            [
+                StanMagazynowy(
+                    narzedzie_typ_id=narzedzie_id,
+                    ilosc_nowych=wartosci['nowe_szt'],
+                    ilosc_uzywanych_dostepnych=wartosci['uzywane_szt'],
+                    ilosc_w_uzyciu=wartosci['w_uzyciu_szt'],
+                    calkowita_ilosc=wartosci['dostepne_szt'],
+                    ilosc_w_drodze=w_drodze.get(narzedzie_id, 0),
+                )
+                for narzedzie_id, wartosci in ilosci.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['narzedzie_typ'],
+            update_fields=[
+                'ilosc_nowych',
+                'ilosc_uzywanych_dostepnych',
+                'ilosc_w_uzyciu',
+                'calkowita_ilosc',
+                'ilosc_w_drodze',
+                'data_aktualizacji',
+            ],
+        )
+        podbij_wersje(StanMagazynowy)
+
+        GeneratorZamowienService.oznacz_do_przeliczenia(ids)
+
+        # Otwarte panele magazynu / zakupów łatają ilości bez ponownego pobierania listy
+        opublikuj_po_zatwierdzeniu([
+            {
+                'typ': 'stan',
+                'narzedzie_id': narzedzie_id,
+                'stan': {
+                    'ilosc_nowych': wartosci['nowe_szt'],
+                    'ilosc_uzywanych_dostepnych': wartosci['uzywane_szt'],
+                    'ilosc_w_uzyciu': wartosci['w_uzyciu_szt'],
+                    'calkowita_ilosc': wartosci['dostepne_szt'],
+                    'ilosc_w_drodze': w_drodze.get(narzedzie_id, 0),
+                },
+            }
+            for narzedzie_id, wartosci in ilosci.items()
+        ])
+
+        return len(ids)
+
+    @staticmethod
+    def przebuduj(rozmiar_paczki=1000):
+        """
+        Przebudowuje całe zestawienie stanów (np. po imporcie danych).
+
+        Args:
+            rozmiar_paczki: Liczba narzędzi przeliczanych w jednej transakcji
+
+        Returns:
+            int: Liczba przeliczonych narzędzi
+        """
+        ids = list(NarzedzieMagazynowe.objects.order_by('id').values_list('id', flat=True))
+
+        przeliczone = 0
+        for start in range(0, len(ids), rozmiar_paczki):
+            przeliczone += StanMagazynowyService.przelicz(ids[start:start + rozmiar_paczki])
+
+        return przeliczone
+
+
+# ============================================================================
+# SERWIS ZARZĄDZANIA NARZĘDZIAMI
+# ============================================================================
+
+class NarzedzieService:
+    """
+    Serwis zawierający logikę biznesową związaną z narzędziami.
+    """
+
+    @staticmethod
+    def policz_egzemplarze_narzedzia(narzedzie):
+        """
+        Oblicza ilości egzemplarzy narzędzia według stanów.
+
+        Args:
+            narzedzie: Instancja modelu Narzedzie
+
+        Returns:
+            dict: Słownik z ilościami {
+                'nowe': int,
+                'uzywane': int,
+                'w_uzyciu': int,
+                'calkowita': int
+            }
+        """
+        stan = SilnikStanow.dla_narzedzia(narzedzie.id)
+
+        return {
+            'nowe': stan['nowe_egz'],
+            'uzywane': stan['uzywane_egz'],
+            'w_uzyciu': stan['w_uzyciu_egz'],
+            'calkowita': stan['razem_egz'],
+        }
+
+
+# ============================================================================
+# SYNCHRONIZACJA PRZYROSTOWA
+# ============================================================================
+
+class SledzenieZmianService:
+    """
+    Tokeny synchronizacji przyrostowej list (?since=).
+
+    Token to znacznik czasu rozpoczęcia zapytania (mikrosekundy od epoki).
+    Kolejne zapytanie zwraca wiersze z data_modyfikacji od tokenu minus
+    MARGINES - pokrywa to transakcje, które nadały datę przed wydaniem
+    tokenu, a zatwierdziły się po nim (wiersz może przyjść dwa razy, co
+    klientowi nie szkodzi). Usunięcia odczytywane są z UsunietyObiekt.
+    """
+
+    MARGINES = timedelta(seconds=5)
+    RETENCJA = timedelta(days=7)
+
+    @staticmethod
+    def token(teraz=None):
+        teraz = teraz or timezone.now()
+        return str(int(teraz.timestamp() * 1_000_000))
+
+    @classmethod
+    def odczytaj_token(cls, token, teraz=None):
+        """
+        Zamienia token na moment, od którego szukać zmian.
+
+        Returns:
+            datetime lub None, gdy token jest starszy niż RETENCJA
+            (ślady usunięć mogły zostać wyczyszczone - potrzebne pełne pobranie)
+
+        Raises:
+            ValidationError: Gdy token jest nieprawidłowy
+        """
+        try:
+            od = datetime.fromtimestamp(int(token) / 1_000_000, tz=dt_timezone.utc)
+        except (TypeError, ValueError, OverflowError, OSError):
+            raise ValidationError("Nieprawidłowy token synchronizacji.")
+        if not settings.USE_TZ:
+            od = timezone.make_naive(od)
+
+        if od < (teraz or timezone.now()) - cls.RETENCJA:
+            return None
+        return od - cls.MARGINES
+
+    @staticmethod
+    def zarejestruj_usuniecie(typ, obiekt_ids):
+        UsunietyObiekt.objects.bulk_create([UsunietyObiekt(typ=typ, obiekt_id=i) for i in obiekt_ids])
+
+    @staticmethod
+    def usuniete(typ, od):
+        """ID obiektów danego typu usuniętych od wskazanego momentu."""
+        return set(
+            UsunietyObiekt.objects.filter(typ=typ, data_usuniecia__gte=od).values_list('obiekt_id', flat=True)
+        )
+
+    @classmethod
+    def wyczysc(cls, teraz=None):
+        """Usuwa ślady starsze niż RETENCJA. Zwraca liczbę usuniętych wpisów."""
+        granica = (teraz or timezone.now()) - cls.RETENCJA
+        return UsunietyObiekt.objects.filter(data_usuniecia__lt=granica).delete()[0]
+
+
+# ============================================================================
+# DANE STARTOWE PANELU MAGAZYNU
+# ============================================================================
+
+class PanelMagazynuService:
+    """
+    Dane startowe panelu magazynu w jednym zapytaniu HTTP.
+
+    Narzędzia ze stanami, wypożyczenia w użyciu i słowniki do list wyboru
+    budowane są zwykłymi .values(), bez serializerów. Całość trafia do
+    cache pod wersją złożoną z liczników modeli źródłowych (wersje.py) -
+    dopóki żaden się nie zmieni, dane wracają bez zapytań SQL.
+    """
+
+    CZAS_CACHE = 600
+    PREFIKS_CACHE = 'panel_magazynu'
+    MODELE = (
+        NarzedzieMagazynowe, StanMagazynowy, EgzemplarzNarzedzia, HistoriaUzyciaNarzedzia,
+        Kategoria, Podkategoria, Maszyna, Lokalizacja, Pracownik, Zamowienie, Dostawca,
+    )
+
+    @staticmethod
+    def _obraz_url(nazwa):
+        if not nazwa:
+            return None
+        return NarzedzieMagazynowe._meta.get_field('obraz').storage.url(nazwa)
+
+    @staticmethod
+    def _slowniki():
+        """Lekkie listy wyboru - 6 zapytań bez względu na liczbę wierszy."""
+        podkategorie = defaultdict(list)
+        for podkategoria in Podkategoria.objects.order_by('nazwa').values('id', 'nazwa', 'kategoria_id'):
+            podkategorie[podkategoria.pop('kategoria_id')].append(podkategoria)
+
+        zamowienia = [
+            {'id': z['id'], 'numer': z['numer'], 'status': z['status'],
+             'dostawca': {'nazwa_firmy': z['dostawca__nazwa_firmy']}}
+            for z in Zamowienie.objects.order_by('-data_utworzenia').values(
+                'id', 'numer', 'status', 'dostawca__nazwa_firmy'
+            )
+        ]
+
+        return {
+            'kategorie': [
+                {**kategoria, 'podkategorie': podkategorie.get(kategoria['id'], [])}
+                for kategoria in Kategoria.objects.values('id', 'nazwa')
+            ],
+            'maszyny': list(Maszyna.objects.values('id', 'nazwa')),
+            'lokalizacje': list(Lokalizacja.objects.values('id', 'szafa', 'kolumna', 'polka')),
+            'pracownicy': list(Pracownik.objects.values('id', 'imie', 'nazwisko')),
+            'zamowienia': zamowienia,
+        }
+
+    @classmethod
+    def wersja(cls):
+        """Wersja danych panelu - zmienia się przy każdej zmianie ich źródeł."""
+        return hashlib.md5(repr(wersje(cls.MODELE)).encode()).hexdigest()
+
+    @classmethod
+    def _narzedzia(cls):
+        wiersze = NarzedzieMagazynowe.objects.order_by(
+            'podkategoria__kategoria__nazwa', 'podkategoria__nazwa', 'opis'
+        ).values(
+            'id', 'opis', 'numer_katalogowy', 'obraz', 'opakowanie', 'ilosc_w_opakowaniu',
+            'podkategoria_id', 'podkategoria__nazwa', 'podkategoria__kategoria__nazwa',
+            'domyslna_lokalizacja_id',
+            'stan_magazynowy__ilosc_nowych', 'stan_magazynowy__ilosc_uzywanych_dostepnych',
+            'stan_magazynowy__ilosc_w_uzyciu', 'stan_magazynowy__calkowita_ilosc',
+            'stan_magazynowy__ilosc_w_drodze',
+        )
+
+        # Kształt zgodny z NarzedzieMagazynoweSerializer przy
+        # ?expand=podkategoria,domyslna_lokalizacja (podzbiór pól) -
+        # wiersze z synchronizacji przyrostowej podmieniają te bez konwersji
+        return [{
+            'id': w['id'],
+            'opis': w['opis'],
+            'numer_katalogowy': w['numer_katalogowy'],
+            'obraz': cls._obraz_url(w['obraz']),
+            'opakowanie': w['opakowanie'],
+            'ilosc_w_opakowaniu': w['ilosc_w_opakowaniu'],
+            'podkategoria': {
+                'id': w['podkategoria_id'],
+                'nazwa': w['podkategoria__nazwa'],
+                'kategoria_nazwa': w['podkategoria__kategoria__nazwa'],
+            } if w['podkategoria_id'] else None,
+            'domyslna_lokalizacja': {'id': w['domyslna_lokalizacja_id']} if w['domyslna_lokalizacja_id'] else None,
+            'ilosc_nowych': w['stan_magazynowy__ilosc_nowych'] or 0,
+            'ilosc_uzywanych_dostepnych': w['stan_magazynowy__ilosc_uzywanych_dostepnych'] or 0,
+            'ilosc_w_uzyciu': w['stan_magazynowy__ilosc_w_uzyciu'] or 0,
+            'calkowita_ilosc': w['stan_magazynowy__calkowita_ilosc'] or 0,
+            'ilosc_w_drodze': w['stan_magazynowy__ilosc_w_drodze'] or 0,
+        } for w in wiersze]
+
+    @staticmethod
+    def _wypozyczenia():
+        wiersze = HistoriaUzyciaNarzedzia.objects.filter(data_zwrotu__isnull=True).order_by('-data_wydania').values(
+            'id', 'data_wydania', 'egzemplarz_id',
+            'narzedzie_typ_id', 'narzedzie_typ__opis',
+            'narzedzie_typ__podkategoria__nazwa',
+            'narzedzie_typ__podkategoria__kategoria__nazwa',
+            'maszyna_id', 'maszyna__nazwa',
+            'pracownik_id', 'pracownik__imie', 'pracownik__nazwisko',
+        )
+
+        # Kształt zgodny z HistoriaUzyciaNarzedziaSerializer przy
+        # ?expand=egzemplarz.narzedzie_typ.podkategoria.kategoria,maszyna,pracownik (podzbiór pól)
+        return [{
+            'id': w['id'],
+            'data_wydania': w['data_wydania'],
+            'data_zwrotu': None,
+            'egzemplarz': {
+                'id': w['egzemplarz_id'],
+                'narzedzie_typ': {
+                    'id': w['narzedzie_typ_id'],
+                    'opis': w['narzedzie_typ__opis'],
+                    'podkategoria': {
+                        'nazwa': w['narzedzie_typ__podkategoria__nazwa'],
+                        'kategoria': {'nazwa': w['narzedzie_typ__podkategoria__kategoria__nazwa']},
+                    } if w['narzedzie_typ__podkategoria__nazwa'] is not None else None,
+                },
+            },
+            'maszyna': {'id': w['maszyna_id'], 'nazwa': w['maszyna__nazwa']} if w['maszyna_id'] else None,
+            'pracownik': {
+                'id': w['pracownik_id'], 'imie': w['pracownik__imie'], 'nazwisko': w['pracownik__nazwisko'],
+            } if w['pracownik_id'] else None,
+        } for w in wiersze]
+
+    @classmethod
+    def dane_startowe(cls):
+        """
+        Dane startowe panelu magazynu.
+
+        Returns:
+            dict: wersja, tokeny synchronizacji przyrostowej (z chwili
+            zbudowania danych), narzędzia, wypożyczenia i słowniki
+        """
+        wersja = cls.wersja()
+        klucz = f'{cls.PREFIKS_CACHE}:{wersja}'
+        cache = pobierz_cache()
+
+        dane = cache.get(klucz)
+        if dane is None:
+            token = SledzenieZmianService.token()
+            dane = {
+                'wersja': wersja,
+                'tokeny': {'narzedzia': token, 'wypozyczenia': token},
+                'narzedzia': cls._narzedzia(),
+                'wypozyczenia': cls._wypozyczenia(),
+                **cls._slowniki(),
+            }
+            cache.set(klucz, dane, cls.CZAS_CACHE)
+
+        return dane
+
+
+# ============================================================================
+# SERWIS NUMERACJI ZAMÓWIEŃ
+# ============================================================================
+
+class NumeracjaZamowienService:
+    """
+    Przydział numerów zamówień RRRR/MM/NNN z licznika miesięcznego (LicznikZamowien).
+    Koszt przydziału nie zależy od liczby istniejących zamówień.
+    """
+
+    @staticmethod
+    def _utworz_licznik(rok, miesiac):
+        """
+        Zakłada licznik miesiąca, jeśli jeszcze nie istnieje.
+
+        Nowy licznik startuje od najwyższego numeru zamówień z tego miesiąca
+        utworzonych przed wprowadzeniem liczników (jednorazowe skanowanie).
+        """
+        if LicznikZamowien.objects.filter(rok=rok, miesiac=miesiac).exists():
+            return
+
+        ostatni_numer = Zamowienie.objects.filter(
+            numer__startswith=f"{rok}/{miesiac:02d}/"
+        ).order_by('-numer').values_list('numer', flat=True).first()
+
+        start = 0
+        if ostatni_numer:
+            try:
+                start = int(ostatni_numer.split('/')[-1])
+            except ValueError:
+                start = 0
+
+        # ignore_conflicts - równoległe założenie licznika nie powoduje błędu
+        LicznikZamowien.objects.bulk_create(
+            [LicznikZamowien(rok=rok, miesiac=miesiac, ostatni_numer=start)],
+            ignore_conflicts=True
+        )
+
+    @classmethod
+    @transaction.atomic
+    def przydziel_numery(cls, ilosc=1, data=None):
+        """
+        Rezerwuje kolejne numery zamówień w miesiącu podanej daty.
+
+        Licznik zwiększany jest jednym atomowym UPDATE (ostatni_numer + ilosc),
+        który blokuje wiersz do końca transakcji - równoległe przydziały
+        czekają na siebie zamiast kolidować na unikalnym polu numer.
+
+        Args:
+            ilosc: Liczba numerów do zarezerwowania
+            data: Data zamówienia (domyślnie teraz)
+
+        Returns:
+            list: Zarezerwowane numery w kolejności rosnącej
+        """
+        if ilosc <= 0:
+            return []
+
+        data = data or timezone.now()
+        rok, miesiac = data.year, data.month
+
+        cls._utworz_licznik(rok, miesiac)
+
+        licznik = LicznikZamowien.objects.filter(rok=rok, miesiac=miesiac)
+        licznik.update(ostatni_numer=F('ostatni_numer') + ilosc)
+        ostatni = licznik.values_list('ostatni_numer', flat=True).get()
+
+        return [f"{rok}/{miesiac:02d}/{nr:03d}" for nr in range(ostatni - ilosc + 1, ostatni + 1)]
+
+    @classmethod
+    def przydziel_numer(cls, data=None):
+        """Rezerwuje pojedynczy numer zamówienia."""
+        return cls.przydziel_numery(1, data)[0]
+
+
+# ============================================================================
+# SERWIS CEN ZAKUPU
+# ============================================================================
+
+class CenyService:
+    """
+    Historia cen zakupu i aktualne ceny per (narzędzie, dostawca).
+
+    HistoriaCen dostaje wpis dla każdej pozycji zamówienia z ceną,
+    a AktualnaCena trzyma ostatnią cenę każdej pary - odczyty dla wielu
+    narzędzi to jedno zapytanie po unikalnym indeksie, bez sortowania
+    tabeli pozycji zamówień.
+    """
+
+    @classmethod
+    @transaction.atomic
+    def zarejestruj_pozycje(cls, pozycje):
+        """
+        Zapisuje (lub aktualizuje) wpisy historii dla pozycji zamówień.
+
+        Pozycje bez ceny usuwają swój wpis. Wywoływane z sygnału przy
+        zapisie pojedynczej pozycji oraz jawnie po bulk_create.
+
+        Args:
+            pozycje: Kolekcja PozycjaZamowienia z załadowanym zamówieniem
+        """
+        wpisy = []
+        bez_ceny = []
+        pary = set()
+
+        for pozycja in pozycje:
+            zamowienie = pozycja.zamowienie
+            pary.add((pozycja.narzedzie_typ_id, zamowienie.dostawca_id))
+            if pozycja.cena_jednostkowa is None:
+                bez_ceny.append(pozycja.id)
+                continue
+            wpisy.append(HistoriaCen(
+                narzedzie_typ_id=pozycja.narzedzie_typ_id,
+                dostawca_id=zamowienie.dostawca_id,
+                pozycja_zamowienia_id=pozycja.id,
+                cena_jednostkowa=pozycja.cena_jednostkowa,
+                data_ceny=zamowienie.data_utworzenia or timezone.now(),
+            ))
+
+        if bez_ceny:
+            # Pary z usuniętych wpisów odświeżane są niżej razem z pozostałymi
+            pary.update(
+                HistoriaCen.objects.filter(pozycja_zamowienia_id__in=bez_ceny).values_list(
+                    'narzedzie_typ_id', 'dostawca_id'
+                )
+            )
+            HistoriaCen.objects.filter(pozycja_zamowienia_id__in=bez_ceny).delete()
+
+        if wpisy:
+            HistoriaCen.objects.bulk_create(
+                wpisy,
+                update_conflicts=True,
+                unique_fields=['pozycja_zamowienia'],
+                update_fields=['narzedzie_typ', 'dostawca', 'cena_jednostkowa', 'data_ceny'],
+            )
+
+        cls.odswiez_aktualne(pary)
+
+    @staticmethod
+    def odswiez_aktualne(pary):
+        """
+        Przelicza AktualnaCena dla podanych par z historii cen.
+
+        Jedno zapytanie z ROW_NUMBER() partycjonowanym po parze, jeden
+        upsert oraz usunięcie par, dla których nie został żaden wpis.
+        Wywoływane wewnątrz transakcji zapisu lub usunięcia pozycji.
+
+        Args:
+            pary: Kolekcja krotek (narzedzie_id, dostawca_id)
+        """
+        pary = {(n, d) for n, d in pary if n is not None and d is not None}
+        if not pary:
+            return
+
+        ostatnie = HistoriaCen.objects.filter(
+            narzedzie_typ_id__in={n for n, _ in pary},
+            dostawca_id__in={d for _, d in pary},
+        ).annotate(
+            kolejnosc=Window(
+                expression=RowNumber(),
+                partition_by=[F('narzedzie_typ_id'), F('dostawca_id')],
+                order_by=[F('data_ceny').desc(), F('id').desc()]
+            )
+        ).filter(kolejnosc=1).values_list('narzedzie_typ_id', 'dostawca_id', 'cena_jednostkowa', 'data_ceny')
+
+        aktualne = [
+            AktualnaCena(narzedzie_typ_id=n, dostawca_id=d, cena_jednostkowa=cena, data_ceny=data)
+            for n, d, cena, data in ostatnie
+            if (n, d) in pary
+        ]
+
+        if aktualne:
+            AktualnaCena.objects.bulk_create(
+                aktualne,
+                update_conflicts=True,
+                unique_fields=['narzedzie_typ', 'dostawca'],
+                update_fields=['cena_jednostkowa', 'data_ceny'],
+            )
+
+        puste = pary - {(c.narzedzie_typ_id, c.dostawca_id) for c in aktualne}
+        if puste:
+            warunek = Q()
+            for n, d in puste:
+                warunek |= Q(narzedzie_typ_id=n, dostawca_id=d)
+            AktualnaCena.objects.filter(warunek).delete()
+
+    @staticmethod
+    def aktualne_ceny(narzedzie_ids, dostawca_id=None):
+        """
+        Aktualne ceny wielu narzędzi jednym zapytaniem.
+
+        Args:
+            narzedzie_ids: Kolekcja ID narzędzi
+            dostawca_id: Opcjonalne zawężenie do jednego dostawcy
+
+        Returns:
+            dict: {(narzedzie_id, dostawca_id): Decimal}
+        """
+        if not narzedzie_ids:
+            return {}
+
+        ceny = AktualnaCena.objects.filter(narzedzie_typ_id__in=narzedzie_ids)
+        if dostawca_id is not None:
+            ceny = ceny.filter(dostawca_id=dostawca_id)
+
+        return {
+            (n, d): cena
+            for n, d, cena in ceny.values_list('narzedzie_typ_id', 'dostawca_id', 'cena_jednostkowa')
+        }
+
+    @staticmethod
+    def ceny_od_ostatniego_dostawcy(narzedzie_ids):
+        """
+        Aktualne ceny od ostatniego dostawcy każdego narzędzia.
+
+        Returns:
+            dict: {narzedzie_id: Decimal}
+        """
+        if not narzedzie_ids:
+            return {}
+
+        return dict(AktualnaCena.objects.filter(
+            narzedzie_typ_id__in=narzedzie_ids,
+            dostawca_id=F('narzedzie_typ__ostatni_dostawca_id')
+        ).values_list('narzedzie_typ_id', 'cena_jednostkowa'))
+
+    @staticmethod
+    def najtansi_dostawcy(narzedzie_ids):
+        """
+        Dostawca z najniższą aktualną ceną dla każdego narzędzia.
+
+        Returns:
+            dict: {narzedzie_id: {'dostawca_id', 'dostawca_nazwa', 'cena_jednostkowa'}}
+        """
+        if not narzedzie_ids:
+            return {}
+
+        najtansze = AktualnaCena.objects.filter(
+            narzedzie_typ_id__in=narzedzie_ids
+        ).annotate(
+            kolejnosc=Window(
+                expression=RowNumber(),
+                partition_by=[F('narzedzie_typ_id')],
+                order_by=[F('cena_jednostkowa').asc(), F('data_ceny').desc()]
+            )
+        ).filter(kolejnosc=1).values_list(
+            'narzedzie_typ_id', 'dostawca_id', 'dostawca__nazwa_firmy', 'cena_jednostkowa'
+        )
+
+        return {
+            n: {'dostawca_id': d, 'dostawca_nazwa': nazwa, 'cena_jednostkowa': cena}
+            for n, d, nazwa, cena in najtansze
+        }
+
+    @staticmethod
+    def trend_cen(narzedzie_id, dostawca_id=None, limit=50):
+        """
+        Historia cen narzędzia od najnowszej (opcjonalnie u jednego dostawcy).
+
+        Returns:
+            list: Słowniki z kluczami data_ceny, dostawca_id, dostawca_nazwa,
+                  cena_jednostkowa, zamowienie_numer
+        """
+        historia = HistoriaCen.objects.filter(narzedzie_typ_id=narzedzie_id)
+        if dostawca_id is not None:
+            historia = historia.filter(dostawca_id=dostawca_id)
+
+        return list(historia.order_by('-data_ceny', '-id').values(
+            'data_ceny',
+            'dostawca_id',
+            'cena_jednostkowa',
+            dostawca_nazwa=F('dostawca__nazwa_firmy'),
+            zamowienie_numer=F('pozycja_zamowienia__zamowienie__numer'),
+        )[:limit])
+
+
+# ============================================================================
+# SERWIS PROGNOZY ZUŻYCIA
+# ============================================================================
+
+class PrognozaZuzyciaService:
+    """
+    Prognoza zużycia narzędzi i zapotrzebowania na czas dostawy.
+
+    Tygodniowe szeregi uszkodzeń i wydań dla całego katalogu pobierane są
+    dwoma zapytaniami grupującymi, czasy dostaw dostawców jednym. Dalsze
+    obliczenia to sumy na słownikach, bez zapytań w pętli po narzędziach.
+    Wynik zapisywany jest wsadowo w PrognozaZuzycia (komenda prognozuj_zuzycie).
+    """
+
+    OKRES_HISTORII_DNI = 365
+    # Jak często składane są zamówienia - zapas musi wystarczyć do następnego
+    OKRES_PRZEGLADU_DNI = 14
+    DOMYSLNY_CZAS_DOSTAWY_DNI = 14
+    # Współczynnik z rozkładu normalnego dla ~95% poziomu obsługi
+    WSPOLCZYNNIK_BEZPIECZENSTWA = 1.65
+
+    @staticmethod
+    def _szeregi_tygodniowe(queryset, pole_daty, pole_narzedzia, pole_ilosci):
+        """
+        Sumy tygodniowe (w sztukach) zgrupowane po narzędziu i tygodniu.
+
+        Returns:
+            dict: {narzedzie_id: (suma, suma_kwadratow_tygodni)}
+        """
+        wiersze = queryset.annotate(
+            tydzien=TruncWeek(pole_daty)
+        ).order_by().values(pole_narzedzia, 'tydzien').annotate(
+            sztuki=Sum(pole_ilosci)
+        )
+
+        wynik = defaultdict(lambda: [0, 0])
+        for wiersz in wiersze:
+            sztuki = wiersz['sztuki'] or 0
+            sumy = wynik[wiersz[pole_narzedzia]]
+            sumy[0] += sztuki
+            sumy[1] += sztuki * sztuki
+
+        return {narzedzie_id: tuple(sumy) for narzedzie_id, sumy in wynik.items()}
+
+    @classmethod
+    def czasy_dostaw(cls, od):
+        """
+        Średni czas dostawy (dni) per dostawca: od wysłania zamówienia
+        do pierwszej realizacji.
+
+        Returns:
+            dict: {dostawca_id: int}
+        """
+        zamowienia = Zamowienie.objects.filter(
+            data_wyslania__isnull=False,
+            data_wyslania__gte=od
+        ).annotate(
+            pierwsza_realizacja=Min('realizacje__data_realizacji')
+        ).filter(
+            pierwsza_realizacja__isnull=False
+        ).values_list('dostawca_id', 'data_wyslania', 'pierwsza_realizacja')
+
+        dni = defaultdict(list)
+        for dostawca_id, wyslane, zrealizowane in zamowienia:
+            dni[dostawca_id].append(max((zrealizowane - wyslane).total_seconds() / 86400, 0))
+
+        return {
+            dostawca_id: max(math.ceil(round(sum(wartosci) / len(wartosci), 6)), 1)
+            for dostawca_id, wartosci in dni.items()
+        }
+
+    @classmethod
+    def oblicz(cls, okres_dni=None, teraz=None):
+        """
+        Oblicza prognozę dla całego katalogu.
+
+        Zużycie to uszkodzone sztuki na dzień. Narzędzia bez uszkodzeń
+        w okresie, ale wydawane, dostają zużycie szacowane z wydań
+        pomnożonych przez katalogowy wskaźnik uszkodzeń na wydanie.
+        Zapas bezpieczeństwa: Z * sigma_dzienne * sqrt(czas dostawy + okres przeglądu).
+
+        Args:
+            okres_dni: Długość analizowanej historii (domyślnie OKRES_HISTORII_DNI)
+            teraz: Moment obliczenia (domyślnie timezone.now())
+
+        Returns:
+            dict: {narzedzie_id: {'zuzycie_dzienne', 'odchylenie_dzienne',
+                   'czas_dostawy_dni', 'zapas_bezpieczenstwa', 'zapotrzebowanie'}}
+        """
+        okres_dni = okres_dni or cls.OKRES_HISTORII_DNI
+        teraz = teraz or timezone.now()
+        od = teraz - timedelta(days=okres_dni)
+        tygodnie = max(math.ceil(okres_dni / 7), 1)
+
+        # Typ i wielkość kompletu z migawki - uszkodzenia utylizowanych egzemplarzy też się liczą
+        uszkodzenia = cls._szeregi_tygodniowe(
+            Uszkodzenie.objects.filter(data_uszkodzenia__gte=od, narzedzie_typ__isnull=False),
+            'data_uszkodzenia',
+            'narzedzie_typ_id',
+            'ilosc_w_komplecie'
+        )
+        wydania = cls._szeregi_tygodniowe(
+            HistoriaUzyciaNarzedzia.objects.filter(data_wydania__gte=od),
+            'data_wydania',
+            'narzedzie_typ_id',
+            'egzemplarz__ilosc_w_komplecie'
+        )
+        czasy_dostaw = cls.czasy_dostaw(od)
+
+        suma_wydan = sum(suma for suma, _ in wydania.values())
+        suma_uszkodzen = sum(suma for suma, _ in uszkodzenia.values())
+        wskaznik_uszkodzen = min(suma_uszkodzen / suma_wydan, 1) if suma_wydan else 0
+
+        wynik = {}
+        for narzedzie_id, dostawca_id in NarzedzieMagazynowe.objects.values_list('id', 'ostatni_dostawca_id'):
+            if narzedzie_id in uszkodzenia:
+                suma, suma_kwadratow = uszkodzenia[narzedzie_id]
+            elif narzedzie_id in wydania:
+                suma, suma_kwadratow = wydania[narzedzie_id]
+                suma *= wskaznik_uszkodzen
+                suma_kwadratow *= wskaznik_uszkodzen ** 2
+            else:
+                suma = suma_kwadratow = 0
+
+            srednia_tyg = suma / tygodnie
+            wariancja_tyg = 0
+            if tygodnie > 1:
+                wariancja_tyg = max((suma_kwadratow - tygodnie * srednia_tyg ** 2) / (tygodnie - 1), 0)
+
+            zuzycie = srednia_tyg / 7
+            odchylenie = math.sqrt(wariancja_tyg / 7)
+            czas_dostawy = czasy_dostaw.get(dostawca_id, cls.DOMYSLNY_CZAS_DOSTAWY_DNI)
+            horyzont = czas_dostawy + cls.OKRES_PRZEGLADU_DNI
+
+            zapas = math.ceil(round(cls.WSPOLCZYNNIK_BEZPIECZENSTWA * odchylenie * math.sqrt(horyzont), 6))
+            zapotrzebowanie = math.ceil(round(zuzycie * horyzont, 6)) + zapas if zuzycie > 0 else 0
+
+            wynik[narzedzie_id] = {
+                'zuzycie_dzienne': Decimal(str(round(zuzycie, 4))),
+                'odchylenie_dzienne': Decimal(str(round(odchylenie, 4))),
+                'czas_dostawy_dni': czas_dostawy,
+                'zapas_bezpieczenstwa': zapas,
+                'zapotrzebowanie': zapotrzebowanie,
+            }
+
+        return wynik
+
+    @classmethod
+    def przelicz_wszystkie(cls, okres_dni=None, rozmiar_paczki=1000):
+        """
+        Przelicza i zapisuje prognozy całego katalogu (zadanie wsadowe).
+
+        Narzędzia, których zapotrzebowanie się zmieniło, oznaczane są
+        do ponownej oceny w generatorze zamówień.
+
+        Returns:
+            int: Liczba zapisanych prognoz
+        """
+        prognozy = cls.oblicz(okres_dni)
+        poprzednie = dict(PrognozaZuzycia.objects.values_list('narzedzie_typ_id', 'zapotrzebowanie'))
+
+        with transaction.atomic():
+            PrognozaZuzycia.objects.bulk_create(
+                [PrognozaZuzycia(narzedzie_typ_id=narzedzie_id, **wartosci) for narzedzie_id, wartosci in prognozy.items()],
+                batch_size=rozmiar_paczki,
+                update_conflicts=True,
+                unique_fields=['narzedzie_typ'],
+                update_fields=[
+                    'zuzycie_dzienne',
+                    'odchylenie_dzienne',
+                    'czas_dostawy_dni',
+                    'zapas_bezpieczenstwa',
+                    'zapotrzebowanie',
+                    'data_obliczenia',
+                ],
+            )
+            GeneratorZamowienService.oznacz_do_przeliczenia(
+                narzedzie_id for narzedzie_id, wartosci in prognozy.items()
+                if poprzednie.get(narzedzie_id, 0) != wartosci['zapotrzebowanie']
+            )
+
+        return len(prognozy)
+
+
+# ============================================================================
+# OPTYMALIZACJA LIMITÓW MIN/MAX
+# ============================================================================
+
+class OptymalizatorLimitowService:
+    """
+    Optymalizacja stan_minimalny / stan_maksymalny na podstawie historii.
+
+    Dzienne przepływy (wydania, zwroty, uszkodzenia) całego katalogu
+    pobierane są trzema zapytaniami grupującymi. Dla każdego narzędzia
+    polityka (min, max) odtwarzana jest na tej historii symulacją
+    zdarzeniową (tylko dni z ruchem), z dostawą po czasie dostawy dostawcy.
+    Wynikiem jest lista zmian do przeglądu, zatwierdzana jednym bulk_update.
+    """
+
+    OKRES_HISTORII_DNI = 365
+    # Docelowy odsetek popytu obsłużonego z magazynu
+    POZIOM_OBSLUGI = 0.95
+
+    @staticmethod
+    def _przeplywy_dzienne(od):
+        """
+        Dzienne zmiany dostępnych sztuk per narzędzie (wydania -, zwroty +, uszkodzenia -).
+
+        Returns:
+            dict: {narzedzie_id: [(dzien, zmiana), ...]} posortowane po dniu,
+                  dzien liczony od daty początkowej
+        """
+        zrodla = [
+            (
+                HistoriaUzyciaNarzedzia.objects.filter(data_wydania__gte=od),
+                'data_wydania', 'egzemplarz__ilosc_w_komplecie', -1
+            ),
+            (
+                HistoriaUzyciaNarzedzia.objects.filter(data_zwrotu__gte=od),
+                'data_zwrotu', 'egzemplarz__ilosc_w_komplecie', 1
+            ),
+            (
+                Uszkodzenie.objects.filter(data_uszkodzenia__gte=od, narzedzie_typ__isnull=False),
+                'data_uszkodzenia', 'ilosc_w_komplecie', -1
+            ),
+        ]
+        poczatek = od.date()
+
+        zmiany = defaultdict(lambda: defaultdict(int))
+        for queryset, pole_daty, pole_ilosci, znak in zrodla:
+            wiersze = queryset.annotate(
+                dzien=TruncDate(pole_daty)
+            ).order_by().values('narzedzie_typ_id', 'dzien').annotate(
+                sztuki=Sum(pole_ilosci)
+            )
+            for wiersz in wiersze:
+                dzien = (wiersz['dzien'] - poczatek).days
+                zmiany[wiersz['narzedzie_typ_id']][dzien] += znak * (wiersz['sztuki'] or 0)
+
+        return {
+            narzedzie_id: sorted((dzien, zmiana) for dzien, zmiana in dni.items() if zmiana)
+            for narzedzie_id, dni in zmiany.items()
+        }
+
+    @staticmethod
+    def symuluj(zdarzenia, minimum, maksimum, czas_dostawy, horyzont):
+        """
+        Odtwarza politykę (min, max) na historii zdarzeń jednego narzędzia.
+
+        Start z pełnym stanem (max). Gdy stan + zamówione spadnie do min,
+        zamawiane jest uzupełnienie do max, dostarczane po czas_dostawy dniach.
+
+        Args:
+            zdarzenia: Lista (dzien, zmiana) posortowana po dniu
+            minimum, maksimum: Badana polityka
+            czas_dostawy: Dni od zamówienia do dostawy
+            horyzont: Długość okresu w dniach
+
+        Returns:
+            tuple: (poziom_obslugi, sredni_stan, liczba_zamowien)
+        """
+        stan = maksimum
+        zamowione = 0
+        dostawy = deque()
+        popyt = niedobor = 0
+        pole_stanu = 0
+        ostatni_dzien = 0
+        zamowienia = 0
+
+        for dzien, zmiana in zdarzenia:
+            while dostawy and dostawy[0][0] <= dzien:
+                dzien_dostawy, ilosc = dostawy.popleft()
+                pole_stanu += stan * (dzien_dostawy - ostatni_dzien)
+                ostatni_dzien = dzien_dostawy
+                stan += ilosc
+                zamowione -= ilosc
+
+            pole_stanu += stan * (dzien - ostatni_dzien)
+            ostatni_dzien = dzien
+
+            if zmiana < 0:
+                popyt -= zmiana
+                wydane = min(stan, -zmiana)
+                niedobor += -zmiana - wydane
+                stan -= wydane
+            else:
+                stan += zmiana
+
+            if stan + zamowione <= minimum:
+                ilosc = maksimum - stan - zamowione
+                if ilosc > 0:
+                    dostawy.append((dzien + czas_dostawy, ilosc))
+                    zamowione += ilosc
+                    zamowienia += 1
+
+        pole_stanu += stan * max(horyzont - ostatni_dzien, 0)
+        poziom_obslugi = 1 - niedobor / popyt if popyt else 1
+
+        return poziom_obslugi, pole_stanu / max(horyzont, 1), zamowienia
+
+    @classmethod
+    def _najlepsza_polityka(cls, zdarzenia, czas_dostawy, horyzont):
+        """
+        Najtańsza (najniższy średni stan) polityka spełniająca poziom obsługi.
+
+        Dla kilku wielkości uzupełnienia (max - min) minimum szukane jest
+        bisekcją - poziom obsługi rośnie wraz z minimum - więc na narzędzie
+        wykonywanych jest kilkanaście symulacji zamiast pełnej siatki.
+        """
+        popyt = sum(-zmiana for _, zmiana in zdarzenia if zmiana < 0)
+        dzienny = popyt / max(horyzont, 1)
+        najwiekszy_dzien = max((-zmiana for _, zmiana in zdarzenia if zmiana < 0), default=0)
+
+        uzupelnienia = sorted({
+            max(math.ceil(dzienny * dni), 1)
+            for dni in (1, PrognozaZuzyciaService.OKRES_PRZEGLADU_DNI,
+                        2 * PrognozaZuzyciaService.OKRES_PRZEGLADU_DNI,
+                        4 * PrognozaZuzyciaService.OKRES_PRZEGLADU_DNI)
+        })
+        gorne_minimum = max(math.ceil(dzienny * czas_dostawy * 3), najwiekszy_dzien) + 2
+
+        najlepsza = None
+        for uzupelnienie in uzupelnienia:
+            dol, gora = 0, gorne_minimum
+            while dol < gora:
+                srodek = (dol + gora) // 2
+                obsluga, _, _ = cls.symuluj(zdarzenia, srodek, srodek + uzupelnienie, czas_dostawy, horyzont)
+                if obsluga >= cls.POZIOM_OBSLUGI:
+                    gora = srodek
+                else:
+                    dol = srodek + 1
+
+            wynik = cls.symuluj(zdarzenia, dol, dol + uzupelnienie, czas_dostawy, horyzont)
+            # Najpierw poziom obsługi (do progu), potem średni stan, potem liczba zamówień
+            klucz = (-min(wynik[0], cls.POZIOM_OBSLUGI), wynik[1], wynik[2])
+            if najlepsza is None or klucz < najlepsza[0]:
+                najlepsza = (klucz, dol, dol + uzupelnienie, wynik)
+
+        _, minimum, maksimum, wynik = najlepsza
+        return minimum, maksimum, wynik
+
+    @classmethod
+    def propozycje(cls, okres_dni=None, teraz=None):
+        """
+        Proponowane limity dla narzędzi z ruchem w analizowanym okresie.
+
+        Returns:
+            list: Słowniki zmian (tylko narzędzia, dla których propozycja różni
+                  się od obecnych limitów) z wynikami symulacji obecnej
+                  i proponowanej polityki
+        """
+        okres_dni = okres_dni or cls.OKRES_HISTORII_DNI
+        teraz = teraz or timezone.now()
+        od = teraz - timedelta(days=okres_dni)
+
+        przeplywy = cls._przeplywy_dzienne(od)
+        if not przeplywy:
+            return []
+
+        czasy_dostaw = PrognozaZuzyciaService.czasy_dostaw(od)
+        narzedzia = NarzedzieMagazynowe.objects.filter(id__in=przeplywy).order_by('id').values_list(
+            'id', 'opis', 'stan_minimalny', 'stan_maksymalny', 'ostatni_dostawca_id'
+        )
+
+        wynik = []
+        for narzedzie_id, opis, obecne_min, obecne_max, dostawca_id in narzedzia:
+            zdarzenia = przeplywy[narzedzie_id]
+            czas_dostawy = czasy_dostaw.get(dostawca_id, PrognozaZuzyciaService.DOMYSLNY_CZAS_DOSTAWY_DNI)
+
+            nowe_min, nowe_max, (obsluga, sredni_stan, zamowienia) = cls._najlepsza_polityka(
+                zdarzenia, czas_dostawy, okres_dni
+            )
+            if (nowe_min, nowe_max) == (obecne_min, obecne_max):
+                continue
+
+            obecna_obsluga, obecny_stan, obecne_zamowienia = cls.symuluj(
+                zdarzenia, obecne_min, obecne_max, czas_dostawy, okres_dni
+            )
+            wynik.append({
+                'id': narzedzie_id,
+                'opis': opis,
+                'czas_dostawy_dni': czas_dostawy,
+                'stan_minimalny': {'obecny': obecne_min, 'proponowany': nowe_min},
+                'stan_maksymalny': {'obecny': obecne_max, 'proponowany': nowe_max},
+                'poziom_obslugi': {'obecny': round(obecna_obsluga, 4), 'proponowany': round(obsluga, 4)},
+                'sredni_stan': {'obecny': round(obecny_stan, 2), 'proponowany': round(sredni_stan, 2)},
+                'liczba_zamowien': {'obecny': obecne_zamowienia, 'proponowany': zamowienia},
+            })
+
+        return wynik
+
+    @staticmethod
+    @transaction.atomic
+    def zastosuj(zmiany):
+        """
+        Zapisuje zatwierdzone limity jednym bulk_update.
+
+        Args:
+            zmiany: Lista słowników {'id', 'stan_minimalny', 'stan_maksymalny'}
+                    (zwalidowanych - min <= max)
+
+        Returns:
+            tuple: (lista ID zmienionych narzędzi, lista błędów {'id', 'error'})
+        """
+        narzedzia = NarzedzieMagazynowe.objects.select_for_update().in_bulk({z['id'] for z in zmiany})
+
+        zmienione = {}
+        bledy = []
+        for zmiana in zmiany:
+            narzedzie = narzedzia.get(zmiana['id'])
+            if narzedzie is None:
+                bledy.append({'id': zmiana['id'], 'error': 'Narzędzie nie istnieje'})
+                continue
+            narzedzie.stan_minimalny = zmiana['stan_minimalny']
+            narzedzie.stan_maksymalny = zmiana['stan_maksymalny']
+            # bulk_update nie ustawia pól auto_now
+            narzedzie.data_modyfikacji = timezone.now()
+            zmienione[narzedzie.id] = narzedzie
+
+        if zmienione:
+            NarzedzieMagazynowe.objects.bulk_update(
+                list(zmienione.values()), ['stan_minimalny', 'stan_maksymalny', 'data_modyfikacji']
+            )
+            # bulk_update nie wysyła sygnałów - generator i wersję oznaczamy jawnie
+            GeneratorZamowienService.oznacz_do_przeliczenia(zmienione)
+            podbij_wersje(NarzedzieMagazynowe)
+
+        return list(zmienione), bledy
 
 
 # ============================================================================
-# SERWIS ZARZĄDZANIA NARZĘDZIAMI
+# SERWIS GENERATORA ZAMÓWIEŃ
 # ============================================================================
 
-class NarzedzieService:
+class GeneratorZamowienService:
     """
-    Serwis zawierający logikę biznesową związaną z narzędziami.
+    Serwis generatora zamówień - wyznacza braki magazynowe i uzupełnia
+    tabelę PozycjaGeneratora operacjami na zbiorach (stała liczba zapytań
+    niezależnie od wielkości katalogu).
     """
 
+    # Limit stosowany, gdy narzędzie ma stan_maksymalny = 0
+    DOMYSLNY_STAN_MAKSYMALNY = 10
+
+    @classmethod
+    def narzedzia_z_brakami(cls):
+        """
+        Zwraca narzędzia poniżej stanu maksymalnego, których nie ma jeszcze w generatorze.
+
+        Jedno zapytanie: stan dostępny i ilość w drodze czytane z tabeli
+        StanMagazynowy, zapotrzebowanie z PrognozaZuzycia (JOIN), porównanie
+        z poziomem docelowym wykonywane w bazie. Sztuki już zamówione liczą
+        się do stanu, więc nie są zamawiane ponownie.
+
+        Returns:
+            QuerySet: NarzedzieMagazynowe z adnotacjami 'dostepne', 'w_drodze',
+                      'limit', 'zapotrzebowanie' i 'cel'
+        """
+        return NarzedzieMagazynowe.objects.select_related(
+            'podkategoria__kategoria',
+            'ostatni_dostawca',
+            'stan_magazynowy',
+            'prognoza'
+        ).filter(
+            pozycja_generatora__isnull=True
+        ).annotate(
+            dostepne=Coalesce(F('stan_magazynowy__calkowita_ilosc'), Value(0), output_field=IntegerField()),
+            w_drodze=Coalesce(F('stan_magazynowy__ilosc_w_drodze'), Value(0), output_field=IntegerField()),
+            limit=Case(
+                When(stan_maksymalny=0, then=Value(cls.DOMYSLNY_STAN_MAKSYMALNY)),
+                default=F('stan_maksymalny'),
+                output_field=IntegerField()
+            ),
+            zapotrzebowanie=Coalesce(F('prognoza__zapotrzebowanie'), Value(0), output_field=IntegerField()),
+        ).annotate(
+            # Poziom docelowy: limit lub prognozowane zapotrzebowanie, jeśli większe
+            cel=Greatest(F('limit'), F('zapotrzebowanie'), output_field=IntegerField()),
+        ).filter(cel__gt=F('dostepne') + F('w_drodze'))
+
     @staticmethod
-    def policz_egzemplarze_narzedzia(narzedzie):
+    def oznacz_do_przeliczenia(narzedzie_ids):
         """
-        Oblicza ilości egzemplarzy narzędzia według stanów.
+        Oznacza narzędzia do ponownej oceny przy następnym otwarciu generatora.
+
+        Wywoływane po zmianie stanu (StanMagazynowyService.przelicz), zapisie
+        narzędzia (signals.py) oraz po usunięciu pozycji generatora.
+
+        Istniejące oznaczenie jest aktualizowane (a nie pomijane) - blokuje
+        to wiersz do końca transakcji zmiany, więc generator nie usunie go,
+        zanim zmiana nie będzie widoczna.
+        """
+        ids = {i for i in narzedzie_ids if i}
+        if ids:
+            NarzedzieDoPrzeliczenia.objects.bulk_create(
+                [NarzedzieDoPrzeliczenia(narzedzie_typ_id=i) for i in ids],
+                update_conflicts=True,
+                unique_fields=['narzedzie_typ'],
+                update_fields=['data_zmiany']
+            )
+
+    @staticmethod
+    def ilosc_do_zamowienia(narzedzie, brakujace_sztuki):
+        """Przelicza brakujące sztuki na jednostki zamówienia (komplety lub sztuki)."""
+        if narzedzie.opakowanie == 'kompl' and narzedzie.ilosc_w_opakowaniu > 0:
+            return math.ceil(brakujace_sztuki / narzedzie.ilosc_w_opakowaniu)
+        return brakujace_sztuki
+
+    @staticmethod
+    def ostatnie_ceny(narzedzie_ids):
+        """
+        Ostatnie ceny jednostkowe od ostatniego dostawcy każdego narzędzia.
 
         Args:
-            narzedzie: Instancja modelu Narzedzie
+            narzedzie_ids: Kolekcja ID narzędzi
 
         Returns:
-            dict: Słownik z ilościami {
-                'nowe': int,
-                'uzywane': int,
-                'w_uzyciu': int,
-                'calkowita': int
-            }
+            dict: {narzedzie_id: Decimal}
         """
-        egzemplarze = narzedzie.egzemplarze.all()
+        return CenyService.ceny_od_ostatniego_dostawcy(narzedzie_ids)
 
-        return {
-            'nowe': egzemplarze.filter(stan='nowe').count(),
-            'uzywane': egzemplarze.filter(stan='uzywane').count(),
-            'w_uzyciu': HistoriaUzyciaNarzedzia.objects.filter(
-                egzemplarz__narzedzie_typ=narzedzie,
-                data_zwrotu__isnull=True
-            ).count(),
-            'calkowita': egzemplarze.count(),
-        }
+    @classmethod
+    @transaction.atomic
+    def generuj_pozycje(cls):
+        """
+        Uzupełnia generator o narzędzia z brakami i zwraca wszystkie pozycje.
+
+        Oceniane są tylko narzędzia oznaczone w NarzedzieDoPrzeliczenia -
+        gdy od ostatniego uruchomienia nic się nie zmieniło, zwracane są
+        od razu istniejące pozycje (dwa zapytania niezależnie od katalogu).
+        Oznaczenia są usuwane przed oceną - zmiana zapisana w trakcie oceny
+        zakłada nowe oznaczenie i trafia do następnego uruchomienia.
+
+        Returns:
+            list: Pozycje PozycjaGeneratora (istniejące + nowo utworzone)
+                  z załadowanymi narzędziem, kategorią i dostawcą
+        """
+        pozycje = list(PozycjaGeneratora.objects.select_related(
+            'narzedzie_typ__podkategoria__kategoria',
+            'narzedzie_typ__stan_magazynowy',
+            'narzedzie_typ__prognoza',
+            'dostawca'
+        ))
+
+        oznaczone = list(NarzedzieDoPrzeliczenia.objects.values_list('narzedzie_typ_id', flat=True))
+        if not oznaczone:
+            return pozycje
+
+        # Przejęcie oznaczeń przed oceną. Oznaczenie aktualizowane przez
+        # niezatwierdzoną zmianę jest zablokowane - DELETE czeka na jej
+        # zatwierdzenie, więc ocena poniżej już ją widzi.
+        NarzedzieDoPrzeliczenia.objects.filter(narzedzie_typ_id__in=oznaczone).delete()
+
+        narzedzia = list(cls.narzedzia_z_brakami().filter(id__in=oznaczone))
+        ceny = cls.ostatnie_ceny([n.id for n in narzedzia if n.ostatni_dostawca_id])
+
+        nowe_pozycje = [
+            PozycjaGeneratora(
+                narzedzie_typ=narzedzie,
+                dostawca=narzedzie.ostatni_dostawca,
+                ilosc_do_zamowienia=cls.ilosc_do_zamowienia(
+                    narzedzie, narzedzie.cel - narzedzie.dostepne - narzedzie.w_drodze
+                ),
+                cena_jednostkowa=ceny.get(narzedzie.id) or 0
+            )
+            for narzedzie in narzedzia
+        ]
+
+        if nowe_pozycje:
+            # ignore_conflicts - równoległe otwarcie generatora nie dubluje pozycji
+            PozycjaGeneratora.objects.bulk_create(nowe_pozycje, ignore_conflicts=True)
+
+        return pozycje + nowe_pozycje
+
+    @staticmethod
+    @transaction.atomic
+    def aktualizuj_pozycje(zmiany):
+        """
+        Zbiorcza edycja pozycji generatora (dostawca, numer katalogowy, ilość, cena).
+
+        Narzędzia i dostawcy pobierani są jednym zapytaniem każdy, a zmiany
+        zapisywane przez bulk_create / bulk_update w jednej transakcji.
+        Błędne wiersze są pomijane i zwracane w liście błędów.
+
+        Args:
+            zmiany: Lista słowników z kluczem 'id' (ID narzędzia) i opcjonalnymi
+                    kluczami dostawca_id, numer_katalogowy, ilosc_do_zamowienia,
+                    cena_jednostkowa
+
+        Returns:
+            tuple: (lista ID zaktualizowanych narzędzi, lista błędów {'id', 'error'})
+        """
+        narzedzia = NarzedzieMagazynowe.objects.select_for_update(of=('self',)).select_related(
+            'pozycja_generatora'
+        ).in_bulk({z['id'] for z in zmiany})
+        dostawcy = Dostawca.objects.in_bulk({z['dostawca_id'] for z in zmiany if z.get('dostawca_id')})
+
+        pozycje = {}
+        nowe_pozycje = set()
+        zmienione_narzedzia = {}
+        zaktualizowane = []
+        bledy = []
+
+        for zmiana in zmiany:
+            narzedzie = narzedzia.get(zmiana['id'])
+            if narzedzie is None:
+                bledy.append({'id': zmiana['id'], 'error': 'Narzędzie nie istnieje'})
+                continue
+
+            dostawca_id = zmiana.get('dostawca_id')
+            if dostawca_id and dostawca_id not in dostawcy:
+                bledy.append({'id': narzedzie.id, 'error': 'Dostawca nie istnieje'})
+                continue
+
+            pozycja = pozycje.get(narzedzie.id)
+            if pozycja is None:
+                try:
+                    pozycja = narzedzie.pozycja_generatora
+                except PozycjaGeneratora.DoesNotExist:
+                    # Pozycja spoza automatycznych braków - tworzona przy pierwszej edycji
+                    pozycja = PozycjaGeneratora(
+                        narzedzie_typ=narzedzie,
+                        dostawca_id=narzedzie.ostatni_dostawca_id,
+                        ilosc_do_zamowienia=0,
+                        cena_jednostkowa=0
+                    )
+                    nowe_pozycje.add(narzedzie.id)
+                pozycje[narzedzie.id] = pozycja
+
+            if 'dostawca_id' in zmiana:
+                if dostawca_id:
+                    pozycja.dostawca = dostawcy[dostawca_id]
+                    # Również zaktualizuj ostatni_dostawca w narzędziu
+                    narzedzie.ostatni_dostawca = dostawcy[dostawca_id]
+                    zmienione_narzedzia[narzedzie.id] = narzedzie
+                else:
+                    pozycja.dostawca = None
+
+            if 'numer_katalogowy' in zmiana:
+                narzedzie.numer_katalogowy = zmiana['numer_katalogowy']
+                zmienione_narzedzia[narzedzie.id] = narzedzie
+
+            if 'ilosc_do_zamowienia' in zmiana:
+                pozycja.ilosc_do_zamowienia = zmiana['ilosc_do_zamowienia']
+
+            if 'cena_jednostkowa' in zmiana:
+                cena = zmiana['cena_jednostkowa']
+                pozycja.cena_jednostkowa = cena if cena is not None else 0
+
+            zaktualizowane.append(narzedzie.id)
+
+        teraz = timezone.now()
+        do_utworzenia = [p for n_id, p in pozycje.items() if n_id in nowe_pozycje]
+        do_aktualizacji = [p for n_id, p in pozycje.items() if n_id not in nowe_pozycje]
+        for pozycja in do_aktualizacji:
+            # bulk_update nie ustawia pól auto_now
+            pozycja.data_modyfikacji = teraz
+        for narzedzie in zmienione_narzedzia.values():
+            narzedzie.data_modyfikacji = teraz
+
+        if do_utworzenia:
+            PozycjaGeneratora.objects.bulk_create(do_utworzenia)
+        if do_aktualizacji:
+            PozycjaGeneratora.objects.bulk_update(
+                do_aktualizacji,
+                ['dostawca', 'ilosc_do_zamowienia', 'cena_jednostkowa', 'data_modyfikacji']
+            )
+        if zmienione_narzedzia:
+            NarzedzieMagazynowe.objects.bulk_update(
+                list(zmienione_narzedzia.values()),
+                ['ostatni_dostawca', 'numer_katalogowy', 'data_modyfikacji']
+            )
+            podbij_wersje(NarzedzieMagazynowe)
+
+        return list(dict.fromkeys(zaktualizowane)), bledy
+
+    @classmethod
+    @transaction.atomic
+    def utworz_zamowienia(cls):
+        """
+        Tworzy zamówienia (po jednym na dostawcę) z pozycji generatora.
+
+        Pozycje generatora są blokowane (SELECT ... FOR UPDATE), więc dwa
+        równoległe wywołania wykonują się kolejno - drugie nie znajdzie już
+        pozycji i nie zdubluje zamówień ani numerów. Zamówienia i ich pozycje
+        zapisywane są przez bulk_create, a obsłużone pozycje generatora
+        usuwane jednym poleceniem.
+
+        Returns:
+            list: Utworzone obiekty Zamowienie
+
+        Raises:
+            ValidationError: Gdy generator jest pusty
+        """
+        pozycje_generatora = list(
+            PozycjaGeneratora.objects.select_for_update(of=('self',)).select_related(
+                'narzedzie_typ__podkategoria__kategoria',
+                'dostawca'
+            ).order_by('id')
+        )
+
+        if not pozycje_generatora:
+            raise ValidationError("Brak pozycji w generatorze")
+
+        # Grupuj według dostawcy (pozycje bez dostawcy są pomijane)
+        grouped = defaultdict(list)
+        for pozycja in pozycje_generatora:
+            if pozycja.dostawca_id is not None:
+                grouped[pozycja.dostawca_id].append(pozycja)
+
+        numery = NumeracjaZamowienService.przydziel_numery(len(grouped))
+
+        zamowienia = []
+        pozycje_zamowien = []
+
+        for numer, pozycje in zip(numery, grouped.values()):
+            dostawca = pozycje[0].dostawca
+            zamowienie = Zamowienie(
+                numer=numer,
+                dostawca=dostawca,
+                email_docelowy=dostawca.email or '',
+                status='draft'
+            )
+            wartosc_zamowienia = Decimal('0.00')
+
+            for pozycja_gen in pozycje:
+                narzedzie = pozycja_gen.narzedzie_typ
+                podkategoria = narzedzie.podkategoria
+
+                cena = pozycja_gen.cena_jednostkowa or Decimal('0.00')
+                wartosc_poz = cena * pozycja_gen.ilosc_do_zamowienia
+                wartosc_zamowienia += wartosc_poz
+
+                pozycje_zamowien.append(PozycjaZamowienia(
+                    zamowienie=zamowienie,
+                    narzedzie_typ=narzedzie,
+                    kategoria_nazwa=podkategoria.kategoria.nazwa if podkategoria else '',
+                    podkategoria_nazwa=podkategoria.nazwa if podkategoria else '',
+                    narzedzie_opis=narzedzie.opis,
+                    numer_katalogowy=narzedzie.numer_katalogowy or '',
+                    ilosc_zamowiona=pozycja_gen.ilosc_do_zamowienia,
+                    jednostka=narzedzie.opakowanie,
+                    ilosc_w_komplecie=narzedzie.ilosc_w_opakowaniu,
+                    cena_jednostkowa=cena,
+                    wartosc_pozycji=wartosc_poz
+                ))
+
+            zamowienie.wartosc_zamowienia = wartosc_zamowienia
+            zamowienia.append(zamowienie)
+
+        Zamowienie.objects.bulk_create(zamowienia)
+        PozycjaZamowienia.objects.bulk_create(pozycje_zamowien)
+
+        # bulk_create nie wysyła sygnałów - historię cen i wersję zapisujemy jawnie
+        CenyService.zarejestruj_pozycje(pozycje_zamowien)
+        podbij_wersje(Zamowienie, PozycjaZamowienia)
+
+        # Wyczyść obsłużone pozycje generatora
+        PozycjaGeneratora.objects.filter(id__in=[p.id for p in pozycje_generatora]).delete()
+        cls.oznacz_do_przeliczenia(p.narzedzie_typ_id for p in pozycje_generatora)
+
+        return zamowienia
+
+
+# ============================================================================
+# KOLEJKA WYSYŁKI EMAIL
+# ============================================================================
+
+class WysylkaEmailService:
+    """
+    Kolejka wiadomości email (WiadomoscEmail).
+
+    Widoki tylko dodają wiadomość do kolejki z gotową treścią; wysyłką
+    zajmuje się komenda wyslij_emaile, która pobiera paczkę wiadomości
+    (SELECT ... FOR UPDATE SKIP LOCKED - kilka procesów nie wyśle tej samej
+    wiadomości) i wysyła ją jednym połączeniem SMTP. Nieudane próby są
+    ponawiane z wykładniczo rosnącym odstępem, a zamówienie przechodzi
+    w status 'sent' dopiero po udanym doręczeniu do serwera.
+    """
+
+    MAKS_PROB = 5
+    ROZMIAR_PACZKI = 20
+    # Górna granica równoległych połączeń SMTP przy wysyłce wsadowej
+    MAKS_WATKOW = 4
+    # Wiadomość pobrana przez proces, który nie zdążył zapisać wyniku,
+    # wraca do kolejki po tym czasie
+    CZAS_BLOKADY = timedelta(minutes=10)
+    STATUSY_AKTYWNE = ['oczekuje', 'wysylanie']
+
+    @staticmethod
+    def _wiadomosc_zamowienia(zamowienie, **pola):
+        """Renderuje email zamówienia do niezapisanego obiektu WiadomoscEmail."""
+        from .utils import przygotuj_email_zamowienia
+
+        email = przygotuj_email_zamowienia(zamowienie)
+        return WiadomoscEmail(
+            zamowienie=zamowienie,
+            odbiorca=email['recipient_email'],
+            kopia=email['cc_email'] or '',
+            temat=email['subject'],
+            tresc_html=email['html_content'],
+            zalacznik_nazwa=email['attachments'][0][0],
+            zalacznik_csv=email['attachments'][0][1],
+            **pola
+        )
+
+    @classmethod
+    @transaction.atomic
+    def zakolejkuj_zamowienie(cls, zamowienie):
+        """
+        Dodaje email z zamówieniem do kolejki.
+
+        Zamówienie jest blokowane na czas sprawdzenia, więc podwójne
+        kliknięcie nie doda drugiej wiadomości - dopóki poprzednia czeka
+        na wysyłkę, zwracana jest ona.
+
+        Returns:
+            tuple: (WiadomoscEmail, czy_utworzono)
+        """
+        zamowienie = Zamowienie.objects.select_for_update(of=('self',)).select_related(
+            'dostawca'
+        ).prefetch_related('pozycje').get(pk=zamowienie.pk)
+        aktywna = zamowienie.wiadomosci_email.filter(status__in=cls.STATUSY_AKTYWNE).first()
+        if aktywna is not None:
+            return aktywna, False
+
+        wiadomosc = cls._wiadomosc_zamowienia(zamowienie)
+        wiadomosc.save()
+        return wiadomosc, True
+
+    @classmethod
+    def _pobierz_paczke(cls, limit, teraz):
+        """Rezerwuje do `limit` wiadomości gotowych do wysyłki."""
+        with transaction.atomic():
+            ids = list(
+                WiadomoscEmail.objects.select_for_update(skip_locked=True).filter(
+                    status__in=cls.STATUSY_AKTYWNE,
+                    nastepna_proba__lte=teraz
+                ).order_by('nastepna_proba', 'id').values_list('id', flat=True)[:limit]
+            )
+            if ids:
+                WiadomoscEmail.objects.filter(id__in=ids).update(
+                    status='wysylanie',
+                    liczba_prob=F('liczba_prob') + 1,
+                    nastepna_proba=teraz + cls.CZAS_BLOKADY
+                )
+        return list(WiadomoscEmail.objects.filter(id__in=ids).order_by('nastepna_proba', 'id'))
+
+    @staticmethod
+    def _wyslij_polaczeniem(wiadomosci):
+        """
+        Wysyła wiadomości jedną sesją SMTP (bez dostępu do bazy danych,
+        więc można ją wywołać z wątku).
+
+        Returns:
+            dict: {id_wiadomosci: wyjątek lub None przy udanej wysyłce}
+        """
+        from django.core.mail import get_connection
+        from .utils import build_html_email
+
+        polaczenie = get_connection(fail_silently=False)
+        try:
+            polaczenie.open()
+        except Exception as e:
+            return {wiadomosc.id: e for wiadomosc in wiadomosci}
+
+        wyniki = {}
+        try:
+            for wiadomosc in wiadomosci:
+                email = build_html_email(
+                    wiadomosc.odbiorca,
+                    wiadomosc.temat,
+                    wiadomosc.tresc_html,
+                    attachments=(
+                        [(wiadomosc.zalacznik_nazwa, wiadomosc.zalacznik_csv, 'text/csv')]
+                        if wiadomosc.zalacznik_nazwa else None
+                    ),
+                    cc_email=wiadomosc.kopia or None,
+                    connection=polaczenie
+                )
+                try:
+                    email.send(fail_silently=False)
+                except Exception as e:
+                    wyniki[wiadomosc.id] = e
+                else:
+                    wyniki[wiadomosc.id] = None
+        finally:
+            polaczenie.close()
+        return wyniki
+
+    @classmethod
+    def _wyslij(cls, wiadomosci, watki=1):
+        """Rozdziela wiadomości na `watki` połączeń SMTP wysyłających równolegle."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        watki = max(1, min(watki, cls.MAKS_WATKOW, len(wiadomosci)))
+        if watki == 1:
+            return cls._wyslij_polaczeniem(wiadomosci)
+
+        wyniki = {}
+        with ThreadPoolExecutor(max_workers=watki) as pula:
+            for wynik in pula.map(cls._wyslij_polaczeniem, [wiadomosci[i::watki] for i in range(watki)]):
+                wyniki.update(wynik)
+        return wyniki
+
+    @classmethod
+    @transaction.atomic
+    def _zapisz_wyniki(cls, wiadomosci, wyniki, teraz):
+        """
+        Zapisuje wynik wysyłki: wiadomości i wysłane zamówienia jednym
+        bulk_update każde. Nieudane wiadomości wracają do kolejki
+        z odstępem 1, 2, 4, 8... minut lub po MAKS_PROB dostają status 'blad'.
+        """
+        zamowienie_ids = []
+        for wiadomosc in wiadomosci:
+            blad = wyniki[wiadomosc.id]
+            if blad is None:
+                wiadomosc.status = 'wyslana'
+                wiadomosc.data_wyslania = teraz
+                wiadomosc.ostatni_blad = ''
+                if wiadomosc.zamowienie_id is not None:
+                    zamowienie_ids.append(wiadomosc.zamowienie_id)
+            else:
+                wiadomosc.ostatni_blad = str(blad)
+                if wiadomosc.liczba_prob >= cls.MAKS_PROB:
+                    wiadomosc.status = 'blad'
+                else:
+                    wiadomosc.status = 'oczekuje'
+                    wiadomosc.nastepna_proba = teraz + timedelta(minutes=2 ** (wiadomosc.liczba_prob - 1))
+        WiadomoscEmail.objects.bulk_update(
+            wiadomosci, ['status', 'data_wyslania', 'ostatni_blad', 'nastepna_proba']
+        )
+
+        if not zamowienie_ids:
+            return
+        zamowienia = list(Zamowienie.objects.select_for_update().filter(id__in=zamowienie_ids))
+        for zamowienie in zamowienia:
+            zamowienie.data_wyslania = teraz
+            if zamowienie.status in STATUSY_ZAMOWIEN_PRZED_WYSYLKA:
+                zamowienie.status = 'sent'
+        Zamowienie.objects.bulk_update(zamowienia, ['status', 'data_wyslania'])
+        podbij_wersje(Zamowienie)
+
+        # bulk_update nie wysyła sygnałów - ilości "w drodze" przeliczamy jawnie
+        StanMagazynowyService.przelicz(
+            PozycjaZamowienia.objects.filter(zamowienie_id__in=zamowienie_ids).values_list('narzedzie_typ_id', flat=True)
+        )
+
+    @classmethod
+    def przetworz(cls, limit=None, teraz=None, watki=1):
+        """
+        Wysyła jedną paczkę wiadomości z kolejki.
+
+        Args:
+            limit: Maksymalna liczba wiadomości (domyślnie ROZMIAR_PACZKI)
+            teraz: Moment odniesienia (domyślnie timezone.now())
+            watki: Liczba równoległych połączeń SMTP (najwyżej MAKS_WATKOW)
+
+        Returns:
+            dict: {'wyslane': int, 'bledy': int}
+        """
+        teraz = teraz or timezone.now()
+        wiadomosci = cls._pobierz_paczke(limit or cls.ROZMIAR_PACZKI, teraz)
+        if not wiadomosci:
+            return {'wyslane': 0, 'bledy': 0}
+
+        wyniki = cls._wyslij(wiadomosci, watki)
+        cls._zapisz_wyniki(wiadomosci, wyniki, teraz)
+
+        bledy = sum(1 for blad in wyniki.values() if blad is not None)
+        return {'wyslane': len(wiadomosci) - bledy, 'bledy': bledy}
+
+    @classmethod
+    def wyslij_zamowienia(cls, zamowienie_ids=None, watki=1, teraz=None):
+        """
+        Wysyła od razu wszystkie zamówienia robocze (status 'draft').
+
+        Treści renderowane są w jednej transakcji i zapisywane w kolejce
+        jako zarezerwowane (wiadomość oczekująca już w kolejce jest
+        wykorzystywana ponownie), po czym wszystkie idą jedną sesją SMTP
+        lub `watki` sesjami równolegle. Nieudane wysyłki zostają w kolejce
+        do ponowienia przez wyslij_emaile.
+
+        Args:
+            zamowienie_ids: Opcjonalne zawężenie do wskazanych zamówień
+            watki: Liczba równoległych połączeń SMTP (najwyżej MAKS_WATKOW)
+            teraz: Moment odniesienia (domyślnie timezone.now())
+
+        Returns:
+            list: Wynik per zamówienie - słowniki
+                {'zamowienie_id', 'numer', 'status', 'job_id', 'message'},
+                status: 'wyslane' / 'blad' / 'w_trakcie' / 'pominiete'
+        """
+        teraz = teraz or timezone.now()
+        wyniki = []
+        do_wyslania = []
+
+        with transaction.atomic():
+            zamowienia = Zamowienie.objects.select_for_update(of=('self',)).select_related(
+                'dostawca'
+            ).prefetch_related('pozycje').filter(status='draft').order_by('id')
+            if zamowienie_ids is not None:
+                zamowienia = zamowienia.filter(id__in=zamowienie_ids)
+            zamowienia = list(zamowienia)
+
+            aktywne = {}
+            for wiadomosc in WiadomoscEmail.objects.select_for_update().filter(
+                zamowienie__in=zamowienia, status__in=cls.STATUSY_AKTYWNE
+            ).order_by('id'):
+                aktywne.setdefault(wiadomosc.zamowienie_id, wiadomosc)
+
+            nowe, ponawiane = [], []
+            for zamowienie in zamowienia:
+                wynik = {'zamowienie_id': zamowienie.id, 'numer': zamowienie.numer, 'job_id': None}
+                wiadomosc = aktywne.get(zamowienie.id)
+
+                if not zamowienie.email_docelowy:
+                    wyniki.append({**wynik, 'status': 'pominiete', 'message': 'Brak adresu email dostawcy'})
+                    continue
+                if wiadomosc is not None and wiadomosc.status == 'wysylanie' and wiadomosc.nastepna_proba > teraz:
+                    wyniki.append({
+                        **wynik, 'job_id': wiadomosc.id, 'status': 'w_trakcie',
+                        'message': 'Wiadomość jest właśnie wysyłana przez kolejkę'
+                    })
+                    continue
+
+                if wiadomosc is None:
+                    wiadomosc = cls._wiadomosc_zamowienia(zamowienie, liczba_prob=0)
+                    nowe.append(wiadomosc)
+                else:
+                    ponawiane.append(wiadomosc)
+                wiadomosc.status = 'wysylanie'
+                wiadomosc.liczba_prob += 1
+                wiadomosc.nastepna_proba = teraz + cls.CZAS_BLOKADY
+                do_wyslania.append(wiadomosc)
+
+            WiadomoscEmail.objects.bulk_create(nowe)
+            WiadomoscEmail.objects.bulk_update(ponawiane, ['status', 'liczba_prob', 'nastepna_proba'])
+
+        if not do_wyslania:
+            return wyniki
+
+        bledy = cls._wyslij(do_wyslania, watki)
+        cls._zapisz_wyniki(do_wyslania, bledy, teraz)
+
+        numery = {zamowienie.id: zamowienie.numer for zamowienie in zamowienia}
+        for wiadomosc in do_wyslania:
+            blad = bledy[wiadomosc.id]
+            wyniki.append({
+                'zamowienie_id': wiadomosc.zamowienie_id,
+                'numer': numery[wiadomosc.zamowienie_id],
+                'job_id': wiadomosc.id,
+                'status': 'wyslane' if blad is None else 'blad',
+                'message': (
+                    f'Wysłano na adres: {wiadomosc.odbiorca}' if blad is None
+                    else f'Błąd wysyłki: {blad}'
+                ),
+            })
+        return sorted(wyniki, key=lambda wynik: wynik['zamowienie_id'])
 
 
 # ============================================================================
@@ -88,41 +1891,78 @@ class EgzemplarzService:
         if not pracownik_id:
             raise ValidationError("Wybierz pracownika wydającego narzędzie.")
 
-        # Pobierz egzemplarz z blokadą
-        try:
-            egzemplarz = EgzemplarzNarzedzia.objects.select_for_update().get(
-                id=egzemplarz_id
-            )
-        except EgzemplarzNarzedzia.DoesNotExist:
-            raise ValidationError("Egzemplarz nie istnieje.")
+        # Wszystkie warunki wydania w jednym warunkowym UPDATE - blokuje
+        # wiersz egzemplarza do końca transakcji, równoległe wydanie tego
+        # samego egzemplarza po odblokowaniu nie spełni już warunku
+        wydano = EgzemplarzNarzedzia.objects.filter(
+            Exists(Pracownik.objects.filter(id=pracownik_id)),
+            id=egzemplarz_id,
+            stan__in=STANY_DOSTEPNE_DO_WYDANIA,
+            aktywne_wypozyczenie__isnull=True,
+        ).update(data_modyfikacji=timezone.now())
+
+        if not wydano:
+            EgzemplarzService._blad_wydania(egzemplarz_id, pracownik_id)
 
-        # Sprawdź czy pracownik istnieje
+        # Wpis historii - sygnał ustawia egzemplarzowi aktywne wypożyczenie.
+        # Unikalny indeks częściowy (jedno otwarte wypożyczenie egzemplarza)
+        # chroni także zapisy z pominięciem serwisu.
         try:
-            Pracownik.objects.get(id=pracownik_id)
-        except Pracownik.DoesNotExist:
-            raise ValidationError("Wybrany pracownik nie istnieje.")
+            with transaction.atomic():
+                historia = HistoriaUzyciaNarzedzia.objects.create(
+                    egzemplarz_id=egzemplarz_id,
+                    maszyna_id=maszyna_id,
+                    pracownik_id=pracownik_id
+                )
+        except IntegrityError:
+            raise ValidationError("Ten egzemplarz jest już w użyciu.")
 
-        # Sprawdź stan egzemplarza
-        if egzemplarz.stan not in STANY_DOSTEPNE_DO_WYDANIA:
-            raise ValidationError(
-                "Tego egzemplarza nie można wydać (jest uszkodzony)."
-            )
+        return historia
 
-        # Sprawdź czy egzemplarz nie jest już w użyciu
-        if HistoriaUzyciaNarzedzia.objects.filter(
-                egzemplarz=egzemplarz,
-                data_zwrotu__isnull=True
-        ).exists():
-            raise ValidationError("Ten egzemplarz jest już w użyciu.")
+    @staticmethod
+    def odswiez_aktywne_wypozyczenie(historia):
+        """
+        Ustawia lub czyści aktywne wypożyczenie egzemplarza po zapisie wpisu
+        historii (signals.py) - niezależnie od ścieżki zapisu (serwis, API,
+        panel admina).
+        """
+        teraz = timezone.now()
+        odpiete = EgzemplarzNarzedzia.objects.filter(aktywne_wypozyczenie=historia)
 
-        # Utwórz wpis historii
-        historia = HistoriaUzyciaNarzedzia.objects.create(
-            egzemplarz=egzemplarz,
-            maszyna_id=maszyna_id,
-            pracownik_id=pracownik_id
-        )
+        if historia.data_zwrotu is None:
+            odpiete = odpiete.exclude(id=historia.egzemplarz_id)
+            EgzemplarzNarzedzia.objects.filter(id=historia.egzemplarz_id).exclude(
+                aktywne_wypozyczenie=historia
+            ).update(aktywne_wypozyczenie=historia, data_modyfikacji=teraz)
 
-        return historia
+        # Wypożyczenie zamknięte albo przeniesione na inny egzemplarz
+        odpiete.update(aktywne_wypozyczenie=None, data_modyfikacji=teraz)
+
+    @staticmethod
+    def uzgodnij_typ_historii(egzemplarz):
+        """Przenosi historię użycia na nowy typ narzędzia egzemplarza (signals.py)."""
+        przeniesione = HistoriaUzyciaNarzedzia.objects.filter(egzemplarz=egzemplarz).exclude(
+            narzedzie_typ_id=egzemplarz.narzedzie_typ_id
+        ).update(narzedzie_typ_id=egzemplarz.narzedzie_typ_id, data_modyfikacji=timezone.now())
+        if przeniesione:
+            podbij_wersje(HistoriaUzyciaNarzedzia)
+
+    @staticmethod
+    def _blad_wydania(egzemplarz_id, pracownik_id):
+        """Ustala, który warunek wydania nie został spełniony (tylko po nieudanym wydaniu)."""
+        egzemplarz = EgzemplarzNarzedzia.objects.filter(id=egzemplarz_id).values(
+            'stan', 'aktywne_wypozyczenie_id'
+        ).first()
+
+        if egzemplarz is None:
+            raise ValidationError("Egzemplarz nie istnieje.")
+        if not Pracownik.objects.filter(id=pracownik_id).exists():
+            raise ValidationError("Wybrany pracownik nie istnieje.")
+        if egzemplarz['stan'] not in STANY_DOSTEPNE_DO_WYDANIA:
+            raise ValidationError(
+                "Tego egzemplarza nie można wydać (jest uszkodzony)."
+            )
+        raise ValidationError("Ten egzemplarz jest już w użyciu.")
 
     @staticmethod
     @transaction.atomic
@@ -140,11 +1980,12 @@ class EgzemplarzService:
         Raises:
             ValidationError: Gdy zwrot nie może być dokonany
         """
-        # Pobierz wpis historii
+        # Pobierz wpis historii - blokada do końca transakcji, równoległy zwrot
+        # czeka i widzi już zamknięty wpis (bez drugiego zgłoszenia uszkodzenia)
         try:
-            historia = HistoriaUzyciaNarzedzia.objects.select_related('egzemplarz').get(
-                id=historia_id
-            )
+            historia = HistoriaUzyciaNarzedzia.objects.select_for_update(of=('self',)).select_related(
+                'egzemplarz'
+            ).get(id=historia_id)
         except HistoriaUzyciaNarzedzia.DoesNotExist:
             raise ValidationError("Wpis historii nie istnieje.")
 
@@ -162,10 +2003,10 @@ class EgzemplarzService:
         historia.data_zwrotu = timezone.now()
         historia.save()
 
-        # Aktualizuj stan egzemplarza
+        # Aktualizuj stan egzemplarza (aktywne wypożyczenie wyczyścił już sygnał)
         egzemplarz = historia.egzemplarz
         egzemplarz.stan = stan_po_zwrocie
-        egzemplarz.save()
+        egzemplarz.save(update_fields=['stan', 'data_modyfikacji'])
 
         return historia
 
@@ -175,6 +2016,10 @@ class EgzemplarzService:
         """
         Usuwa egzemplarz uszkodzony i tworzy wpis w archiwum uszkodzeń.
 
+        Wpisy zgłoszone wcześniej (np. przy zwrocie) zostają po usunięciu
+        egzemplarza - nowy powstaje tylko, gdy egzemplarz żadnego nie ma,
+        żeby prognoza zużycia nie liczyła tego samego uszkodzenia dwa razy.
+
         Args:
             egzemplarz: Instancja EgzemplarzNarzedzia do usunięcia
 
@@ -185,7 +2030,7 @@ class EgzemplarzService:
         utworzono_archiwum = False
 
         # Tylko uszkodzone egzemplarze są archiwizowane
-        if egzemplarz.stan in ['uszkodzone', 'uszkodzone_regeneracja']:
+        if egzemplarz.stan in ['uszkodzone', 'uszkodzone_regeneracja'] and not egzemplarz.uszkodzenia.exists():
             # Pobierz ostatnią historię użycia
             ostatnia_historia = egzemplarz.historia.select_related(
                 'maszyna',
@@ -210,6 +2055,90 @@ class EgzemplarzService:
         return utworzono_archiwum, egzemplarz_id
 
 
+# ============================================================================
+# SERWIS ARCHIWUM USZKODZEŃ
+# ============================================================================
+
+class UszkodzenieService:
+    """
+    Migawka danych egzemplarza we wpisach archiwum uszkodzeń.
+
+    Wpis zapamiętuje narzędzie, lokalizację, maszynę ostatniego wypożyczenia
+    i stan egzemplarza z chwili uszkodzenia - lista archiwum czyta tylko
+    własne kolumny i pozostaje kompletna po usunięciu egzemplarza.
+    """
+
+    POLA_MIGAWKI = [
+        'narzedzie_typ',
+        'ilosc_w_komplecie',
+        'kategoria_nazwa',
+        'podkategoria_nazwa',
+        'narzedzie_opis',
+        'numer_katalogowy',
+        'lokalizacja_nazwa',
+        'maszyna_nazwa',
+        'stan_egzemplarza',
+    ]
+
+    @staticmethod
+    def uzupelnij_migawki(uszkodzenia):
+        """
+        Przepisuje do wpisów dane ich egzemplarzy (bez zapisu) - jedno
+        zapytanie dla dowolnej liczby wpisów.
+
+        Args:
+            uszkodzenia: Lista instancji Uszkodzenie; wpisy bez egzemplarza są pomijane
+        """
+        egzemplarz_ids = {u.egzemplarz_id for u in uszkodzenia if u.egzemplarz_id}
+        if not egzemplarz_ids:
+            return
+
+        ostatnia_maszyna = HistoriaUzyciaNarzedzia.objects.filter(
+            egzemplarz=OuterRef('pk')
+        ).order_by('-data_wydania', '-id').values('maszyna__nazwa')[:1]
+        egzemplarze = EgzemplarzNarzedzia.objects.filter(id__in=egzemplarz_ids).select_related(
+            'narzedzie_typ__podkategoria__kategoria', 'lokalizacja'
+        ).annotate(ostatnia_maszyna=Subquery(ostatnia_maszyna)).in_bulk()
+
+        for uszkodzenie in uszkodzenia:
+            egzemplarz = egzemplarze.get(uszkodzenie.egzemplarz_id)
+            if egzemplarz is None:
+                continue
+            narzedzie = egzemplarz.narzedzie_typ
+            podkategoria = narzedzie.podkategoria
+            uszkodzenie.narzedzie_typ = narzedzie
+            uszkodzenie.ilosc_w_komplecie = egzemplarz.ilosc_w_komplecie
+            uszkodzenie.kategoria_nazwa = podkategoria.kategoria.nazwa if podkategoria else ''
+            uszkodzenie.podkategoria_nazwa = podkategoria.nazwa if podkategoria else ''
+            uszkodzenie.narzedzie_opis = narzedzie.opis
+            uszkodzenie.numer_katalogowy = narzedzie.numer_katalogowy or ''
+            uszkodzenie.lokalizacja_nazwa = str(egzemplarz.lokalizacja) if egzemplarz.lokalizacja else ''
+            uszkodzenie.maszyna_nazwa = egzemplarz.ostatnia_maszyna or ''
+            uszkodzenie.stan_egzemplarza = egzemplarz.stan
+
+    @classmethod
+    def uzupelnij_archiwum(cls, rozmiar_paczki=1000):
+        """
+        Migawki dla wpisów sprzed ich wprowadzenia (komenda uzupelnij_uszkodzenia).
+
+        Returns:
+            int: Liczba uzupełnionych wpisów
+        """
+        ids = list(Uszkodzenie.objects.filter(
+            Q(narzedzie_opis='') | Q(narzedzie_typ__isnull=True), egzemplarz__isnull=False
+        ).order_by('id').values_list('id', flat=True))
+
+        for start in range(0, len(ids), rozmiar_paczki):
+            with transaction.atomic():
+                uszkodzenia = list(Uszkodzenie.objects.filter(id__in=ids[start:start + rozmiar_paczki]))
+                cls.uzupelnij_migawki(uszkodzenia)
+                Uszkodzenie.objects.bulk_update(uszkodzenia, cls.POLA_MIGAWKI)
+
+        if ids:
+            podbij_wersje(Uszkodzenie)
+        return len(ids)
+
+
 # ============================================================================
 # SERWIS LOKALIZACJI
 # ============================================================================
@@ -259,6 +2188,7 @@ class LokalizacjaService:
 
         # Bulk create z ignore_conflicts (pomija duplikaty)
         Lokalizacja.objects.bulk_create(nowe_lokalizacje, ignore_conflicts=True)
+        podbij_wersje(Lokalizacja)
 
         return len(nowe_lokalizacje)
 
@@ -0,0 +1,216 @@
+"""
+TOOLS/signals.py
+
+Sygnały modeli.
+Utrzymują zestawienie StanMagazynowy przy każdej zmianie egzemplarzy
+i wypożyczeń - niezależnie od tego, czy zmiana przyszła z serwisu,
+serializera, panelu admina czy przyjęcia zamówienia.
+"""
+
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (
+    Kategoria,
+    Podkategoria,
+    Lokalizacja,
+    Maszyna,
+    Pracownik,
+    NarzedzieMagazynowe,
+    EgzemplarzNarzedzia,
+    HistoriaUzyciaNarzedzia,
+    StanMagazynowy,
+    Dostawca,
+    FakturaZakupu,
+    Uszkodzenie,
+    Zamowienie,
+    PozycjaZamowienia,
+    RealizacjaZamowienia,
+    PozycjaRealizacji,
+    HistoriaCen,
+)
+from .constants import STATUSY_ZAMOWIEN_W_DRODZE
+from .services import (
+    StanMagazynowyService,
+    CenyService,
+    GeneratorZamowienService,
+    SledzenieZmianService,
+    EgzemplarzService,
+    UszkodzenieService,
+)
+from .wersje import podbij_wersje
+from .zdarzenia import opublikuj_po_zatwierdzeniu
+
+
+def _kaskada_z(origin, model):
+    """Czy usunięcie jest kaskadą po usunięciu obiektu (lub QuerySetu) danego modelu."""
+    if isinstance(origin, QuerySet):
+        return origin.model is model
+    return isinstance(origin, model)
+
+
+@receiver(post_delete, sender=NarzedzieMagazynowe)
+def narzedzie_usuniete(sender, instance, **kwargs):
+    # Usunięcia narzędzi, egzemplarzy i wypożyczeń - dla synchronizacji przyrostowej (?since=)
+    SledzenieZmianService.zarejestruj_usuniecie('narzedzie', [instance.id])
+
+
+@receiver(post_save, sender=EgzemplarzNarzedzia)
+def egzemplarz_zapisany(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    # Wpisy historii użycia przechowują typ narzędzia egzemplarza
+    if not created and (update_fields is None or 'narzedzie_typ' in update_fields):
+        EgzemplarzService.uzgodnij_typ_historii(instance)
+    StanMagazynowyService.przelicz([instance.narzedzie_typ_id])
+
+
+@receiver(post_delete, sender=EgzemplarzNarzedzia)
+def egzemplarz_usuniety(sender, instance, origin=None, **kwargs):
+    SledzenieZmianService.zarejestruj_usuniecie('egzemplarz', [instance.id])
+    if _kaskada_z(origin, NarzedzieMagazynowe):
+        return
+    StanMagazynowyService.przelicz([instance.narzedzie_typ_id])
+
+
+def _opublikuj_wypozyczenie(historia, usuniete=False):
+    """Zdarzenie dla otwartych paneli: wypożyczenie otwarte / zamknięte / usunięte."""
+    opublikuj_po_zatwierdzeniu([{
+        'typ': 'wypozyczenie',
+        'historia_id': historia.id,
+        'egzemplarz_id': historia.egzemplarz_id,
+        'narzedzie_id': historia.narzedzie_typ_id,
+        'aktywne': not usuniete and historia.data_zwrotu is None,
+        'usuniete': usuniete,
+    }])
+    return [historia.narzedzie_typ_id]
+
+
+@receiver(pre_save, sender=HistoriaUzyciaNarzedzia)
+def historia_przed_zapisem(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Egzemplarz pobrany razem z wpisem (select_related) nie jest odczytywany ponownie
+    instance.narzedzie_typ_id = instance.egzemplarz.narzedzie_typ_id
+
+
+@receiver(post_save, sender=HistoriaUzyciaNarzedzia)
+def historia_zapisana(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Przed przeliczeniem - SilnikStanow liczy "w użyciu" z aktywnych wypożyczeń
+    EgzemplarzService.odswiez_aktywne_wypozyczenie(instance)
+    StanMagazynowyService.przelicz(_opublikuj_wypozyczenie(instance))
+
+
+@receiver(post_delete, sender=HistoriaUzyciaNarzedzia)
+def historia_usunieta(sender, instance, origin=None, **kwargs):
+    SledzenieZmianService.zarejestruj_usuniecie('historia', [instance.id])
+    if _kaskada_z(origin, NarzedzieMagazynowe) or _kaskada_z(origin, EgzemplarzNarzedzia):
+        # Egzemplarz przeliczy stan we własnym sygnale
+        return
+    StanMagazynowyService.przelicz(_opublikuj_wypozyczenie(instance, usuniete=True))
+
+
+@receiver(pre_save, sender=Uszkodzenie)
+def uszkodzenie_przed_zapisem(sender, instance, raw=False, **kwargs):
+    # Migawka tylko przy zgłoszeniu - późniejsze zmiany egzemplarza nie zmieniają archiwum
+    if raw or not instance._state.adding:
+        return
+    UszkodzenieService.uzupelnij_migawki([instance])
+
+
+@receiver(post_save, sender=NarzedzieMagazynowe)
+def narzedzie_zapisane(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and 'stan_maksymalny' not in update_fields:
+        return
+    # Zmiana limitu - narzędzie do ponownej oceny w generatorze zamówień
+    GeneratorZamowienService.oznacz_do_przeliczenia([instance.id])
+
+
+def _oznacz_zmiane_zamowien(**filtry):
+    """Przesuwa datę modyfikacji zamówień - unieważnia wyrenderowane emaile w cache."""
+    if Zamowienie.objects.filter(**filtry).update(data_modyfikacji=timezone.now()):
+        # update() nie wysyła post_save - odpowiedzi API z zamówieniami też są nieaktualne
+        podbij_wersje(Zamowienie)
+
+
+@receiver(post_save, sender=Dostawca)
+def dostawca_zapisany(sender, instance, created=False, raw=False, **kwargs):
+    # Nazwa i NIP dostawcy są częścią treści emaila z zamówieniem
+    if raw or created:
+        return
+    _oznacz_zmiane_zamowien(dostawca=instance)
+
+
+@receiver(post_save, sender=PozycjaZamowienia)
+def pozycja_zamowienia_zapisana(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Historia cen, treść emaila zamówienia i ilości "w drodze"
+    CenyService.zarejestruj_pozycje([instance])
+    _oznacz_zmiane_zamowien(id=instance.zamowienie_id)
+    if instance.zamowienie.status in STATUSY_ZAMOWIEN_W_DRODZE:
+        StanMagazynowyService.przelicz([instance.narzedzie_typ_id])
+
+
+@receiver(post_delete, sender=PozycjaZamowienia)
+def pozycja_zamowienia_usunieta(sender, instance, origin=None, **kwargs):
+    if not _kaskada_z(origin, Zamowienie):
+        _oznacz_zmiane_zamowien(id=instance.zamowienie_id)
+    StanMagazynowyService.przelicz([instance.narzedzie_typ_id])
+
+
+@receiver(post_save, sender=Zamowienie)
+def zamowienie_zapisane(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    # Zmiana statusu przenosi pozycje do / z ilości "w drodze"
+    if raw or created:
+        return
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    StanMagazynowyService.przelicz(
+        PozycjaZamowienia.objects.filter(zamowienie=instance).values_list('narzedzie_typ_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=HistoriaCen)
+def wpis_ceny_usuniety(sender, instance, origin=None, **kwargs):
+    if _kaskada_z(origin, NarzedzieMagazynowe) or _kaskada_z(origin, Dostawca):
+        # AktualnaCena usuwana jest kaskadowo razem z narzędziem / dostawcą
+        return
+    CenyService.odswiez_aktualne([(instance.narzedzie_typ_id, instance.dostawca_id)])
+
+
+# Modele, z których czytają odpowiedzi API - ich wersje wyznaczają
+# klucze cache i walidatory ETag / Last-Modified (wersje.py)
+MODELE_WERSJONOWANE = (
+    Kategoria,
+    Podkategoria,
+    Dostawca,
+    Lokalizacja,
+    Maszyna,
+    Pracownik,
+    NarzedzieMagazynowe,
+    StanMagazynowy,
+    EgzemplarzNarzedzia,
+    HistoriaUzyciaNarzedzia,
+    FakturaZakupu,
+    Uszkodzenie,
+    Zamowienie,
+    PozycjaZamowienia,
+    RealizacjaZamowienia,
+    PozycjaRealizacji,
+)
+
+
+def model_wersjonowany_zmieniony(sender, **kwargs):
+    podbij_wersje(sender)
+
+
+for _model in MODELE_WERSJONOWANE:
+    post_save.connect(model_wersjonowany_zmieniony, sender=_model)
+    post_delete.connect(model_wersjonowany_zmieniony, sender=_model)
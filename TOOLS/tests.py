@@ -57,20 +57,76 @@ UstawieniaTestCase:
 MagazynTestCase:
     - Narzędzia magazynowe (CRUD, opakowania)
     - Egzemplarze narzędzi (CRUD, auto-jednostka)
-    - Historia użycia (wydanie, zwrot, pracownik zwracający)
+    - Historia użycia (wydanie, zwrot, pracownik zwracający, jedno aktywne wypożyczenie, typ narzędzia)
+    - Archiwum uszkodzeń (migawka danych egzemplarza, lista jednym zapytaniem)
     - Liczniki stanów (nowe, używane, w użyciu, komplety)
 
+StanMagazynowyTestCase:
+    - Zestawienie stanów (wydanie, zwrot, usunięcie, przebudowa)
+    - Silnik stanów (sztuki/egzemplarze, jedno zapytanie dla katalogu)
+    - Zdarzenia czasu rzeczywistego (publikacja po commit, strumień SSE)
+    - Synchronizacja przyrostowa list (?since=, usunięte, przeterminowany token)
+    - Dane startowe panelu magazynu (jedno zapytanie, cache wersji, 304)
+    - Cache list API (wersje modeli, zapisy zbiorcze)
+    - Warunkowe GET (ETag, Last-Modified, 304 bez zapytań)
+    - Rozwijanie relacji i wybór pól (?expand=, ?fields=, węższy SQL)
+    - Pomiar indeksów złożonych (komenda zbadaj_indeksy, wycofanie zmian)
+    - Stronicowanie kursorem (kolejność data + id, bez OFFSET)
+
+GeneratorZamowienTestCase:
+    - Generator zamówień (braki, ostatnie ceny, stała liczba zapytań)
+    - Ilości w drodze (otwarte zamówienia liczone do stanu)
+    - Prognoza zużycia (uszkodzenia, czas dostawy, zapotrzebowanie w generatorze)
+    - Optymalizacja limitów min/max (symulacja polityki, propozycje, zapis)
+    - Przeliczanie tylko zmienionych narzędzi (NarzedzieDoPrzeliczenia)
+    - Historia cen (aktualna cena per dostawca, najtańszy dostawca, trend)
+    - Edycja zbiorcza pozycji generatora (błędy per wiersz, bulk_update)
+    - Tworzenie zamówień z generatora (numeracja, wartości, bulk)
+    - Numeracja zamówień (licznik miesięczny, rezerwacja wielu numerów)
+
+WysylkaEmailTestCase:
+    - Kolejka email (zadanie z API, wysyłka komendą, status zamówienia)
+    - Ponawianie nieudanych wysyłek
+    - Wysyłka wsadowa zamówień roboczych (jedno połączenie, wątki, wyniki per zamówienie)
+    - Treść z szablonu (escapowanie, cache renderu, podgląd, załącznik CSV)
+
 ================================================================================
 """
-from django.test import TestCase, Client
+import io
+import os
+from datetime import datetime, timedelta
+from smtplib import SMTPException
+from unittest import mock
+
+from django.test import TestCase, Client, override_settings
+from django.core import mail
+from django.core.cache import cache
+from django.template.loader import render_to_string
 from django.contrib.auth.models import User
-from rest_framework.test import APITestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
 from rest_framework import status
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from .models import (
     Kategoria, Podkategoria, Lokalizacja, Maszyna,
     Dostawca, Pracownik, NarzedzieMagazynowe, EgzemplarzNarzedzia,
-    HistoriaUzyciaNarzedzia, FakturaZakupu
+    HistoriaUzyciaNarzedzia, FakturaZakupu, StanMagazynowy,
+    Zamowienie, PozycjaZamowienia, PozycjaGeneratora, HistoriaCen, AktualnaCena,
+    NarzedzieDoPrzeliczenia, Uszkodzenie, RealizacjaZamowienia, PrognozaZuzycia,
+    WiadomoscEmail
+)
+from .services import (
+    SilnikStanow, NumeracjaZamowienService, CenyService, PrognozaZuzyciaService,
+    OptymalizatorLimitowService, WysylkaEmailService, SledzenieZmianService, EgzemplarzService,
+    UszkodzenieService, GeneratorZamowienService
 )
+from .utils import przygotuj_email_zamowienia, renderuj_zamowienie
+from .views import KursorPagination
+from .wersje import wersje
+from .zdarzenia import pobierz_broker, KANAL_MAGAZYN
 
 
 class UstawieniaTestCase(APITestCase):
@@ -80,6 +136,8 @@ class UstawieniaTestCase(APITestCase):
         """Przygotowanie danych testowych"""
         self.user = User.objects.create_user('test', 'test@test.pl', 'test123')
         self.client.force_authenticate(user=self.user)
+        # Liczniki wersji w cache (wersje.py) przeżywają wycofanie transakcji testu
+        cache.clear()
 
         # Dane testowe
         self.kategoria = Kategoria.objects.create(nazwa="Frezy")
@@ -244,6 +302,8 @@ class MagazynTestCase(APITestCase):
         """Przygotowanie danych testowych"""
         self.user = User.objects.create_user('test', 'test@test.pl', 'test123')
         self.client.force_authenticate(user=self.user)
+        # Liczniki wersji w cache (wersje.py) przeżywają wycofanie transakcji testu
+        cache.clear()
 
         # Dane testowe
         self.kategoria = Kategoria.objects.create(nazwa="Frezy")
@@ -468,6 +528,110 @@ class MagazynTestCase(APITestCase):
         egzemplarz.refresh_from_db()
         self.assertEqual(egzemplarz.stan, 'uszkodzone')
 
+    def test_historia_aktywne_wypozyczenie(self):
+        """Egzemplarz wskazuje otwarte wypożyczenie; drugie otwarte wypożyczenie jest odrzucane"""
+        egzemplarz = EgzemplarzNarzedzia.objects.create(narzedzie_typ=self.narzedzie, stan='nowe')
+        dane = {'egzemplarz_id': egzemplarz.id, 'pracownik_id': self.pracownik.id}
+
+        response = self.client.post('/api/historia/wydanie/', dane)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        egzemplarz.refresh_from_db()
+        self.assertEqual(egzemplarz.aktywne_wypozyczenie_id, response.data['id'])
+
+        response = self.client.post('/api/historia/wydanie/', dane)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('już w użyciu', response.data['error'])
+
+        # Unikalny indeks częściowy - także z pominięciem serwisu
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            HistoriaUzyciaNarzedzia.objects.create(egzemplarz=egzemplarz, pracownik=self.pracownik)
+
+        response = self.client.post(f'/api/historia/{egzemplarz.aktywne_wypozyczenie_id}/zwrot/', {
+            'stan_po_zwrocie': 'uszkodzone'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        egzemplarz.refresh_from_db()
+        self.assertIsNone(egzemplarz.aktywne_wypozyczenie_id)
+        self.assertEqual(egzemplarz.stan, 'uszkodzone')
+
+        # Ponowny zwrot tego samego wpisu nie dubluje zgłoszenia uszkodzenia
+        response = self.client.post(f'/api/historia/{response.data["id"]}/zwrot/', {
+            'stan_po_zwrocie': 'uszkodzone'
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Uszkodzenie.objects.filter(egzemplarz=egzemplarz).count(), 1)
+
+        response = self.client.post('/api/historia/wydanie/', dane)
+        self.assertIn('uszkodzony', response.data['error'])
+        response = self.client.post('/api/historia/wydanie/', {**dane, 'egzemplarz_id': 0})
+        self.assertIn('Egzemplarz nie istnieje.', response.data['error'])
+
+    def test_historia_narzedzia(self):
+        """Historia narzędzia filtrowana po typie zapisanym we wpisie - bez złączenia z egzemplarzami"""
+        egzemplarz = EgzemplarzNarzedzia.objects.create(narzedzie_typ=self.narzedzie, stan='nowe')
+        response = self.client.post('/api/historia/wydanie/', {
+            'egzemplarz_id': egzemplarz.id, 'pracownik_id': self.pracownik.id
+        })
+        historia = HistoriaUzyciaNarzedzia.objects.get(id=response.data['id'])
+        self.assertEqual(historia.narzedzie_typ_id, self.narzedzie.id)
+
+        with CaptureQueriesContext(connection) as zapytania:
+            response = self.client.get('/api/historia/', {'narzedzie_id': self.narzedzie.id})
+        self.assertEqual([w['id'] for w in response.data['results']], [historia.id])
+        self.assertNotIn('TOOLS_egzemplarznarzedzia', zapytania[0]['sql'])
+
+        # Zmiana typu egzemplarza przenosi jego historię
+        inne = NarzedzieMagazynowe.objects.create(opis="Frez palcowy 6mm", podkategoria=self.podkategoria)
+        egzemplarz.narzedzie_typ = inne
+        egzemplarz.save()
+        historia.refresh_from_db()
+        self.assertEqual(historia.narzedzie_typ_id, inne.id)
+
+    def test_uszkodzenia_migawka(self):
+        """Archiwum uszkodzeń z migawki - lista jednym zapytaniem, kompletna po usunięciu egzemplarza"""
+        egzemplarze = [
+            EgzemplarzNarzedzia.objects.create(narzedzie_typ=self.narzedzie, stan='nowe', lokalizacja=self.lokalizacja)
+            for _ in range(3)
+        ]
+        for egzemplarz in egzemplarze:
+            response = self.client.post('/api/historia/wydanie/', {
+                'egzemplarz_id': egzemplarz.id, 'pracownik_id': self.pracownik.id, 'maszyna_id': self.maszyna.id
+            })
+            self.client.post(f"/api/historia/{response.data['id']}/zwrot/", {'stan_po_zwrocie': 'uszkodzone'})
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/uszkodzenia/')
+        self.assertEqual(len(response.data['results']), 3)
+        wpis = response.data['results'][0]
+        self.assertEqual(wpis['kategoria_narzedzia'], "Frezy / VHM")
+        self.assertEqual(wpis['opis_narzedzia'], "Frezwalcowy D10")
+        self.assertEqual(wpis['numer_katalogowy'], "F10-VHM")
+        self.assertEqual(wpis['ostatnia_lokalizacja'], "A/01/1")
+        self.assertEqual(wpis['maszyna_uszkodzenia'], "DMU60")
+        self.assertEqual(wpis['ostatni_pracownik']['nazwisko'], "Kowalski")
+        self.assertEqual(wpis['stan_egzemplarza'], "Uszkodzone")
+        self.assertNotIn('maszyna_nazwa', wpis)
+        self.assertNotIn('narzedzie_typ', wpis)
+
+        # Utylizacja egzemplarza nie usuwa wpisu archiwum ani jego danych
+        # (i nie dubluje uszkodzenia zgłoszonego przy zwrocie)
+        egzemplarze[0].refresh_from_db()
+        utworzono_archiwum, _ = EgzemplarzService.usun_egzemplarz_uszkodzony(egzemplarze[0])
+        self.assertFalse(utworzono_archiwum)
+        response = self.client.get('/api/uszkodzenia/')
+        wpisy = [w for w in response.data['results'] if w['egzemplarz'] is None]
+        self.assertEqual(len(wpisy), 1)
+        self.assertEqual(wpisy[0]['maszyna_uszkodzenia'], "DMU60")
+        self.assertEqual(wpisy[0]['stan_egzemplarza'], "Uszkodzone")
+
+        # Komenda uzupełnia wpisy sprzed migawek
+        Uszkodzenie.objects.filter(egzemplarz__isnull=False).update(
+            narzedzie_typ=None, narzedzie_opis='', maszyna_nazwa='', stan_egzemplarza=''
+        )
+        call_command('uzupelnij_uszkodzenia', stdout=open(os.devnull, 'w'))
+        self.assertFalse(Uszkodzenie.objects.filter(maszyna_nazwa='').exists())
+        self.assertFalse(Uszkodzenie.objects.filter(narzedzie_typ__isnull=True).exists())
+
     def test_historia_w_uzyciu_list(self):
         """Test listowania narzędzi w użyciu"""
         egzemplarz = EgzemplarzNarzedzia.objects.create(
@@ -545,6 +709,1120 @@ class MagazynTestCase(APITestCase):
         self.assertEqual(response.data['ilosc_w_uzyciu'], 1)
 
 
+class StanMagazynowyTestCase(APITestCase):
+    """Testy zestawienia stanów magazynowych (StanMagazynowy)"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('test', 'test@test.pl', 'test123')
+        self.client.force_authenticate(user=self.user)
+        # Liczniki wersji w cache (wersje.py) przeżywają wycofanie transakcji testu
+        cache.clear()
+
+        self.maszyna = Maszyna.objects.create(nazwa="DMU60")
+        self.pracownik = Pracownik.objects.create(karta="12345", nazwisko="Kowalski", imie="Jan")
+        self.narzedzie = NarzedzieMagazynowe.objects.create(
+            opis="Płytki",
+            opakowanie='kompl',
+            ilosc_w_opakowaniu=10
+        )
+        self.egzemplarz = EgzemplarzNarzedzia.objects.create(
+            narzedzie_typ=self.narzedzie,
+            stan='nowe',
+            jednostka='kompl',
+            ilosc_w_komplecie=10
+        )
+
+    def stan(self):
+        return StanMagazynowy.objects.get(narzedzie_typ=self.narzedzie)
+
+    def test_stan_po_dodaniu_egzemplarza(self):
+        """Zestawienie aktualizuje się przy dodaniu egzemplarza"""
+        self.assertEqual(self.stan().ilosc_nowych, 10)
+        self.assertEqual(self.stan().calkowita_ilosc, 10)
+
+    def test_stan_wydanie_i_zwrot(self):
+        """Wydanie i zwrot aktualizują ilość w użyciu oraz stan egzemplarza"""
+        response = self.client.post('/api/historia/wydanie/', {
+            'egzemplarz_id': self.egzemplarz.id,
+            'maszyna_id': self.maszyna.id,
+            'pracownik_id': self.pracownik.id
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.stan().ilosc_w_uzyciu, 10)
+
+        response = self.client.post(f"/api/historia/{response.data['id']}/zwrot/", {
+            'stan_po_zwrocie': 'uzywane'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stan = self.stan()
+        self.assertEqual(stan.ilosc_w_uzyciu, 0)
+        self.assertEqual(stan.ilosc_nowych, 0)
+        self.assertEqual(stan.ilosc_uzywanych_dostepnych, 10)
+
+    def test_stan_po_usunieciu_egzemplarza(self):
+        """Usunięcie egzemplarza przez API zeruje zestawienie"""
+        response = self.client.delete(f'/api/egzemplarze/{self.egzemplarz.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.stan().calkowita_ilosc, 0)
+
+    def test_usuniecie_narzedzia(self):
+        """Usunięcie typu narzędzia usuwa też wiersz zestawienia"""
+        self.narzedzie.delete()
+        self.assertEqual(StanMagazynowy.objects.count(), 0)
+
+    def test_przebuduj_stany(self):
+        """Komenda przebuduj_stany odtwarza zestawienie"""
+        StanMagazynowy.objects.all().delete()
+        call_command('przebuduj_stany', stdout=open(os.devnull, 'w'))
+        self.assertEqual(self.stan().ilosc_nowych, 10)
+
+    def test_zbadaj_indeksy(self):
+        """Komenda zbadaj_indeksy mierzy zapytania i wycofuje dane testowe oraz zmiany indeksów"""
+        wyjscie = io.StringIO()
+        call_command('zbadaj_indeksy', narzedzia=5, egzemplarze=2, powtorzenia=1, stdout=wyjscie)
+
+        self.assertIn('Stany magazynowe', wyjscie.getvalue())
+        self.assertEqual(NarzedzieMagazynowe.objects.count(), 1)
+        with connection.cursor() as cursor:
+            indeksy = connection.introspection.get_constraints(cursor, EgzemplarzNarzedzia._meta.db_table)
+        self.assertIn('egzemplarz_narz_stan', indeksy)
+        self.assertFalse(any(nazwa.startswith('pomiar_') for nazwa in indeksy))
+
+    def test_zdarzenia_wydania(self):
+        """Wydanie publikuje po zatwierdzeniu nowe ilości narzędzia i otwarte wypożyczenie"""
+        broker = pobierz_broker()
+        subskrypcja = broker.subskrybuj(KANAL_MAGAZYN)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/historia/wydanie/', {
+                    'egzemplarz_id': self.egzemplarz.id,
+                    'pracownik_id': self.pracownik.id
+                })
+            zdarzenia = []
+            while (zdarzenie := subskrypcja.pobierz(0)) is not None:
+                zdarzenia.append(zdarzenie)
+        finally:
+            broker.anuluj(subskrypcja)
+
+        stan = [z for z in zdarzenia if z['typ'] == 'stan'][-1]
+        self.assertEqual(stan['narzedzie_id'], self.narzedzie.id)
+        self.assertEqual(stan['stan']['ilosc_w_uzyciu'], 10)
+        wypozyczenie = [z for z in zdarzenia if z['typ'] == 'wypozyczenie'][-1]
+        self.assertEqual(wypozyczenie['historia_id'], response.data['id'])
+        self.assertTrue(wypozyczenie['aktywne'])
+
+    def test_zdarzenia_wycofanej_transakcji(self):
+        """Zmiany wycofane w transakcji nie są publikowane"""
+        broker = pobierz_broker()
+        subskrypcja = broker.subskrybuj(KANAL_MAGAZYN)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        EgzemplarzNarzedzia.objects.create(narzedzie_typ=self.narzedzie, stan='nowe')
+                        raise ValueError
+                except ValueError:
+                    pass
+            self.assertIsNone(subskrypcja.pobierz(0))
+        finally:
+            broker.anuluj(subskrypcja)
+
+    def test_strumien_sse(self):
+        """Widok strumienia przekazuje zdarzenia jako text/event-stream"""
+        self.client.force_login(self.user)
+        response = self.client.get('/api/zdarzenia/magazyn/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        strumien = iter(response.streaming_content)
+        try:
+            self.assertEqual(next(strumien), b'retry: 3000\n\n')
+            pobierz_broker().opublikuj(KANAL_MAGAZYN, [{'typ': 'stan', 'narzedzie_id': 7, 'stan': {'ilosc_nowych': 1}}])
+            tresc = next(strumien).decode()
+        finally:
+            response.close()
+        self.assertIn('event: stan\n', tresc)
+        self.assertIn('"narzedzie_id": 7', tresc)
+
+    def cofnij_zmiany(self):
+        """Przesuwa daty modyfikacji w przeszłość - poza margines tokenu synchronizacji"""
+        godzine_temu = timezone.now() - timedelta(hours=1)
+        NarzedzieMagazynowe.objects.update(data_modyfikacji=godzine_temu)
+        StanMagazynowy.objects.update(data_aktualizacji=godzine_temu)
+        HistoriaUzyciaNarzedzia.objects.update(data_modyfikacji=godzine_temu)
+
+    def test_synchronizacja_narzedzi(self):
+        """?since= zwraca tylko narzędzia ze zmienionym stanem oraz ID usuniętych"""
+        inne = NarzedzieMagazynowe.objects.create(opis="Frez D6")
+        self.cofnij_zmiany()
+
+        token = self.client.get('/api/narzedzia/')['X-Sync-Token']
+        self.client.post('/api/historia/wydanie/', {
+            'egzemplarz_id': self.egzemplarz.id,
+            'pracownik_id': self.pracownik.id
+        })
+        response = self.client.get('/api/narzedzia/', {'since': token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['pelna'])
+        self.assertEqual([n['id'] for n in response.data['zmienione']], [self.narzedzie.id])
+        self.assertEqual(response.data['zmienione'][0]['ilosc_w_uzyciu'], 10)
+        self.assertEqual(response.data['usuniete'], [])
+
+        token = response.data['token']
+        self.cofnij_zmiany()
+        inne_id = inne.id
+        inne.delete()
+        response = self.client.get('/api/narzedzia/', {'since': token})
+        self.assertEqual(response.data['zmienione'], [])
+        self.assertEqual(response.data['usuniete'], [inne_id])
+
+        # Usunięcie z generatora zmienia stan_maksymalny - narzędzie wraca w zmianach
+        token = response.data['token']
+        self.cofnij_zmiany()
+        self.client.delete(f'/api/generator-zamowien/{self.narzedzie.id}/delete/')
+        response = self.client.get('/api/narzedzia/', {'since': token})
+        self.assertEqual([n['id'] for n in response.data['zmienione']], [self.narzedzie.id])
+
+    def test_synchronizacja_wypozyczen(self):
+        """Zwrócone wypożyczenie wypada z listy ?w_uzyciu=true jako usunięte"""
+        token = self.client.get('/api/historia/', {'w_uzyciu': 'true'})['X-Sync-Token']
+        historia_id = self.client.post('/api/historia/wydanie/', {
+            'egzemplarz_id': self.egzemplarz.id,
+            'pracownik_id': self.pracownik.id
+        }).data['id']
+
+        response = self.client.get('/api/historia/', {'w_uzyciu': 'true', 'since': token})
+        self.assertEqual([h['id'] for h in response.data['zmienione']], [historia_id])
+
+        token = response.data['token']
+        self.cofnij_zmiany()
+        self.client.post(f'/api/historia/{historia_id}/zwrot/', {'stan_po_zwrocie': 'uzywane'})
+        response = self.client.get('/api/historia/', {'w_uzyciu': 'true', 'since': token})
+        self.assertEqual(response.data['zmienione'], [])
+        self.assertEqual(response.data['usuniete'], [historia_id])
+
+    def test_synchronizacja_tokeny(self):
+        """Nieprawidłowy token to błąd 400, przeterminowany - pełna lista"""
+        response = self.client.get('/api/narzedzia/', {'since': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        stary = SledzenieZmianService.token(timezone.now() - SledzenieZmianService.RETENCJA - timedelta(days=1))
+        response = self.client.get('/api/narzedzia/', {'since': stary})
+        self.assertTrue(response.data['pelna'])
+        self.assertEqual(len(response.data['zmienione']), 1)
+
+    def test_dane_startowe_panelu(self):
+        """Jedno zapytanie HTTP ze wszystkimi danymi panelu, stała liczba zapytań SQL"""
+        kategoria = Kategoria.objects.create(nazwa="Frezy")
+        podkategoria = Podkategoria.objects.create(nazwa="Walcowe", kategoria=kategoria)
+        for i in range(3):
+            NarzedzieMagazynowe.objects.create(opis=f"Frez D{i}", podkategoria=podkategoria)
+        self.client.post('/api/historia/wydanie/', {
+            'egzemplarz_id': self.egzemplarz.id,
+            'maszyna_id': self.maszyna.id,
+            'pracownik_id': self.pracownik.id
+        })
+
+        with CaptureQueriesContext(connection) as zimne:
+            response = self.client.get('/api/magazyn/bootstrap/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['narzedzia']), 4)
+        self.assertEqual(response.data['kategorie'][0]['podkategorie'], [{'id': podkategoria.id, 'nazwa': "Walcowe"}])
+        self.assertEqual(response.data['pracownicy'], [{'id': self.pracownik.id, 'imie': "Jan", 'nazwisko': "Kowalski"}])
+
+        plytki = next(n for n in response.data['narzedzia'] if n['id'] == self.narzedzie.id)
+        self.assertEqual(plytki['ilosc_w_uzyciu'], 10)
+        wypozyczenie = response.data['wypozyczenia'][0]
+        self.assertEqual(wypozyczenie['egzemplarz']['id'], self.egzemplarz.id)
+        self.assertEqual(wypozyczenie['maszyna'], {'id': self.maszyna.id, 'nazwa': "DMU60"})
+
+        # Ciepły cache - bez zapytań SQL
+        with CaptureQueriesContext(connection) as cieple:
+            self.assertEqual(self.client.get('/api/magazyn/bootstrap/').data, response.data)
+        self.assertEqual(len(cieple), 0)
+        self.assertLessEqual(len(zimne), 8)
+
+    def test_dane_startowe_wersja(self):
+        """Zmiana danych zmienia wersję; ta sama wersja w If-None-Match daje 304"""
+        response = self.client.get('/api/magazyn/bootstrap/')
+        etag = response['ETag']
+
+        response = self.client.get('/api/magazyn/bootstrap/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.post('/api/historia/wydanie/', {
+            'egzemplarz_id': self.egzemplarz.id,
+            'pracownik_id': self.pracownik.id
+        })
+        response = self.client.get('/api/magazyn/bootstrap/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data['wypozyczenia']), 1)
+        self.assertEqual(response.data['narzedzia'][0]['ilosc_w_uzyciu'], 10)
+
+        # Zmiana nazwy w słowniku też unieważnia dane w cache
+        etag = response['ETag']
+        self.pracownik.nazwisko = "Nowak"
+        self.pracownik.save()
+        response = self.client.get('/api/magazyn/bootstrap/')
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['wypozyczenia'][0]['pracownik']['nazwisko'], "Nowak")
+
+    def test_cache_list(self):
+        """Niezmienione listy wracają z cache bez SQL, zapis podbija wersję modelu"""
+        self.client.get('/api/maszyny/')
+        with CaptureQueriesContext(connection) as zapytania:
+            response = self.client.get('/api/maszyny/')
+        self.assertEqual(len(zapytania), 0)
+        self.assertEqual([m['nazwa'] for m in response.data], ["DMU60"])
+
+        Maszyna.objects.create(nazwa="CTX")
+        response = self.client.get('/api/maszyny/')
+        self.assertEqual([m['nazwa'] for m in response.data], ["CTX", "DMU60"])
+
+        # Ilości zapisuje bulk_create w StanMagazynowyService - wersja podbijana jawnie
+        self.client.get('/api/narzedzia/')
+        self.client.post('/api/historia/wydanie/', {
+            'egzemplarz_id': self.egzemplarz.id,
+            'pracownik_id': self.pracownik.id
+        })
+        response = self.client.get('/api/narzedzia/')
+        self.assertEqual(response.data[0]['ilosc_w_uzyciu'], 10)
+
+        OptymalizatorLimitowService.zastosuj([
+            {'id': self.narzedzie.id, 'stan_minimalny': 3, 'stan_maksymalny': 30}
+        ])
+        response = self.client.get('/api/narzedzia/')
+        self.assertEqual(response.data[0]['stan_maksymalny'], 30)
+
+    def test_warunkowy_get(self):
+        """ETag / Last-Modified z wersji modeli; zgodny walidator daje 304 bez SQL"""
+        for adres in ['/api/historia/', f'/api/egzemplarze/{self.egzemplarz.id}/']:
+            response = self.client.get(adres)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            etag = response['ETag']
+
+            with CaptureQueriesContext(connection) as zapytania:
+                response = self.client.get(adres, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(len(zapytania), 0)
+
+            response = self.client.get(adres, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Inne parametry - inny ETag
+        self.assertNotEqual(self.client.get('/api/historia/', {'w_uzyciu': 'true'})['ETag'], etag)
+
+        etag = self.client.get('/api/historia/')['ETag']
+        self.client.post('/api/historia/wydanie/', {
+            'egzemplarz_id': self.egzemplarz.id,
+            'pracownik_id': self.pracownik.id
+        })
+        response = self.client.get('/api/historia/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_rozwijanie_relacji(self):
+        """Relacje domyślnie jako ID, obiekty tylko dla ?expand= (ze złączeniami w SQL)"""
+        kategoria = Kategoria.objects.create(nazwa="Frezy")
+        podkategoria = Podkategoria.objects.create(nazwa="Walcowe", kategoria=kategoria)
+        self.narzedzie.podkategoria = podkategoria
+        self.narzedzie.save()
+        historia = HistoriaUzyciaNarzedzia.objects.create(
+            egzemplarz=self.egzemplarz, maszyna=self.maszyna, pracownik=self.pracownik
+        )
+
+        with CaptureQueriesContext(connection) as zapytania:
+            response = self.client.get('/api/historia/')
+        self.assertEqual(response.data['results'][0]['egzemplarz'], self.egzemplarz.id)
+        self.assertEqual(response.data['results'][0]['maszyna'], self.maszyna.id)
+        self.assertEqual(len(zapytania), 1)
+        self.assertNotIn('JOIN', zapytania[0]['sql'])
+
+        with CaptureQueriesContext(connection) as zapytania:
+            response = self.client.get(f'/api/historia/{historia.id}/', {
+                'expand': 'egzemplarz.narzedzie_typ.podkategoria.kategoria,pracownik'
+            })
+        narzedzie = response.data['egzemplarz']['narzedzie_typ']
+        self.assertEqual(narzedzie['podkategoria']['kategoria'], {'id': kategoria.id, 'nazwa': "Frezy"})
+        self.assertEqual(narzedzie['ostatni_dostawca'], None)
+        self.assertEqual(response.data['egzemplarz']['lokalizacja'], None)
+        self.assertEqual(response.data['pracownik']['nazwisko'], "Kowalski")
+        self.assertEqual(response.data['maszyna'], self.maszyna.id)
+        self.assertEqual(len(zapytania), 1)
+
+        # Relacje wielokrotne - lista ID albo obiekty, jedno dodatkowe zapytanie
+        response = self.client.get('/api/kategorie/')
+        self.assertEqual(response.data[0]['podkategorie'], [podkategoria.id])
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/kategorie/', {'expand': 'podkategorie'})
+        self.assertEqual(response.data[0]['podkategorie'][0]['nazwa'], "Walcowe")
+
+    def test_stronicowanie_kursorem(self):
+        """Historia stronicowana kursorem - kolejne strony bez powtórzeń, bez OFFSET"""
+        data = timezone.now()
+        wpisy = HistoriaUzyciaNarzedzia.objects.bulk_create([
+            HistoriaUzyciaNarzedzia(
+                egzemplarz=self.egzemplarz, narzedzie_typ=self.narzedzie, pracownik=self.pracownik, data_zwrotu=data
+            )
+            for _ in range(5)
+        ])
+        # Ta sama data wydania - kolejność rozstrzyga id
+        HistoriaUzyciaNarzedzia.objects.filter(id__in=[w.id for w in wpisy]).update(data_wydania=data)
+
+        pobrane = []
+        adres = '/api/historia/?page_size=2'
+        while adres:
+            with CaptureQueriesContext(connection) as zapytania:
+                response = self.client.get(adres)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(zapytania), 1)
+            self.assertNotIn('OFFSET', zapytania[0]['sql'])
+            pobrane += [wpis['id'] for wpis in response.data['results']]
+            adres = response.data['next']
+
+        self.assertEqual(pobrane, sorted((w.id for w in wpisy), reverse=True))
+        self.assertEqual(self.client.get('/api/historia/', {'cursor': 'xyz'}).status_code, status.HTTP_404_NOT_FOUND)
+
+        # Strony kolejnych list w kolejności od najnowszych
+        Uszkodzenie.objects.create(egzemplarz=self.egzemplarz, opis_uszkodzenia="Starsze")
+        nowsze = Uszkodzenie.objects.create(egzemplarz=self.egzemplarz, opis_uszkodzenia="Nowsze")
+        response = self.client.get('/api/uszkodzenia/', {'page_size': 1})
+        self.assertEqual([u['id'] for u in response.data['results']], [nowsze.id])
+        self.assertIsNotNone(response.data['next'])
+
+    def test_stronicowanie_kursorem_null(self):
+        """NULL w pierwszej kolumnie kolejności - kursor przechodzi przez wszystkie wiersze"""
+        data = timezone.now()
+        egzemplarze = EgzemplarzNarzedzia.objects.bulk_create([
+            EgzemplarzNarzedzia(narzedzie_typ=self.narzedzie, stan='nowe') for _ in range(5)
+        ])
+        # Otwarte wypożyczenia (bez daty zwrotu) - każde na innym egzemplarzu
+        wpisy = HistoriaUzyciaNarzedzia.objects.bulk_create([
+            HistoriaUzyciaNarzedzia(
+                egzemplarz=egzemplarz, narzedzie_typ=self.narzedzie, pracownik=self.pracownik,
+                data_zwrotu=None if i % 2 else data - timedelta(days=i)
+            )
+            for i, egzemplarz in enumerate(egzemplarze)
+        ])
+        z_data = [w.id for w in wpisy if w.data_zwrotu]
+        bez_daty = [w.id for w in wpisy if w.data_zwrotu is None]
+
+        def wszystkie_strony(ordering):
+            widok = mock.Mock(ordering=ordering)
+            pobrane, kursor = [], None
+            while True:
+                stronicowanie = KursorPagination()
+                request = Request(APIRequestFactory().get('/', {'page_size': 2, **({'cursor': kursor} if kursor else {})}))
+                pobrane += [w.id for w in stronicowanie.paginate_queryset(HistoriaUzyciaNarzedzia.objects.all(), request, widok)]
+                kursor = stronicowanie.nastepny
+                if kursor is None:
+                    return pobrane
+
+        # NULL jest większy od każdej daty - malejąco na początku, rosnąco na końcu
+        self.assertEqual(wszystkie_strony(('-data_zwrotu', '-id')), sorted(bez_daty, reverse=True) + z_data)
+        self.assertEqual(wszystkie_strony(('data_zwrotu', 'id')), z_data[::-1] + bez_daty)
+
+        # Lista egzemplarzy (data zakupu wymagana) - te same daty rozstrzyga id
+        EgzemplarzNarzedzia.objects.update(data_zakupu=data)
+        pobrane, adres = [], '/api/egzemplarze/?page_size=2'
+        while adres:
+            response = self.client.get(adres)
+            pobrane += [e['id'] for e in response.data['results']]
+            adres = response.data['next']
+        self.assertEqual(pobrane, sorted(EgzemplarzNarzedzia.objects.values_list('id', flat=True), reverse=True))
+
+    def test_wybor_pol(self):
+        """?fields= ogranicza pola, również w rozwiniętych relacjach"""
+        podkategoria = Podkategoria.objects.create(nazwa="Walcowe", kategoria=Kategoria.objects.create(nazwa="Frezy"))
+        self.narzedzie.podkategoria = podkategoria
+        self.narzedzie.save()
+
+        response = self.client.get('/api/narzedzia/', {'fields': 'id,opis,ilosc_nowych'})
+        self.assertEqual(response.data[0], {'id': self.narzedzie.id, 'opis': "Płytki", 'ilosc_nowych': 10})
+
+        response = self.client.get('/api/narzedzia/', {
+            'fields': 'id,podkategoria.nazwa',
+            'expand': 'podkategoria'
+        })
+        self.assertEqual(response.data[0], {'id': self.narzedzie.id, 'podkategoria': {'nazwa': "Walcowe"}})
+
+        # Pola do zapisu (*_id) pozostają dostępne
+        response = self.client.patch(f'/api/narzedzia/{self.narzedzie.id}/?fields=id', {
+            'podkategoria_id': None
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'id': self.narzedzie.id})
+        self.narzedzie.refresh_from_db()
+        self.assertIsNone(self.narzedzie.podkategoria_id)
+
+    def test_silnik_stanow_jednostki(self):
+        """Silnik zwraca ilości w sztukach i w egzemplarzach"""
+        EgzemplarzNarzedzia.objects.create(
+            narzedzie_typ=self.narzedzie, stan='uszkodzone', jednostka='kompl', ilosc_w_komplecie=10
+        )
+        HistoriaUzyciaNarzedzia.objects.create(egzemplarz=self.egzemplarz, pracownik=self.pracownik)
+
+        stan = SilnikStanow.dla_narzedzia(self.narzedzie.id)
+        self.assertEqual(stan['nowe_szt'], 10)
+        self.assertEqual(stan['nowe_egz'], 1)
+        self.assertEqual(stan['uszkodzone_szt'], 10)
+        self.assertEqual(stan['w_uzyciu_szt'], 10)
+        self.assertEqual(stan['dostepne_szt'], 10)
+        self.assertEqual(stan['razem_egz'], 2)
+
+    def test_silnik_stanow_jedno_zapytanie(self):
+        """Stany dowolnej liczby narzędzi liczone są jednym zapytaniem"""
+        ids = [self.narzedzie.id]
+        for i in range(5):
+            narzedzie = NarzedzieMagazynowe.objects.create(opis=f"Frez {i}")
+            EgzemplarzNarzedzia.objects.create(narzedzie_typ=narzedzie, stan='uzywane')
+            ids.append(narzedzie.id)
+        bez_egzemplarzy = NarzedzieMagazynowe.objects.create(opis="Pusty")
+        ids.append(bez_egzemplarzy.id)
+
+        with self.assertNumQueries(1):
+            stany = SilnikStanow.dla_narzedzi(ids)
+        self.assertEqual(len(stany), 7)
+        self.assertEqual(stany[ids[1]]['uzywane_szt'], 1)
+        self.assertEqual(stany[bez_egzemplarzy.id]['dostepne_szt'], 0)
+
+    def test_lista_narzedzi_stala_liczba_zapytan(self):
+        """Lista narzędzi nie wykonuje zapytań per narzędzie"""
+        for i in range(5):
+            narzedzie = NarzedzieMagazynowe.objects.create(opis=f"Frez {i}")
+            EgzemplarzNarzedzia.objects.create(narzedzie_typ=narzedzie, stan='nowe')
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/narzedzia/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 6)
+
+
+class GeneratorZamowienTestCase(APITestCase):
+    """Testy generatora zamówień"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('test', 'test@test.pl', 'test123')
+        self.client.force_authenticate(user=self.user)
+        # Liczniki wersji w cache (wersje.py) przeżywają wycofanie transakcji testu
+        cache.clear()
+
+        self.kategoria = Kategoria.objects.create(nazwa="Frezy")
+        self.podkategoria = Podkategoria.objects.create(nazwa="VHM", kategoria=self.kategoria)
+        self.dostawca = Dostawca.objects.create(kod_dostawcy="D1", nazwa_firmy="Dostawca 1", email="d1@test.pl")
+        self.narzedzie = NarzedzieMagazynowe.objects.create(
+            podkategoria=self.podkategoria,
+            opis="Frez D10",
+            stan_maksymalny=5,
+            ostatni_dostawca=self.dostawca
+        )
+        EgzemplarzNarzedzia.objects.create(narzedzie_typ=self.narzedzie, stan='nowe')
+        EgzemplarzNarzedzia.objects.create(narzedzie_typ=self.narzedzie, stan='uszkodzone')
+
+    def utworz_narzedzia(self, ilosc):
+        for i in range(ilosc):
+            NarzedzieMagazynowe.objects.create(
+                podkategoria=self.podkategoria,
+                opis=f"Wiertło {i}",
+                stan_maksymalny=2,
+                ostatni_dostawca=self.dostawca
+            )
+
+    def test_generator_braki(self):
+        """Generator tworzy pozycje dla braków (uszkodzone nie liczą się do stanu)"""
+        response = self.client.get('/api/generator-zamowien/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['ilosc_do_zamowienia'], 4)
+        self.assertEqual(response.data[0]['dostawca_id'], self.dostawca.id)
+
+    def test_generator_komplety(self):
+        """Braki w sztukach przeliczane są na komplety"""
+        narzedzie = NarzedzieMagazynowe.objects.create(
+            opis="Płytki", opakowanie='kompl', ilosc_w_opakowaniu=10, stan_maksymalny=25
+        )
+        EgzemplarzNarzedzia.objects.create(
+            narzedzie_typ=narzedzie, stan='nowe', jednostka='kompl', ilosc_w_komplecie=10
+        )
+        response = self.client.get('/api/generator-zamowien/')
+        pozycja = next(p for p in response.data if p['id'] == narzedzie.id)
+        self.assertEqual(pozycja['ilosc_do_zamowienia'], 2)
+
+    def test_generator_ostatnia_cena(self):
+        """Domyślna cena pochodzi z ostatniego zamówienia u ostatniego dostawcy"""
+        for numer, cena in (('2025/01/001', '10.00'), ('2025/02/001', '12.50')):
+            zamowienie = Zamowienie.objects.create(numer=numer, dostawca=self.dostawca)
+            PozycjaZamowienia.objects.create(
+                zamowienie=zamowienie, narzedzie_typ=self.narzedzie,
+                ilosc_zamowiona=1, cena_jednostkowa=cena
+            )
+
+        response = self.client.get('/api/generator-zamowien/')
+        self.assertEqual(response.data[0]['cena_jednostkowa'], 12.5)
+
+    def test_generator_bez_duplikatow(self):
+        """Ponowne otwarcie generatora nie dubluje pozycji"""
+        self.client.get('/api/generator-zamowien/')
+        response = self.client.get('/api/generator-zamowien/')
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(PozycjaGeneratora.objects.count(), 1)
+
+    def test_generator_stala_liczba_zapytan(self):
+        """Liczba zapytań generatora nie zależy od wielkości katalogu"""
+        self.utworz_narzedzia(3)
+        with CaptureQueriesContext(connection) as maly:
+            self.client.get('/api/generator-zamowien/')
+
+        self.utworz_narzedzia(30)
+        with CaptureQueriesContext(connection) as duzy:
+            response = self.client.get('/api/generator-zamowien/')
+
+        self.assertEqual(len(response.data), 34)
+        self.assertEqual(len(maly.captured_queries), len(duzy.captured_queries))
+
+    def test_generator_bez_zmian(self):
+        """Bez zmian od ostatniego uruchomienia generator nie skanuje katalogu"""
+        self.utworz_narzedzia(20)
+        self.client.get('/api/generator-zamowien/')
+        self.assertFalse(NarzedzieDoPrzeliczenia.objects.exists())
+
+        with CaptureQueriesContext(connection) as zapytania:
+            response = self.client.get('/api/generator-zamowien/')
+        self.assertEqual(len(response.data), 21)
+        sql = ' '.join(q['sql'] for q in zapytania.captured_queries)
+        self.assertNotIn('from "tools_narzedziemagazynowe"', sql.lower())
+
+    def test_generator_ocenia_zmienione(self):
+        """Zmiana stanu lub limitu oznacza narzędzie do ponownej oceny"""
+        narzedzie = NarzedzieMagazynowe.objects.create(opis="Gwintownik", stan_maksymalny=1)
+        egzemplarz = EgzemplarzNarzedzia.objects.create(narzedzie_typ=narzedzie, stan='nowe')
+        response = self.client.get('/api/generator-zamowien/')
+        self.assertNotIn(narzedzie.id, [p['id'] for p in response.data])
+
+        egzemplarz.stan = 'uszkodzone'
+        egzemplarz.save()
+        response = self.client.get('/api/generator-zamowien/')
+        self.assertIn(narzedzie.id, [p['id'] for p in response.data])
+
+        PozycjaGeneratora.objects.filter(narzedzie_typ=narzedzie).delete()
+        narzedzie.stan_maksymalny = 3
+        narzedzie.save(update_fields=['stan_maksymalny', 'data_modyfikacji'])
+        response = self.client.get('/api/generator-zamowien/')
+        pozycja = next(p for p in response.data if p['id'] == narzedzie.id)
+        self.assertEqual(pozycja['ilosc_do_zamowienia'], 3)
+
+    def test_generator_zmiana_w_trakcie(self):
+        """Narzędzie oznaczone ponownie w trakcie oceny zostaje do następnego uruchomienia"""
+        self.assertTrue(NarzedzieDoPrzeliczenia.objects.filter(narzedzie_typ=self.narzedzie).exists())
+
+        def zmiana_w_trakcie(narzedzie_ids):
+            GeneratorZamowienService.oznacz_do_przeliczenia([self.narzedzie.id])
+            return {}
+
+        with mock.patch.object(GeneratorZamowienService, 'ostatnie_ceny', side_effect=zmiana_w_trakcie):
+            self.client.get('/api/generator-zamowien/')
+        self.assertTrue(NarzedzieDoPrzeliczenia.objects.filter(narzedzie_typ=self.narzedzie).exists())
+
+        self.client.get('/api/generator-zamowien/')
+        self.assertFalse(NarzedzieDoPrzeliczenia.objects.exists())
+
+    def zamow(self, dostawca, cena, numer):
+        zamowienie = Zamowienie.objects.create(numer=numer, dostawca=dostawca)
+        return PozycjaZamowienia.objects.create(
+            zamowienie=zamowienie, narzedzie_typ=self.narzedzie, ilosc_zamowiona=1, cena_jednostkowa=cena
+        )
+
+    def test_historia_cen_edycja_i_usuniecie(self):
+        """Edycja i usunięcie pozycji zamówienia aktualizują aktualną cenę"""
+        stara = self.zamow(self.dostawca, '10.00', '2025/01/001')
+        nowa = self.zamow(self.dostawca, '12.00', '2025/02/001')
+        aktualna = lambda: AktualnaCena.objects.get(narzedzie_typ=self.narzedzie, dostawca=self.dostawca)
+        self.assertEqual(str(aktualna().cena_jednostkowa), '12.00')
+
+        nowa.cena_jednostkowa = '11.00'
+        nowa.save()
+        self.assertEqual(HistoriaCen.objects.count(), 2)
+        self.assertEqual(str(aktualna().cena_jednostkowa), '11.00')
+
+        nowa.zamowienie.delete()
+        self.assertEqual(str(aktualna().cena_jednostkowa), '10.00')
+
+        stara.delete()
+        self.assertFalse(AktualnaCena.objects.exists())
+
+    def test_historia_cen_z_gotowe(self):
+        """Zamówienia z generatora (bulk_create) trafiają do historii cen"""
+        PozycjaGeneratora.objects.create(
+            narzedzie_typ=self.narzedzie, dostawca=self.dostawca, ilosc_do_zamowienia=4, cena_jednostkowa='7.25'
+        )
+        self.client.post('/api/generator-zamowien/gotowe/')
+
+        ceny = CenyService.aktualne_ceny([self.narzedzie.id])
+        self.assertEqual(str(ceny[(self.narzedzie.id, self.dostawca.id)]), '7.25')
+        self.assertEqual(len(CenyService.trend_cen(self.narzedzie.id)), 1)
+
+    def test_najtanszy_dostawca(self):
+        """Generator podpowiada najtańszego dostawcę, endpoint cen zwraca trend"""
+        dostawca2 = Dostawca.objects.create(kod_dostawcy="D2", nazwa_firmy="Dostawca 2")
+        self.zamow(self.dostawca, '10.00', '2025/01/001')
+        self.zamow(dostawca2, '8.00', '2025/01/002')
+
+        response = self.client.get('/api/generator-zamowien/')
+        self.assertEqual(response.data[0]['cena_jednostkowa'], 10.0)
+        self.assertEqual(response.data[0]['najtanszy_dostawca_id'], dostawca2.id)
+        self.assertEqual(response.data[0]['najtansza_cena'], 8.0)
+
+        response = self.client.get(f'/api/generator-zamowien/{self.narzedzie.id}/ceny/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['najtanszy']['dostawca_id'], dostawca2.id)
+        self.assertEqual(len(response.data['aktualne']), 2)
+        self.assertEqual(response.data['trend'][0]['zamowienie_numer'], '2025/01/002')
+
+        response = self.client.get(f'/api/generator-zamowien/{self.narzedzie.id}/ceny/?dostawca={dostawca2.id}')
+        self.assertEqual(len(response.data['trend']), 1)
+        response = self.client.get(f'/api/generator-zamowien/{self.narzedzie.id}/ceny/?dostawca=abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('error', response.data)
+
+
+    def test_w_drodze(self):
+        """Niedostarczone pozycje wysłanych zamówień liczą się do stanu w generatorze"""
+        zamowienie = Zamowienie.objects.create(numer='2025/01/001', dostawca=self.dostawca)
+        pozycja = PozycjaZamowienia.objects.create(
+            zamowienie=zamowienie, narzedzie_typ=self.narzedzie, ilosc_zamowiona=3
+        )
+        stan = lambda: StanMagazynowy.objects.get(narzedzie_typ=self.narzedzie).ilosc_w_drodze
+        self.assertEqual(stan(), 0)
+
+        zamowienie.status = 'sent'
+        zamowienie.save()
+        self.assertEqual(stan(), 3)
+
+        response = self.client.get('/api/generator-zamowien/')
+        self.assertEqual(response.data[0]['ilosc_do_zamowienia'], 1)
+        self.assertEqual(response.data[0]['ilosc_w_drodze'], 3)
+
+        pozycja.ilosc_dostarczona = 2
+        pozycja.save()
+        self.assertEqual(stan(), 1)
+
+        zamowienie.status = 'completed'
+        zamowienie.save(update_fields=['status'])
+        self.assertEqual(stan(), 0)
+
+    def test_w_drodze_komplety(self):
+        """Ilość w drodze liczona jest w sztukach, także dla kompletów"""
+        zamowienie = Zamowienie.objects.create(numer='2025/01/001', dostawca=self.dostawca, status='sent')
+        PozycjaZamowienia.objects.create(
+            zamowienie=zamowienie, narzedzie_typ=self.narzedzie,
+            ilosc_zamowiona=2, jednostka='kompl', ilosc_w_komplecie=10
+        )
+        self.assertEqual(SilnikStanow.w_drodze([self.narzedzie.id]), {self.narzedzie.id: 20})
+
+        response = self.client.get('/api/narzedzia/')
+        narzedzie = next(n for n in response.data if n['id'] == self.narzedzie.id)
+        self.assertEqual(narzedzie['ilosc_w_drodze'], 20)
+
+        zamowienie.delete()
+        self.assertEqual(StanMagazynowy.objects.get(narzedzie_typ=self.narzedzie).ilosc_w_drodze, 0)
+
+    def test_prognoza_zuzycia(self):
+        """Prognoza z uszkodzeń i czasu dostawy podnosi ilość w generatorze ponad limit"""
+        for _ in range(30):
+            egzemplarz = EgzemplarzNarzedzia.objects.create(narzedzie_typ=self.narzedzie, stan='uszkodzone')
+            Uszkodzenie.objects.create(egzemplarz=egzemplarz, opis_uszkodzenia='Złamany')
+
+        zamowienie = Zamowienie.objects.create(
+            numer='2025/01/001', dostawca=self.dostawca, status='completed',
+            data_wyslania=timezone.now() - timedelta(days=10)
+        )
+        RealizacjaZamowienia.objects.create(zamowienie=zamowienie)
+
+        call_command('prognozuj_zuzycie', stdout=open(os.devnull, 'w'))
+
+        prognoza = PrognozaZuzycia.objects.get(narzedzie_typ=self.narzedzie)
+        self.assertEqual(prognoza.czas_dostawy_dni, 10)
+        self.assertGreater(prognoza.zuzycie_dzienne, 0)
+        self.assertGreater(prognoza.zapotrzebowanie, self.narzedzie.stan_maksymalny)
+
+        response = self.client.get('/api/generator-zamowien/')
+        self.assertEqual(response.data[0]['ilosc_do_zamowienia'], prognoza.zapotrzebowanie - 1)
+        self.assertEqual(response.data[0]['zapotrzebowanie_prognoza'], prognoza.zapotrzebowanie)
+
+    def test_prognoza_po_utylizacji(self):
+        """Uszkodzenia utylizowanych egzemplarzy liczą się do prognozy (typ i komplet z migawki)"""
+        for _ in range(30):
+            egzemplarz = EgzemplarzNarzedzia.objects.create(
+                narzedzie_typ=self.narzedzie, stan='uszkodzone', jednostka='kompl', ilosc_w_komplecie=2
+            )
+            EgzemplarzService.usun_egzemplarz_uszkodzony(egzemplarz)
+        self.assertEqual(Uszkodzenie.objects.filter(egzemplarz__isnull=True).count(), 30)
+
+        # 30 kompletów po 2 sztuki w okresie pełnych tygodni
+        tygodnie = -(-PrognozaZuzyciaService.OKRES_HISTORII_DNI // 7)
+        prognozy = PrognozaZuzyciaService.oblicz()
+        self.assertAlmostEqual(float(prognozy[self.narzedzie.id]['zuzycie_dzienne']), 60 / (tygodnie * 7), places=3)
+
+    def test_prognoza_bez_historii(self):
+        """Narzędzia bez historii dostają zerowe zapotrzebowanie i domyślny czas dostawy"""
+        prognozy = PrognozaZuzyciaService.oblicz()
+        self.assertEqual(prognozy[self.narzedzie.id]['zapotrzebowanie'], 0)
+        self.assertEqual(
+            prognozy[self.narzedzie.id]['czas_dostawy_dni'], PrognozaZuzyciaService.DOMYSLNY_CZAS_DOSTAWY_DNI
+        )
+
+    def test_symulacja_polityki(self):
+        """Symulacja min/max liczy niedobory, średni stan i zamówienia"""
+        zdarzenia = [(0, -3), (1, -3), (5, -3)]
+        obsluga, sredni_stan, zamowienia = OptymalizatorLimitowService.symuluj(zdarzenia, 2, 5, 3, 10)
+        # dzień 0: 5->2, zamówienie 3 (dostawa dzień 3); dzień 1: brak 1; dzień 5: 3->0, zamówienie 5
+        self.assertAlmostEqual(obsluga, 8 / 9)
+        self.assertEqual(zamowienia, 2)
+        self.assertAlmostEqual(sredni_stan, (5 * 0 + 2 * 1 + 0 * 2 + 3 * 2 + 0 * 5) / 10)
+
+    def test_optymalizacja_limitow(self):
+        """Optymalizator proponuje limity z historii, zapis idzie jednym bulk_update"""
+        teraz = timezone.now()
+        for tydzien in range(52):
+            egzemplarz = EgzemplarzNarzedzia.objects.create(narzedzie_typ=self.narzedzie, stan='uszkodzone')
+            uszkodzenie = Uszkodzenie.objects.create(egzemplarz=egzemplarz)
+            Uszkodzenie.objects.filter(id=uszkodzenie.id).update(data_uszkodzenia=teraz - timedelta(days=7 * tydzien))
+
+        response = self.client.get('/api/limity/propozycje/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        propozycja = next(p for p in response.data if p['id'] == self.narzedzie.id)
+        self.assertGreaterEqual(propozycja['poziom_obslugi']['proponowany'], OptymalizatorLimitowService.POZIOM_OBSLUGI)
+        self.assertLess(propozycja['stan_maksymalny']['proponowany'], self.narzedzie.stan_maksymalny)
+        self.assertLess(propozycja['sredni_stan']['proponowany'], propozycja['sredni_stan']['obecny'])
+
+        NarzedzieDoPrzeliczenia.objects.all().delete()
+        response = self.client.post('/api/limity/zastosuj/', {'zmiany': [
+            {
+                'id': self.narzedzie.id,
+                'stan_minimalny': propozycja['stan_minimalny']['proponowany'],
+                'stan_maksymalny': propozycja['stan_maksymalny']['proponowany'],
+            },
+            {'id': self.narzedzie.id, 'stan_minimalny': 5, 'stan_maksymalny': 1},
+        ]}, format='json')
+        self.assertEqual(response.data['zastosowane'], [self.narzedzie.id])
+        self.assertEqual(len(response.data['bledy']), 1)
+
+        self.narzedzie.refresh_from_db()
+        self.assertEqual(self.narzedzie.stan_maksymalny, propozycja['stan_maksymalny']['proponowany'])
+        self.assertTrue(NarzedzieDoPrzeliczenia.objects.filter(narzedzie_typ=self.narzedzie).exists())
+
+    def test_bulk_update_pozycji(self):
+        """Zbiorcza edycja zapisuje poprawne wiersze i zwraca błędy pozostałych"""
+        dostawca2 = Dostawca.objects.create(kod_dostawcy="D2", nazwa_firmy="Dostawca 2")
+        narzedzie2 = NarzedzieMagazynowe.objects.create(opis="Wiertło", stan_maksymalny=0)
+        self.client.get('/api/generator-zamowien/')
+
+        response = self.client.patch('/api/generator-zamowien/bulk-update/', {'pozycje': [
+            {'id': self.narzedzie.id, 'dostawca_id': dostawca2.id, 'ilosc_do_zamowienia': 7, 'cena_jednostkowa': '3.20'},
+            {'id': narzedzie2.id, 'numer_katalogowy': 'W-10', 'ilosc_do_zamowienia': 2},
+            {'id': 99999, 'ilosc_do_zamowienia': 1},
+            {'id': self.narzedzie.id, 'dostawca_id': 99999},
+            {'id': self.narzedzie.id, 'ilosc_do_zamowienia': -1},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['success'])
+        self.assertEqual(response.data['zaktualizowane'], [self.narzedzie.id, narzedzie2.id])
+        self.assertEqual(len(response.data['bledy']), 3)
+
+        pozycja = PozycjaGeneratora.objects.get(narzedzie_typ=self.narzedzie)
+        self.assertEqual(pozycja.dostawca, dostawca2)
+        self.assertEqual(pozycja.ilosc_do_zamowienia, 7)
+        self.assertEqual(str(pozycja.cena_jednostkowa), '3.20')
+        self.narzedzie.refresh_from_db()
+        self.assertEqual(self.narzedzie.ostatni_dostawca, dostawca2)
+
+        narzedzie2.refresh_from_db()
+        self.assertEqual(narzedzie2.numer_katalogowy, 'W-10')
+        self.assertEqual(PozycjaGeneratora.objects.get(narzedzie_typ=narzedzie2).ilosc_do_zamowienia, 2)
+
+    def test_bulk_update_stala_liczba_zapytan(self):
+        """Liczba zapytań edycji zbiorczej nie zależy od liczby wierszy"""
+        self.utworz_narzedzia(20)
+        self.client.get('/api/generator-zamowien/')
+        zmiany = [
+            {'id': n_id, 'dostawca_id': self.dostawca.id, 'numer_katalogowy': f'K{n_id}', 'cena_jednostkowa': '1.00'}
+            for n_id in NarzedzieMagazynowe.objects.values_list('id', flat=True)
+        ]
+
+        with CaptureQueriesContext(connection) as zapytania:
+            response = self.client.patch('/api/generator-zamowien/bulk-update/', zmiany, format='json')
+        self.assertTrue(response.data['success'])
+        self.assertEqual(len(response.data['zaktualizowane']), 21)
+        self.assertLessEqual(len(zapytania.captured_queries), 8)
+
+    def test_update_pojedynczej_pozycji(self):
+        """Dotychczasowy endpoint edycji jednej pozycji działa przez serwis zbiorczy"""
+        response = self.client.patch(
+            f'/api/generator-zamowien/{self.narzedzie.id}/update/', {'ilosc_do_zamowienia': 9}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(PozycjaGeneratora.objects.get(narzedzie_typ=self.narzedzie).ilosc_do_zamowienia, 9)
+
+        response = self.client.patch('/api/generator-zamowien/99999/update/', {'ilosc_do_zamowienia': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_gotowe_tworzy_zamowienia(self):
+        """Gotowe tworzy po jednym zamówieniu na dostawcę z kolejnymi numerami"""
+        dostawca2 = Dostawca.objects.create(kod_dostawcy="D2", nazwa_firmy="Dostawca 2")
+        narzedzie2 = NarzedzieMagazynowe.objects.create(opis="Wiertło", stan_maksymalny=3)
+        PozycjaGeneratora.objects.create(
+            narzedzie_typ=self.narzedzie, dostawca=self.dostawca, ilosc_do_zamowienia=4, cena_jednostkowa='2.50'
+        )
+        PozycjaGeneratora.objects.create(
+            narzedzie_typ=narzedzie2, dostawca=dostawca2, ilosc_do_zamowienia=3, cena_jednostkowa='10.00'
+        )
+
+        response = self.client.post('/api/generator-zamowien/gotowe/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['zamowienia']), 2)
+
+        numery = sorted(Zamowienie.objects.values_list('numer', flat=True))
+        self.assertTrue(numery[0].endswith('/001'))
+        self.assertTrue(numery[1].endswith('/002'))
+
+        zamowienie = Zamowienie.objects.get(dostawca=self.dostawca)
+        self.assertEqual(str(zamowienie.wartosc_zamowienia), '10.00')
+        self.assertEqual(zamowienie.email_docelowy, 'd1@test.pl')
+        self.assertEqual(zamowienie.pozycje.get().wartosc_pozycji, 10)
+        self.assertEqual(PozycjaGeneratora.objects.count(), 0)
+
+    def test_gotowe_pusty_generator(self):
+        """Gotowe na pustym generatorze zwraca błąd i nie tworzy zamówień"""
+        response = self.client.post('/api/generator-zamowien/gotowe/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Zamowienie.objects.count(), 0)
+
+    def test_gotowe_stala_liczba_zapytan(self):
+        """Liczba zapytań nie zależy od liczby pozycji i dostawców"""
+        for i in range(10):
+            dostawca = Dostawca.objects.create(kod_dostawcy=f"X{i}", nazwa_firmy=f"X {i}")
+            narzedzie = NarzedzieMagazynowe.objects.create(opis=f"Frez {i}")
+            PozycjaGeneratora.objects.create(narzedzie_typ=narzedzie, dostawca=dostawca, ilosc_do_zamowienia=1)
+        NumeracjaZamowienService.przydziel_numer()
+
+        with CaptureQueriesContext(connection) as zapytania:
+            response = self.client.post('/api/generator-zamowien/gotowe/')
+        self.assertEqual(len(response.data['zamowienia']), 10)
+        self.assertLessEqual(len(zapytania.captured_queries), 17)
+
+
+    def test_numeracja_kolejne_numery(self):
+        """Licznik miesięczny przydziela kolejne numery, także w paczce"""
+        data = datetime(2025, 3, 15)
+        self.assertEqual(NumeracjaZamowienService.przydziel_numer(data), '2025/03/001')
+        self.assertEqual(
+            NumeracjaZamowienService.przydziel_numery(3, data),
+            ['2025/03/002', '2025/03/003', '2025/03/004']
+        )
+        self.assertEqual(NumeracjaZamowienService.przydziel_numer(datetime(2025, 4, 1)), '2025/04/001')
+
+    def test_numeracja_kontynuuje_istniejace(self):
+        """Nowy licznik kontynuuje numerację zamówień sprzed wprowadzenia liczników"""
+        Zamowienie.objects.create(numer='2025/05/007', dostawca=self.dostawca)
+        self.assertEqual(NumeracjaZamowienService.przydziel_numer(datetime(2025, 5, 20)), '2025/05/008')
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_HOST_USER='cnc')
+class WysylkaEmailTestCase(APITestCase):
+    """Testy kolejki wysyłki emaili z zamówieniami"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('test', 'test@test.pl', 'test123')
+        self.client.force_authenticate(user=self.user)
+
+        self.dostawca = Dostawca.objects.create(kod_dostawcy="D1", nazwa_firmy="Dostawca 1", email="d1@test.pl")
+        self.narzedzie = NarzedzieMagazynowe.objects.create(opis="Frez D10", stan_maksymalny=5)
+        self.zamowienie = Zamowienie.objects.create(
+            numer='2025/01/001', dostawca=self.dostawca, email_docelowy='d1@test.pl'
+        )
+        PozycjaZamowienia.objects.create(
+            zamowienie=self.zamowienie, narzedzie_typ=self.narzedzie, ilosc_zamowiona=3, narzedzie_opis="Frez D10"
+        )
+
+    def test_api_kolejkuje_wiadomosc(self):
+        """API zwraca zadanie od razu - bez wysyłki i bez zmiany statusu zamówienia"""
+        url = f'/api/zamowienia/{self.zamowienie.id}/wyslij-email/'
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'oczekuje')
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.zamowienie.refresh_from_db()
+        self.assertEqual(self.zamowienie.status, 'draft')
+        self.assertIsNone(self.zamowienie.data_wyslania)
+
+        # Ponowne kliknięcie zwraca to samo zadanie
+        response2 = self.client.post(url)
+        self.assertEqual(response2.data['job_id'], response.data['job_id'])
+        self.assertEqual(WiadomoscEmail.objects.count(), 1)
+
+    def test_komenda_wysyla_i_zmienia_status(self):
+        """Po wysyłce zamówienie jest 'sent', a jego pozycje liczą się jako w drodze"""
+        job_id = self.client.post(f'/api/zamowienia/{self.zamowienie.id}/wyslij-email/').data['job_id']
+
+        call_command('wyslij_emaile', stdout=open(os.devnull, 'w'))
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['d1@test.pl'])
+        self.assertIn(self.zamowienie.numer, mail.outbox[0].subject)
+
+        self.zamowienie.refresh_from_db()
+        self.assertEqual(self.zamowienie.status, 'sent')
+        self.assertIsNotNone(self.zamowienie.data_wyslania)
+        self.assertEqual(StanMagazynowy.objects.get(narzedzie_typ=self.narzedzie).ilosc_w_drodze, 3)
+
+        response = self.client.get(f'/api/email/zadania/{job_id}/')
+        self.assertEqual(response.data['status'], 'wyslana')
+        self.assertEqual(response.data['zamowienie_status'], 'sent')
+
+    def test_ponawianie_nieudanej_wysylki(self):
+        """Błąd SMTP odkłada wiadomość na później, a po MAKS_PROB oznacza ją jako błąd"""
+        wiadomosc, _ = WysylkaEmailService.zakolejkuj_zamowienie(self.zamowienie)
+        teraz = timezone.now()
+
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages',
+            side_effect=SMTPException('Serwer niedostępny')
+        ):
+            self.assertEqual(WysylkaEmailService.przetworz(teraz=teraz), {'wyslane': 0, 'bledy': 1})
+            wiadomosc.refresh_from_db()
+            self.assertEqual(wiadomosc.status, 'oczekuje')
+            self.assertGreater(wiadomosc.nastepna_proba, teraz)
+            self.assertIn('Serwer niedostępny', wiadomosc.ostatni_blad)
+
+            # Przed terminem kolejnej próby wiadomość nie jest pobierana
+            self.assertEqual(WysylkaEmailService.przetworz(teraz=teraz), {'wyslane': 0, 'bledy': 0})
+
+            for _ in range(WysylkaEmailService.MAKS_PROB - 1):
+                teraz += timedelta(days=1)
+                WysylkaEmailService.przetworz(teraz=teraz)
+
+        wiadomosc.refresh_from_db()
+        self.assertEqual(wiadomosc.status, 'blad')
+        self.assertEqual(wiadomosc.liczba_prob, WysylkaEmailService.MAKS_PROB)
+        self.zamowienie.refresh_from_db()
+        self.assertEqual(self.zamowienie.status, 'draft')
+
+
+    def utworz_zamowienia(self, ilosc):
+        for i in range(ilosc):
+            zamowienie = Zamowienie.objects.create(
+                numer=f'2025/02/{i + 1:03d}', dostawca=self.dostawca, email_docelowy='d1@test.pl'
+            )
+            PozycjaZamowienia.objects.create(
+                zamowienie=zamowienie, narzedzie_typ=self.narzedzie, ilosc_zamowiona=1, narzedzie_opis="Frez D10"
+            )
+
+    def test_wysylka_wsadowa_jedno_polaczenie(self):
+        """Wszystkie zamówienia robocze idą jednym połączeniem, bez adresu są pomijane"""
+        self.utworz_zamowienia(2)
+        bez_adresu = Zamowienie.objects.create(numer='2025/03/001', dostawca=self.dostawca)
+        Zamowienie.objects.create(numer='2025/03/002', dostawca=self.dostawca, email_docelowy='d1@test.pl', status='sent')
+
+        with mock.patch('django.core.mail.get_connection', wraps=mail.get_connection) as get_connection:
+            response = self.client.post('/api/email/wyslij-zamowienia/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_connection.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(response.data['wyslane'], 3)
+
+        statusy = {wynik['zamowienie_id']: wynik['status'] for wynik in response.data['wyniki']}
+        self.assertEqual(statusy[bez_adresu.id], 'pominiete')
+        self.assertEqual(statusy[self.zamowienie.id], 'wyslane')
+        self.assertEqual(Zamowienie.objects.filter(status='sent').count(), 4)
+        self.assertEqual(WiadomoscEmail.objects.filter(status='wyslana').count(), 3)
+        # bulk_update pomija sygnały - stan w drodze przeliczony jawnie
+        self.assertEqual(StanMagazynowy.objects.get(narzedzie_typ=self.narzedzie).ilosc_w_drodze, 5)
+
+    def test_wysylka_wsadowa_watki(self):
+        """Przy kilku wątkach każdy wysyła swoją część jednym połączeniem"""
+        self.utworz_zamowienia(4)
+
+        with mock.patch('django.core.mail.get_connection', wraps=mail.get_connection) as get_connection:
+            wyniki = WysylkaEmailService.wyslij_zamowienia(watki=2)
+        self.assertEqual(get_connection.call_count, 2)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertTrue(all(wynik['status'] == 'wyslane' for wynik in wyniki))
+
+    def test_wysylka_wsadowa_blad(self):
+        """Nieudana wysyłka wsadowa zostaje w kolejce, a zamówienie w wersji roboczej"""
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages',
+            side_effect=SMTPException('Serwer niedostępny')
+        ):
+            wyniki = WysylkaEmailService.wyslij_zamowienia()
+
+        self.assertEqual(wyniki[0]['status'], 'blad')
+        wiadomosc = WiadomoscEmail.objects.get(id=wyniki[0]['job_id'])
+        self.assertEqual(wiadomosc.status, 'oczekuje')
+        self.assertEqual(wiadomosc.liczba_prob, 1)
+        self.zamowienie.refresh_from_db()
+        self.assertEqual(self.zamowienie.status, 'draft')
+
+        # Kolejna wysyłka wsadowa wykorzystuje tę samą wiadomość
+        WysylkaEmailService.wyslij_zamowienia()
+        wiadomosc.refresh_from_db()
+        self.assertEqual(wiadomosc.status, 'wyslana')
+        self.assertEqual(WiadomoscEmail.objects.count(), 1)
+
+    def test_szablon_escapuje_wartosci(self):
+        """Wartości z bazy trafiają do HTML escapowane, a pozycje do załącznika CSV"""
+        self.zamowienie.uwagi = '<script>alert(1)</script>'
+        self.zamowienie.save()
+
+        email = przygotuj_email_zamowienia(self.zamowienie)
+        self.assertNotIn('<script>', email['html_content'])
+        self.assertIn('&lt;script&gt;', email['html_content'])
+        self.assertIn('Frez D10', email['html_content'])
+
+        nazwa, tresc, typ = email['attachments'][0]
+        self.assertEqual(nazwa, 'zamowienie_2025-01-001.csv')
+        self.assertEqual(typ, 'text/csv')
+        self.assertEqual(len(tresc.strip().splitlines()), 2)
+
+    def test_cache_renderu(self):
+        """Niezmienione zamówienie nie jest renderowane ponownie; zmiana pozycji unieważnia cache"""
+        cache.clear()
+        self.zamowienie.refresh_from_db()
+        with mock.patch('TOOLS.utils.render_to_string', wraps=render_to_string) as render:
+            pierwszy = renderuj_zamowienie(self.zamowienie)
+            response = self.client.get(f'/api/zamowienia/{self.zamowienie.id}/podglad-email/')
+            self.assertEqual(render.call_count, 1)
+            self.assertEqual(response.content.decode(), pierwszy['html_content'])
+
+            PozycjaZamowienia.objects.create(
+                zamowienie=self.zamowienie, narzedzie_typ=self.narzedzie, ilosc_zamowiona=1, narzedzie_opis="Wiertło D5"
+            )
+            self.zamowienie.refresh_from_db()
+            self.assertIn('Wiertło D5', renderuj_zamowienie(self.zamowienie)['html_content'])
+            self.assertEqual(render.call_count, 2)
+
+        # Zmiana dostawcy przesuwa datę modyfikacji zamówień i ich wersję (ETag)
+        wersja = wersje([Zamowienie])
+        self.zamowienie.dostawca.nazwa_firmy = "Nowa nazwa"
+        self.zamowienie.dostawca.save()
+        self.assertNotEqual(wersje([Zamowienie]), wersja)
+
+    def test_pozycje_csv_strumieniowo(self):
+        """Pozycje zamówienia pobierane jako CSV przez StreamingHttpResponse"""
+        response = self.client.get(f'/api/zamowienia/{self.zamowienie.id}/pozycje-csv/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        tresc = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertIn('Frez D10;', tresc)
+        self.assertIn('zamowienie_2025-01-001.csv', response['Content-Disposition'])
+
+    def test_wyslany_email_z_zalacznikiem(self):
+        """Wiadomość z kolejki wysyłana jest z załącznikiem CSV"""
+        WysylkaEmailService.zakolejkuj_zamowienie(self.zamowienie)
+        WysylkaEmailService.przetworz()
+        self.assertEqual(mail.outbox[0].attachments[0][0], 'zamowienie_2025-01-001.csv')
+
 class MagazynViewTestCase(TestCase):
     """Testy dla widoku HTML magazynu"""
 
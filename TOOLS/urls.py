@@ -44,14 +44,34 @@ urlpatterns = [
     path('api/generator-zamowien/', views.generator_zamowien_api, name='generator-zamowien'),
     path('api/generator-zamowien/add/', views.generator_zamowien_add_api, name='generator-zamowien-add'),
     path('api/generator-zamowien/gotowe/', views.generator_zamowien_gotowe_api, name='generator-zamowien-gotowe'),
+    path('api/generator-zamowien/bulk-update/', views.generator_zamowien_bulk_update_api,
+         name='generator-zamowien-bulk-update'),
     path('api/generator-zamowien/<int:narzedzie_id>/update/', views.generator_zamowien_update_api,
          name='generator-zamowien-update'),
     path('api/generator-zamowien/<int:narzedzie_id>/delete/', views.generator_zamowien_delete_api,
          name='generator-zamowien-delete'),
+    path('api/generator-zamowien/<int:narzedzie_id>/ceny/', views.generator_zamowien_ceny_api,
+         name='generator-zamowien-ceny'),
+
+    # Optymalizacja limitów min/max
+    path('api/limity/propozycje/', views.limity_propozycje_api, name='limity-propozycje'),
+    path('api/limity/zastosuj/', views.limity_zastosuj_api, name='limity-zastosuj'),
+
+    # Dane startowe panelu magazynu
+    path('api/magazyn/bootstrap/', views.magazyn_bootstrap_api, name='magazyn-bootstrap'),
+
+    # Zdarzenia czasu rzeczywistego (SSE)
+    path('api/zdarzenia/magazyn/', views.zdarzenia_magazynu_view, name='zdarzenia-magazyn'),
 
     # Email endpoints
     path('api/email/test/', views.test_email_view, name='test_email'),
     path('api/email/config/', views.email_config_view, name='email_config'),
     path('api/zamowienia/<int:zamowienie_id>/wyslij-email/', views.wyslij_email_zamowienie_api,
          name='zamowienia-wyslij-email'),
+    path('api/zamowienia/<int:zamowienie_id>/podglad-email/', views.podglad_email_zamowienie_api,
+         name='zamowienia-podglad-email'),
+    path('api/zamowienia/<int:zamowienie_id>/pozycje-csv/', views.pozycje_csv_zamowienie_api,
+         name='zamowienia-pozycje-csv'),
+    path('api/email/zadania/<int:wiadomosc_id>/', views.status_wiadomosci_email_api, name='email-zadanie-status'),
+    path('api/email/wyslij-zamowienia/', views.wyslij_zamowienia_api, name='email-wyslij-zamowienia'),
 ]
\ No newline at end of file
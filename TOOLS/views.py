@@ -2,12 +2,13 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from datetime import datetime
@@ -16,7 +17,7 @@ from .models import (
     Kategoria, Podkategoria, NarzedzieMagazynowe, EgzemplarzNarzedzia,
     Lokalizacja, Maszyna, HistoriaUzyciaNarzedzia, FakturaZakupu,
     Dostawca, Pracownik, Uszkodzenie, Zamowienie, PozycjaZamowienia,
-    RealizacjaZamowienia, PozycjaRealizacji
+    RealizacjaZamowienia, PozycjaRealizacji, StanMagazynowy
 )
 from .serializers import (
     KategoriaSerializer, PodkategoriaSerializer, NarzedzieMagazynoweSerializer,
@@ -24,9 +25,14 @@ from .serializers import (
     HistoriaUzyciaNarzedziaSerializer, FakturaZakupuSerializer,
     DostawcaSerializer, PracownikSerializer, UszkodzenieSerializer,
     ZamowienieSerializer, PozycjaZamowieniaSerializer,
-    RealizacjaZamowieniaSerializer, PozycjaRealizacjiSerializer
+    RealizacjaZamowieniaSerializer, PozycjaRealizacjiSerializer,
+    ZmianaPozycjiGeneratoraSerializer, ZmianaLimitowSerializer, relacje_zapytania
 )
-from .services import EgzemplarzService, LokalizacjaService
+from .services import (
+    EgzemplarzService, LokalizacjaService, SilnikStanow, GeneratorZamowienService, CenyService,
+    OptymalizatorLimitowService, WysylkaEmailService
+)
+from .wersje import CacheListyMixin, WarunkowyGetMixin
 
 
 # ========== WIDOKI HTML ==========
@@ -175,79 +181,12 @@ def generator_zamowien_api(request):
     Endpoint zwracający listę narzędzi wymagających zamówienia.
     Zwraca:
     1. Wszystkie pozycje z PozycjaGeneratora (ręcznie dodane lub istniejące)
-    2. Automatycznie generuje nowe pozycje dla narzędzi gdzie stan < limit maksymalny
-    """
-    from .models import NarzedzieMagazynowe, EgzemplarzNarzedzia, PozycjaGeneratora, PozycjaZamowienia
-
-    # Najpierw pobierz wszystkie istniejące pozycje z generatora
-    istniejace_pozycje = PozycjaGeneratora.objects.select_related(
-        'narzedzie_typ',
-        'narzedzie_typ__podkategoria',
-        'narzedzie_typ__podkategoria__kategoria',
-        'dostawca'
-    ).all()
-
-    istniejace_narzedzia_ids = set(p.narzedzie_typ.id for p in istniejace_pozycje)
-
-    # Teraz sprawdź czy są narzędzia wymagające zamówienia (nie uwzględnione w PozycjaGeneratora)
-    narzedzia = NarzedzieMagazynowe.objects.select_related(
-        'podkategoria',
-        'podkategoria__kategoria',
-        'ostatni_dostawca'
-    ).prefetch_related('egzemplarze').all()
-
-    for narzedzie in narzedzia:
-        # Pomiń jeśli już jest w PozycjaGeneratora
-        if narzedzie.id in istniejace_narzedzia_ids:
-            continue
-
-        # Oblicz aktualny stan
-        calkowita_ilosc = narzedzie.egzemplarze.exclude(
-            stan='uszkodzone'
-        ).exclude(
-            stan='uszkodzone_regeneracja'
-        ).count()
-
-        stan_maksymalny = narzedzie.stan_maksymalny if narzedzie.stan_maksymalny else 10
-
-        # Sprawdź czy wymaga zamówienia
-        if calkowita_ilosc < stan_maksymalny:
-            ilosc_brakujacych_sztuk = stan_maksymalny - calkowita_ilosc
-
-            # Przelicz na komplety jeśli potrzeba
-            if narzedzie.opakowanie == 'kompl' and narzedzie.ilosc_w_opakowaniu > 0:
-                import math
-                ilosc_do_zamowienia = math.ceil(ilosc_brakujacych_sztuk / narzedzie.ilosc_w_opakowaniu)
-            else:
-                ilosc_do_zamowienia = ilosc_brakujacych_sztuk
-
-            # Pobierz cenę z ostatniej pozycji zamówienia
-            cena_jednostkowa = 0
-            if narzedzie.ostatni_dostawca:
-                ostatnia_pozycja = PozycjaZamowienia.objects.filter(
-                    narzedzie_typ=narzedzie,
-                    zamowienie__dostawca=narzedzie.ostatni_dostawca,
-                    cena_jednostkowa__isnull=False
-                ).order_by('-zamowienie__data_utworzenia').first()
-
-                if ostatnia_pozycja and ostatnia_pozycja.cena_jednostkowa:
-                    cena_jednostkowa = ostatnia_pozycja.cena_jednostkowa
-
-            # Utwórz pozycję generatora
-            PozycjaGeneratora.objects.create(
-                narzedzie_typ=narzedzie,
-                dostawca=narzedzie.ostatni_dostawca,
-                ilosc_do_zamowienia=ilosc_do_zamowienia,
-                cena_jednostkowa=cena_jednostkowa
-            )
-
-    # Teraz pobierz WSZYSTKIE pozycje z generatora (włącznie z nowo utworzonymi)
-    wszystkie_pozycje = PozycjaGeneratora.objects.select_related(
-        'narzedzie_typ',
-        'narzedzie_typ__podkategoria',
-        'narzedzie_typ__podkategoria__kategoria',
-        'dostawca'
-    ).all()
+    2. Automatycznie generuje nowe pozycje dla narzędzi gdzie stan + w drodze jest poniżej
+       limitu maksymalnego lub prognozowanego zapotrzebowania (PrognozaZuzycia)
+    """
+    # Istniejące pozycje + nowe pozycje dla braków (stała liczba zapytań)
+    wszystkie_pozycje = GeneratorZamowienService.generuj_pozycje()
+    najtansi = CenyService.najtansi_dostawcy([p.narzedzie_typ_id for p in wszystkie_pozycje])
 
     wynik = []
 
@@ -272,6 +211,10 @@ def generator_zamowien_api(request):
             dostawca_nazwa = pozycja.dostawca.nazwa_firmy
             dostawca_id = pozycja.dostawca.id
 
+        najtanszy = najtansi.get(narzedzie.id)
+        stan = getattr(narzedzie, 'stan_magazynowy', None)
+        prognoza = getattr(narzedzie, 'prognoza', None)
+
         wynik.append({
             'id': narzedzie.id,
             'dostawca_nazwa': dostawca_nazwa,
@@ -279,8 +222,14 @@ def generator_zamowien_api(request):
             'element': element,
             'numer_katalogowy': narzedzie.numer_katalogowy or '',
             'ilosc_do_zamowienia': pozycja.ilosc_do_zamowienia,
+            'ilosc_w_drodze': stan.ilosc_w_drodze if stan else 0,
+            'zapotrzebowanie_prognoza': prognoza.zapotrzebowanie if prognoza else None,
+            'czas_dostawy_dni': prognoza.czas_dostawy_dni if prognoza else None,
             'rodzaj': rodzaj,
             'cena_jednostkowa': float(pozycja.cena_jednostkowa) if pozycja.cena_jednostkowa else 0,
+            'najtanszy_dostawca_id': najtanszy['dostawca_id'] if najtanszy else None,
+            'najtanszy_dostawca_nazwa': najtanszy['dostawca_nazwa'] if najtanszy else '',
+            'najtansza_cena': float(najtanszy['cena_jednostkowa']) if najtanszy else None,
             # Dane do sortowania
             'kategoria': narzedzie.podkategoria.kategoria.nazwa if narzedzie.podkategoria else '',
             'podkategoria': narzedzie.podkategoria.nazwa if narzedzie.podkategoria else '',
@@ -293,62 +242,62 @@ def generator_zamowien_api(request):
     return Response(wynik)
 
 
+def _opis_bledow_walidacji(errors):
+    """Spłaszcza błędy serializera do jednego komunikatu."""
+    return '; '.join(f"{pole}: {' '.join(str(k) for k in komunikaty)}" for pole, komunikaty in errors.items())
+
+
 @api_view(['PATCH'])
 def generator_zamowien_update_api(request, narzedzie_id):
     """
     Endpoint do aktualizacji pozycji w generatorze zamówień.
     Pozwala edytować: dostawca_id, numer_katalogowy, ilosc_do_zamowienia, cena_jednostkowa
     """
-    from .models import NarzedzieMagazynowe, Dostawca, PozycjaGeneratora
+    serializer = ZmianaPozycjiGeneratoraSerializer(data={**request.data, 'id': narzedzie_id})
+    if not serializer.is_valid():
+        return Response({'error': _opis_bledow_walidacji(serializer.errors)}, status=400)
 
-    try:
-        narzedzie = NarzedzieMagazynowe.objects.get(id=narzedzie_id)
-    except NarzedzieMagazynowe.DoesNotExist:
-        return Response({'error': 'Narzędzie nie istnieje'}, status=404)
+    _, bledy = GeneratorZamowienService.aktualizuj_pozycje([serializer.validated_data])
+    if bledy:
+        blad = bledy[0]['error']
+        return Response({'error': blad}, status=404 if blad == 'Narzędzie nie istnieje' else 400)
 
-    # Pobierz lub utwórz pozycję generatora
-    try:
-        pozycja = PozycjaGeneratora.objects.get(narzedzie_typ=narzedzie)
-    except PozycjaGeneratora.DoesNotExist:
-        pozycja = PozycjaGeneratora.objects.create(
-            narzedzie_typ=narzedzie,
-            dostawca=narzedzie.ostatni_dostawca,
-            ilosc_do_zamowienia=0,
-            cena_jednostkowa=0
-        )
-
-    # Aktualizuj dostawcę
-    if 'dostawca_id' in request.data:
-        dostawca_id = request.data['dostawca_id']
-        if dostawca_id:
-            try:
-                dostawca = Dostawca.objects.get(id=dostawca_id)
-                pozycja.dostawca = dostawca
-                # Również zaktualizuj ostatni_dostawca w narzędziu
-                narzedzie.ostatni_dostawca = dostawca
-                narzedzie.save()
-            except Dostawca.DoesNotExist:
-                return Response({'error': 'Dostawca nie istnieje'}, status=400)
-        else:
-            pozycja.dostawca = None
-
-    # Aktualizuj numer katalogowy w narzędziu
-    if 'numer_katalogowy' in request.data:
-        narzedzie.numer_katalogowy = request.data['numer_katalogowy']
-        narzedzie.save()
+    return Response({'success': True, 'message': 'Zaktualizowano pomyślnie'})
 
-    # Aktualizuj ilość do zamówienia
-    if 'ilosc_do_zamowienia' in request.data:
-        pozycja.ilosc_do_zamowienia = request.data['ilosc_do_zamowienia']
 
-    # Aktualizuj cenę jednostkową
-    if 'cena_jednostkowa' in request.data:
-        cena = request.data['cena_jednostkowa']
-        pozycja.cena_jednostkowa = cena if cena is not None else 0
+@api_view(['PATCH'])
+def generator_zamowien_bulk_update_api(request):
+    """
+    Endpoint do zbiorczej edycji pozycji generatora.
+    Przyjmuje listę zmian (lub {"pozycje": [...]}) w formacie endpointu update
+    z dodatkowym polem 'id' (ID narzędzia). Poprawne wiersze są zapisywane
+    w jednej transakcji, błędne zwracane w liście 'bledy'.
+    """
+    zmiany = request.data.get('pozycje') if isinstance(request.data, dict) else request.data
+    if not isinstance(zmiany, list):
+        return Response({'error': 'Oczekiwano listy zmian'}, status=400)
+
+    poprawne = []
+    bledy = []
+    for zmiana in zmiany:
+        serializer = ZmianaPozycjiGeneratoraSerializer(data=zmiana)
+        if serializer.is_valid():
+            poprawne.append(serializer.validated_data)
+        else:
+            bledy.append({
+                'id': zmiana.get('id') if isinstance(zmiana, dict) else None,
+                'error': _opis_bledow_walidacji(serializer.errors)
+            })
 
-    pozycja.save()
+    zaktualizowane = []
+    if poprawne:
+        zaktualizowane, bledy_zapisu = GeneratorZamowienService.aktualizuj_pozycje(poprawne)
+        bledy.extend(bledy_zapisu)
 
-    return Response({'success': True, 'message': 'Zaktualizowano pomyślnie'})
+    return Response(
+        {'success': not bledy, 'zaktualizowane': zaktualizowane, 'bledy': bledy},
+        status=400 if bledy and not zaktualizowane else 200
+    )
 
 
 @api_view(['DELETE'])
@@ -367,19 +316,45 @@ def generator_zamowien_delete_api(request, narzedzie_id):
     # Usuń pozycję generatora
     PozycjaGeneratora.objects.filter(narzedzie_typ=narzedzie).delete()
 
-    # Ustaw stan_maksymalny równy aktualnemu stanowi
-    calkowita_ilosc = narzedzie.egzemplarze.exclude(
-        stan='uszkodzone'
-    ).exclude(
-        stan='uszkodzone_regeneracja'
-    ).count()
-
-    narzedzie.stan_maksymalny = calkowita_ilosc
-    narzedzie.save()
+    # Ustaw stan_maksymalny równy aktualnemu stanowi (w sztukach)
+    narzedzie.stan_maksymalny = SilnikStanow.dla_narzedzia(narzedzie.id)['dostepne_szt']
+    narzedzie.save(update_fields=['stan_maksymalny', 'data_modyfikacji'])
 
     return Response({'success': True, 'message': 'Usunięto z listy zamówień'})
 
 
+@api_view(['GET'])
+def generator_zamowien_ceny_api(request, narzedzie_id):
+    """
+    Endpoint zwracający ceny narzędzia dla generatora:
+    aktualne ceny u każdego dostawcy, najtańszego dostawcę i historię cen.
+    Opcjonalny parametr ?dostawca=<id> zawęża historię do jednego dostawcy.
+    """
+    from django.db.models import F
+    from .models import NarzedzieMagazynowe, AktualnaCena
+
+    if not NarzedzieMagazynowe.objects.filter(id=narzedzie_id).exists():
+        return Response({'error': 'Narzędzie nie istnieje'}, status=404)
+
+    dostawca_id = request.query_params.get('dostawca')
+    if dostawca_id is not None and not dostawca_id.isdigit():
+        return Response({'error': 'Parametr dostawca musi być liczbą całkowitą'}, status=400)
+
+    aktualne = AktualnaCena.objects.filter(narzedzie_typ_id=narzedzie_id).order_by(
+        'cena_jednostkowa'
+    ).values('dostawca_id', 'cena_jednostkowa', 'data_ceny', dostawca_nazwa=F('dostawca__nazwa_firmy'))
+
+    trend = CenyService.trend_cen(narzedzie_id, dostawca_id=int(dostawca_id) if dostawca_id else None)
+
+    aktualne = [dict(c, cena_jednostkowa=float(c['cena_jednostkowa'])) for c in aktualne]
+
+    return Response({
+        'aktualne': aktualne,
+        'najtanszy': aktualne[0] if aktualne else None,
+        'trend': [dict(w, cena_jednostkowa=float(w['cena_jednostkowa'])) for w in trend],
+    })
+
+
 @api_view(['POST'])
 def generator_zamowien_add_api(request):
     """
@@ -431,131 +406,96 @@ def generator_zamowien_gotowe_api(request):
     Grupuje pozycje według dostawcy i tworzy osobne zamówienia.
     Czyści tabelę PozycjaGeneratora po utworzeniu zamówień.
     """
-    from .models import PozycjaGeneratora, Zamowienie, PozycjaZamowienia, Dostawca
-    from django.utils import timezone
-    from django.db import transaction
-    from decimal import Decimal
+    from django.core.exceptions import ValidationError
 
     try:
-        with transaction.atomic():
-            # Pobierz wszystkie pozycje z generatora
-            pozycje_generatora = PozycjaGeneratora.objects.select_related(
-                'narzedzie_typ',
-                'narzedzie_typ__podkategoria',
-                'narzedzie_typ__podkategoria__kategoria',
-                'dostawca'
-            ).all()
-
-            if not pozycje_generatora.exists():
-                return Response({'error': 'Brak pozycji w generatorze'}, status=400)
-
-            # Grupuj według dostawcy
-            from collections import defaultdict
-            grouped = defaultdict(list)
-
-            for pozycja in pozycje_generatora:
-                dostawca_id = pozycja.dostawca.id if pozycja.dostawca else None
-                grouped[dostawca_id].append(pozycja)
-
-            utworzone_zamowienia = []
-            now = timezone.now()
-            rok_miesiac = now.strftime('%Y/%m')
-
-            # Dla każdego dostawcy utwórz zamówienie
-            for dostawca_id, pozycje in grouped.items():
-                if dostawca_id is None:
-                    # Pomiń pozycje bez dostawcy
-                    continue
-
-                dostawca = Dostawca.objects.get(id=dostawca_id)
-
-                # Generuj numer zamówienia: RRRR/MM/nr_kolejny
-                ostatnie_zamowienie = Zamowienie.objects.filter(
-                    numer__startswith=rok_miesiac
-                ).order_by('-numer').first()
-
-                if ostatnie_zamowienie:
-                    ostatni_nr = int(ostatnie_zamowienie.numer.split('/')[-1])
-                    nowy_nr = ostatni_nr + 1
-                else:
-                    nowy_nr = 1
-
-                numer_zamowienia = f"{rok_miesiac}/{nowy_nr:03d}"
-
-                # Oblicz wartość zamówienia
-                wartosc_zamowienia = Decimal('0.00')
-                for poz in pozycje:
-                    cena = poz.cena_jednostkowa if poz.cena_jednostkowa else Decimal('0.00')
-                    wartosc_zamowienia += cena * poz.ilosc_do_zamowienia
-
-                # Utwórz zamówienie
-                zamowienie = Zamowienie.objects.create(
-                    numer=numer_zamowienia,
-                    dostawca=dostawca,
-                    email_docelowy=dostawca.email or '',
-                    data_utworzenia=now,
-                    wartosc_zamowienia=wartosc_zamowienia,
-                    status='draft'
-                )
+        zamowienia = GeneratorZamowienService.utworz_zamowienia()
+    except ValidationError as e:
+        return Response({'error': e.messages[0]}, status=400)
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+    utworzone_zamowienia = [
+        {
+            'id': zamowienie.id,
+            'numer': zamowienie.numer,
+            'dostawca': zamowienie.dostawca.nazwa_firmy
+        }
+        for zamowienie in zamowienia
+    ]
+
+    return Response({
+        'success': True,
+        'message': f'Utworzono {len(utworzone_zamowienia)} zamówień',
+        'zamowienia': utworzone_zamowienia
+    })
 
-                # Utwórz pozycje zamówienia
-                for pozycja_gen in pozycje:
-                    narzedzie = pozycja_gen.narzedzie_typ
-
-                    # Spłaszcz dane
-                    kategoria_nazwa = ''
-                    podkategoria_nazwa = ''
-                    if narzedzie.podkategoria:
-                        kategoria_nazwa = narzedzie.podkategoria.kategoria.nazwa
-                        podkategoria_nazwa = narzedzie.podkategoria.nazwa
-
-                    cena = pozycja_gen.cena_jednostkowa if pozycja_gen.cena_jednostkowa else Decimal('0.00')
-                    wartosc_poz = cena * pozycja_gen.ilosc_do_zamowienia
-
-                    PozycjaZamowienia.objects.create(
-                        zamowienie=zamowienie,
-                        narzedzie_typ=narzedzie,
-                        kategoria_nazwa=kategoria_nazwa,
-                        podkategoria_nazwa=podkategoria_nazwa,
-                        narzedzie_opis=narzedzie.opis,
-                        numer_katalogowy=narzedzie.numer_katalogowy or '',
-                        ilosc_zamowiona=pozycja_gen.ilosc_do_zamowienia,
-                        jednostka=narzedzie.opakowanie,
-                        ilosc_w_komplecie=narzedzie.ilosc_w_opakowaniu,
-                        cena_jednostkowa=cena,
-                        wartosc_pozycji=wartosc_poz
-                    )
-
-                utworzone_zamowienia.append({
-                    'id': zamowienie.id,
-                    'numer': zamowienie.numer,
-                    'dostawca': dostawca.nazwa_firmy
-                })
-
-            # Wyczyść tabelę PozycjaGeneratora
-            PozycjaGeneratora.objects.all().delete()
-
-            return Response({
-                'success': True,
-                'message': f'Utworzono {len(utworzone_zamowienia)} zamówień',
-                'zamowienia': utworzone_zamowienia
+
+@api_view(['GET'])
+def limity_propozycje_api(request):
+    """
+    Endpoint zwracający propozycje limitów min/max (tryb optymalizatora).
+    Historia wydań i uszkodzeń odtwarzana jest dla każdego narzędzia z ruchem;
+    zwracane są tylko narzędzia, dla których propozycja różni się od obecnych limitów.
+    Opcjonalny parametr ?dni=<n> - długość analizowanej historii.
+    """
+    dni = request.query_params.get('dni')
+    if dni is not None and (not dni.isdigit() or int(dni) <= 0):
+        return Response({'error': 'Parametr dni musi być dodatnią liczbą całkowitą'}, status=400)
+
+    propozycje = OptymalizatorLimitowService.propozycje(okres_dni=int(dni) if dni else None)
+    return Response(propozycje)
+
+
+@api_view(['POST'])
+def limity_zastosuj_api(request):
+    """
+    Endpoint zapisujący zatwierdzone limity min/max.
+    Przyjmuje listę (lub {"zmiany": [...]}) elementów {id, stan_minimalny, stan_maksymalny}.
+    Poprawne wiersze zapisywane są jednym bulk_update, błędne zwracane w liście 'bledy'.
+    """
+    zmiany = request.data.get('zmiany') if isinstance(request.data, dict) else request.data
+    if not isinstance(zmiany, list):
+        return Response({'error': 'Oczekiwano listy zmian'}, status=400)
+
+    poprawne = []
+    bledy = []
+    for zmiana in zmiany:
+        serializer = ZmianaLimitowSerializer(data=zmiana)
+        if serializer.is_valid():
+            poprawne.append(serializer.validated_data)
+        else:
+            bledy.append({
+                'id': zmiana.get('id') if isinstance(zmiana, dict) else None,
+                'error': _opis_bledow_walidacji(serializer.errors)
             })
 
-    except Exception as e:
-        return Response({'error': str(e)}, status=500)
+    zastosowane = []
+    if poprawne:
+        zastosowane, bledy_zapisu = OptymalizatorLimitowService.zastosuj(poprawne)
+        bledy.extend(bledy_zapisu)
+
+    return Response(
+        {'success': not bledy, 'zastosowane': zastosowane, 'bledy': bledy},
+        status=400 if bledy and not zastosowane else 200
+    )
 
 
 @api_view(['POST'])
 def wyslij_email_zamowienie_api(request, zamowienie_id):
     """
     Endpoint do wysyłki emaila z zamówieniem do dostawcy (+ kopia DW).
+
+    Wiadomość trafia do kolejki (WiadomoscEmail) i jest wysyłana przez
+    komendę wyslij_emaile - odpowiedź 202 zawiera identyfikator zadania,
+    którego stan zwraca status_wiadomosci_email_api. Status zamówienia
+    zmienia się na 'sent' dopiero po udanej wysyłce.
     """
     from .models import Zamowienie
-    from .utils import send_zamowienie_email
-    from django.utils import timezone
+    from django.conf import settings
 
     try:
-        zamowienie = Zamowienie.objects.select_related('dostawca').prefetch_related('pozycje').get(id=zamowienie_id)
+        zamowienie = Zamowienie.objects.get(id=zamowienie_id)
     except Zamowienie.DoesNotExist:
         return Response({'error': 'Zamówienie nie istnieje'}, status=404)
 
@@ -563,23 +503,134 @@ def wyslij_email_zamowienie_api(request, zamowienie_id):
     if not zamowienie.email_docelowy:
         return Response({'error': 'Dostawca nie ma przypisanego adresu email'}, status=400)
 
-    # Wyślij email
-    result = send_zamowienie_email(zamowienie)
+    if not settings.EMAIL_HOST_USER:
+        return Response({'error': 'Brak konfiguracji konta email w settings.py'}, status=500)
 
-    if result['success']:
-        # Zaktualizuj status i datę wysłania
-        zamowienie.status = 'sent'
-        zamowienie.data_wyslania = timezone.now()
-        zamowienie.save()
+    wiadomosc, utworzono = WysylkaEmailService.zakolejkuj_zamowienie(zamowienie)
 
-        return Response({
-            'success': True,
-            'message': result['message']
-        })
+    return Response({
+        'success': True,
+        'job_id': wiadomosc.id,
+        'status': wiadomosc.status,
+        'message': (
+            f'Email do {wiadomosc.odbiorca} dodany do kolejki wysyłki.' if utworzono
+            else f'Email do {wiadomosc.odbiorca} oczekuje już w kolejce wysyłki.'
+        )
+    }, status=202)
+
+
+@api_view(['GET'])
+def podglad_email_zamowienie_api(request, zamowienie_id):
+    """
+    Podgląd emaila z zamówieniem (HTML) - ta sama, zapisana w cache treść,
+    która trafia do dostawcy.
+    """
+    from .models import Zamowienie
+    from .utils import renderuj_zamowienie
+    from django.http import HttpResponse
+
+    try:
+        zamowienie = Zamowienie.objects.select_related('dostawca').prefetch_related('pozycje').get(id=zamowienie_id)
+    except Zamowienie.DoesNotExist:
+        return Response({'error': 'Zamówienie nie istnieje'}, status=404)
+
+    return HttpResponse(renderuj_zamowienie(zamowienie)['html_content'])
+
+
+@api_view(['GET'])
+def pozycje_csv_zamowienie_api(request, zamowienie_id):
+    """Pozycje zamówienia jako plik CSV, wysyłany strumieniowo wiersz po wierszu."""
+    from .models import Zamowienie
+    from .utils import wiersze_csv_zamowienia, nazwa_pliku_csv_zamowienia
+    from django.http import StreamingHttpResponse
+
+    try:
+        zamowienie = Zamowienie.objects.prefetch_related('pozycje').get(id=zamowienie_id)
+    except Zamowienie.DoesNotExist:
+        return Response({'error': 'Zamówienie nie istnieje'}, status=404)
+
+    response = StreamingHttpResponse(wiersze_csv_zamowienia(zamowienie), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nazwa_pliku_csv_zamowienia(zamowienie)}"'
+    return response
+
+
+@api_view(['POST'])
+def wyslij_zamowienia_api(request):
+    """
+    Wysyła od razu wszystkie zamówienia robocze jedną sesją SMTP.
+
+    Opcjonalnie w body: {"watki": n} - liczba równoległych połączeń
+    (najwyżej WysylkaEmailService.MAKS_WATKOW). Zwraca wynik per zamówienie;
+    nieudane wysyłki zostają w kolejce do ponowienia.
+    """
+    from django.conf import settings
+
+    if not settings.EMAIL_HOST_USER:
+        return Response({'error': 'Brak konfiguracji konta email w settings.py'}, status=500)
+
+    try:
+        watki = int(request.data.get('watki', 1))
+    except (TypeError, ValueError):
+        return Response({'error': 'Liczba wątków musi być liczbą całkowitą'}, status=400)
+
+    wyniki = WysylkaEmailService.wyslij_zamowienia(watki=watki)
+    wyslane = sum(1 for wynik in wyniki if wynik['status'] == 'wyslane')
+
+    return Response({
+        'success': wyslane == len(wyniki),
+        'wyslane': wyslane,
+        'bledy': len(wyniki) - wyslane,
+        'wyniki': wyniki,
+        'message': f'Wysłano {wyslane} z {len(wyniki)} zamówień.' if wyniki else 'Brak zamówień roboczych do wysłania.'
+    })
+
+
+@api_view(['GET'])
+def status_wiadomosci_email_api(request, wiadomosc_id):
+    """Stan wiadomości z kolejki email (zadania zwróconego przez wyslij_email_zamowienie_api)."""
+    from .models import WiadomoscEmail
+
+    try:
+        wiadomosc = WiadomoscEmail.objects.select_related('zamowienie').get(id=wiadomosc_id)
+    except WiadomoscEmail.DoesNotExist:
+        return Response({'error': 'Wiadomość nie istnieje'}, status=404)
+
+    return Response({
+        'job_id': wiadomosc.id,
+        'status': wiadomosc.status,
+        'status_display': wiadomosc.get_status_display(),
+        'odbiorca': wiadomosc.odbiorca,
+        'liczba_prob': wiadomosc.liczba_prob,
+        'nastepna_proba': wiadomosc.nastepna_proba if wiadomosc.status == 'oczekuje' else None,
+        'ostatni_blad': wiadomosc.ostatni_blad,
+        'data_utworzenia': wiadomosc.data_utworzenia,
+        'data_wyslania': wiadomosc.data_wyslania,
+        'zamowienie_id': wiadomosc.zamowienie_id,
+        'zamowienie_status': wiadomosc.zamowienie.status if wiadomosc.zamowienie else None,
+    })
+
+
+@api_view(['GET'])
+def magazyn_bootstrap_api(request):
+    """
+    Dane startowe panelu magazynu w jednym zapytaniu: narzędzia ze stanami,
+    wypożyczenia w użyciu i listy wyboru w lekkich kształtach.
+
+    ETag to wersja danych - przy If-None-Match z tą samą wersją zwracane
+    jest 304 bez treści.
+    """
+    from .services import PanelMagazynuService
+
+    dane = PanelMagazynuService.dane_startowe()
+    etag = f'"{dane["wersja"]}"'
+
+    if request.headers.get('If-None-Match') == etag:
+        response = Response(status=304)
     else:
-        return Response({
-            'error': result['message']
-        }, status=500)
+        response = Response(dane)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 # ========== EMAIL API ==========
@@ -618,32 +669,193 @@ def email_config_view(request):
     return JsonResponse(config)
 
 
+# ========== ZDARZENIA (SSE) ==========
+
+@login_required
+@require_http_methods(["GET"])
+def zdarzenia_magazynu_view(request):
+    """
+    Strumień zdarzeń stanów magazynowych i wypożyczeń (server-sent events).
+
+    Pod ASGI zwraca asynchroniczny generator (klient nie zajmuje wątku),
+    pod WSGI (runserver) - zwykły generator.
+    """
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import StreamingHttpResponse
+    from .zdarzenia import strumien_sse, astrumien_sse
+
+    strumien = astrumien_sse() if isinstance(request, ASGIRequest) else strumien_sse()
+    response = StreamingHttpResponse(strumien, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # ========== API VIEWSETS ==========
 
+# Modele, z których czytają serializery (razem z zagnieżdżonymi) - ich wersje
+# wyznaczają ETag / Last-Modified i klucz cache list (wersje.py)
+MODELE_NARZEDZIA = (NarzedzieMagazynowe, StanMagazynowy, Podkategoria, Kategoria, Dostawca, Lokalizacja)
+MODELE_FAKTURY = (FakturaZakupu, Dostawca)
+# Aktywne wypożyczenie egzemplarza zmienia się razem z historią
+MODELE_EGZEMPLARZA = MODELE_NARZEDZIA + (EgzemplarzNarzedzia, FakturaZakupu, HistoriaUzyciaNarzedzia)
+MODELE_HISTORII = MODELE_EGZEMPLARZA + (Maszyna, Pracownik)
+MODELE_USZKODZENIA = MODELE_HISTORII + (Uszkodzenie,)
+MODELE_ZAMOWIENIA = MODELE_NARZEDZIA + (Zamowienie, PozycjaZamowienia)
+MODELE_REALIZACJI = MODELE_ZAMOWIENIA + (RealizacjaZamowienia, PozycjaRealizacji)
+
+
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 100
     page_size_query_param = 'page_size'
     max_page_size = 1000
 
 
-class KategoriaViewSet(viewsets.ModelViewSet):
-    queryset = Kategoria.objects.prefetch_related('podkategorie').all()
+class KursorPagination(BasePagination):
+    """
+    Stronicowanie kursorem (keyset) w kolejności widoku (atrybut ordering,
+    np. ('-data_wydania', '-id')).
+
+    Kursor to wartości pól kolejności ostatniego wiersza strony - kolejna
+    strona jest warunkiem (data, id) < (ostatnia data, ostatnie id) na
+    indeksie o tej samej kolejności zamiast OFFSET, więc strona N kosztuje
+    tyle co pierwsza, także przy wielu wierszach z tą samą datą. Odpowiedź:
+    {'next': adres kolejnej strony lub null, 'results': [...]}.
+
+    NULL w polu kolejności jest większy od każdej wartości (jak domyślnie
+    w PostgreSQL - zgodnie z indeksem), także na SQLite.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        from django.core.exceptions import ValidationError
+        from django.db.models import F
+        from rest_framework.exceptions import NotFound
+
+        self.request = request
+        self.ordering = tuple(view.ordering)
+        rozmiar = self.get_page_size(request)
+        queryset = queryset.order_by(*[
+            F(pole[1:]).desc(nulls_first=True) if pole.startswith('-') else F(pole).asc(nulls_last=True)
+            for pole in self.ordering
+        ])
+
+        kursor = request.query_params.get(self.cursor_query_param)
+        if kursor:
+            try:
+                queryset = queryset.filter(self._za_kursorem(queryset.model, kursor))
+            except (ValueError, TypeError, ValidationError):
+                raise NotFound('Nieprawidłowy kursor.')
+
+        wiersze = list(queryset[:rozmiar + 1])
+        self.nastepny = self._kursor(wiersze[rozmiar - 1]) if len(wiersze) > rozmiar else None
+        return wiersze[:rozmiar]
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_next_link(self):
+        from rest_framework.utils.urls import replace_query_param
+
+        if self.nastepny is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.nastepny)
+
+    def get_page_size(self, request):
+        try:
+            rozmiar = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(rozmiar, self.max_page_size) if rozmiar > 0 else self.page_size
+
+    def _kursor(self, obiekt):
+        import base64
+        import json
+
+        wartosci = [getattr(obiekt, pole.lstrip('-')) for pole in self.ordering]
+        wartosci = [None if wartosc is None else str(wartosc) for wartosc in wartosci]
+        return base64.urlsafe_b64encode(json.dumps(wartosci).encode()).decode()
+
+    def _za_kursorem(self, model, kursor):
+        """Warunek na wiersze po kursorze w porządku leksykograficznym pól kolejności."""
+        import base64
+        import json
+
+        wartosci = json.loads(base64.urlsafe_b64decode(kursor.encode()))
+        if not isinstance(wartosci, list) or len(wartosci) != len(self.ordering):
+            raise ValueError(kursor)
+
+        pola = [(pole.lstrip('-'), 'lt' if pole.startswith('-') else 'gt') for pole in self.ordering]
+        wartosci = [
+            None if wartosc is None else model._meta.get_field(nazwa).to_python(wartosc)
+            for (nazwa, _), wartosc in zip(pola, wartosci)
+        ]
+
+        def dalej(nazwa, kierunek, wartosc):
+            # NULL jest największy: malejąco po NULL są wszystkie wartości,
+            # rosnąco po wartości są jeszcze NULL, a po NULL - nic
+            if wartosc is None:
+                return Q(**{f'{nazwa}__isnull': False}) if kierunek == 'lt' else Q(pk__in=[])
+            if kierunek == 'lt' or not model._meta.get_field(nazwa).null:
+                return Q(**{f'{nazwa}__{kierunek}': wartosc})
+            return Q(**{f'{nazwa}__gt': wartosc}) | Q(**{f'{nazwa}__isnull': True})
+
+        def rowne(nazwa, wartosc):
+            return Q(**{f'{nazwa}__isnull': True}) if wartosc is None else Q(**{nazwa: wartosc})
+
+        warunek = None
+        for (nazwa, kierunek), wartosc in reversed(list(zip(pola, wartosci))):
+            krok = dalej(nazwa, kierunek, wartosc)
+            warunek = krok if warunek is None else krok | (rowne(nazwa, wartosc) & warunek)
+
+        # Granica na pierwszej kolumnie - zakres skanu indeksu (bez NULL po obu stronach)
+        nazwa, kierunek = pola[0]
+        if wartosci[0] is not None and (kierunek == 'lt' or not model._meta.get_field(nazwa).null):
+            warunek &= Q(**{f'{nazwa}__{kierunek}e': wartosci[0]})
+        return warunek
+
+
+class RelacjeSerializeraMixin:
+    """
+    select_related / prefetch_related dobrane do pól serializera (?expand=,
+    ?fields=) - węższa odpowiedź oznacza mniej złączeń w zapytaniu.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        select_related, prefetch_related = relacje_zapytania(self.get_serializer())
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+
+class KategoriaViewSet(WarunkowyGetMixin, CacheListyMixin, RelacjeSerializeraMixin, viewsets.ModelViewSet):
+    queryset = Kategoria.objects.all()
     serializer_class = KategoriaSerializer
+    modele_zrodlowe = (Kategoria, Podkategoria)
 
 
-class PodkategoriaViewSet(viewsets.ModelViewSet):
-    queryset = Podkategoria.objects.select_related('kategoria').all()
+class PodkategoriaViewSet(WarunkowyGetMixin, CacheListyMixin, RelacjeSerializeraMixin, viewsets.ModelViewSet):
+    queryset = Podkategoria.objects.all()
     serializer_class = PodkategoriaSerializer
+    modele_zrodlowe = (Podkategoria, Kategoria)
 
 
-class DostawcaViewSet(viewsets.ModelViewSet):
+class DostawcaViewSet(WarunkowyGetMixin, CacheListyMixin, viewsets.ModelViewSet):
     queryset = Dostawca.objects.all()
     serializer_class = DostawcaSerializer
+    modele_zrodlowe = (Dostawca,)
 
 
-class LokalizacjaViewSet(viewsets.ModelViewSet):
+class LokalizacjaViewSet(WarunkowyGetMixin, CacheListyMixin, viewsets.ModelViewSet):
     queryset = Lokalizacja.objects.all()
     serializer_class = LokalizacjaSerializer
+    modele_zrodlowe = (Lokalizacja,)
 
     @action(detail=False, methods=['post'])
     def dodaj_seryjnie(self, request):
@@ -671,20 +883,23 @@ class LokalizacjaViewSet(viewsets.ModelViewSet):
             )
 
 
-class MaszynaViewSet(viewsets.ModelViewSet):
+class MaszynaViewSet(WarunkowyGetMixin, CacheListyMixin, viewsets.ModelViewSet):
     queryset = Maszyna.objects.all()
     serializer_class = MaszynaSerializer
+    modele_zrodlowe = (Maszyna,)
 
 
-class PracownikViewSet(viewsets.ModelViewSet):
+class PracownikViewSet(WarunkowyGetMixin, CacheListyMixin, viewsets.ModelViewSet):
     queryset = Pracownik.objects.all()
     serializer_class = PracownikSerializer
     pagination_class = StandardResultsSetPagination
+    modele_zrodlowe = (Pracownik,)
 
 
-class FakturaZakupuViewSet(viewsets.ModelViewSet):
-    queryset = FakturaZakupu.objects.select_related('dostawca').all()
+class FakturaZakupuViewSet(WarunkowyGetMixin, RelacjeSerializeraMixin, viewsets.ModelViewSet):
+    queryset = FakturaZakupu.objects.all()
     serializer_class = FakturaZakupuSerializer
+    modele_zrodlowe = MODELE_FAKTURY
     pagination_class = StandardResultsSetPagination
 
     def get_queryset(self):
@@ -699,107 +914,118 @@ class FakturaZakupuViewSet(viewsets.ModelViewSet):
         return queryset.order_by('-data_wystawienia')
 
 
-class NarzedzieMagazynoweViewSet(viewsets.ModelViewSet):
-    serializer_class = NarzedzieMagazynoweSerializer
+class SynchronizacjaPrzyrostowaMixin:
+    """
+    Lista z synchronizacją przyrostową.
+
+    Pełna lista zwraca w nagłówku X-Sync-Token token do kolejnego
+    zapytania. Z parametrem ?since=<token> zwracane są tylko wiersze
+    zmienione od tokenu ('zmienione') oraz ID wierszy usuniętych lub
+    takich, które po zmianie wypadły z filtra ('usuniete'), np. zwrócone
+    wypożyczenie przy ?w_uzyciu=true. Przeterminowany token daje pełną
+    listę z 'pelna': true.
+    """
+
+    # Klucz UsunietyObiekt.typ
+    typ_obiektu = None
+    # Pola dat, których zmiana oznacza zmianę wiersza
+    pola_zmian = ['data_modyfikacji']
+
+    def list(self, request, *args, **kwargs):
+        from django.core.exceptions import ValidationError
+        from .services import SledzenieZmianService
+
+        teraz = timezone.now()
+        token = SledzenieZmianService.token(teraz)
+        since = request.query_params.get('since')
+
+        if since is None:
+            response = super().list(request, *args, **kwargs)
+            response['X-Sync-Token'] = token
+            return response
+
+        try:
+            od = SledzenieZmianService.odczytaj_token(since, teraz)
+        except ValidationError as e:
+            return Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if od is None:
+            zmienione, usuniete = list(queryset), set()
+        else:
+            zmiana = Q()
+            for pole in self.pola_zmian:
+                zmiana |= Q(**{f'{pole}__gte': od})
+            zmienione = list(queryset.filter(zmiana))
+            obecne = {obiekt.id for obiekt in zmienione}
+            usuniete = SledzenieZmianService.usuniete(self.typ_obiektu, od)
+            usuniete.update(
+                obiekt_id for obiekt_id in queryset.model.objects.filter(zmiana).values_list('id', flat=True)
+                if obiekt_id not in obecne
+            )
+
+        response = Response({
+            'pelna': od is None,
+            'zmienione': self.get_serializer(zmienione, many=True).data,
+            'usuniete': sorted(usuniete),
+            'token': token,
+        })
+        response['X-Sync-Token'] = token
+        return response
+
+
+class NarzedzieZeStanamiMixin:
+    """
+    Lista narzędzi z ilościami odczytanymi z tabeli StanMagazynowy
+    (zwykły LEFT JOIN zamiast podzapytań agregujących po egzemplarzach).
+    """
 
     def get_queryset(self):
-        from django.db.models import Value, Subquery, OuterRef
+        from django.db.models import F, Value
         from django.db.models.functions import Coalesce
 
-        # Subquery dla ilości nowych (stan='nowe')
-        nowe_subquery = EgzemplarzNarzedzia.objects.filter(
-            narzedzie_typ=OuterRef('pk'),
-            stan='nowe'
-        ).values('narzedzie_typ').annotate(
-            total=Sum('ilosc_w_komplecie')
-        ).values('total')
-
-        # Subquery dla ilości używanych (stan='uzywane')
-        uzywane_subquery = EgzemplarzNarzedzia.objects.filter(
-            narzedzie_typ=OuterRef('pk'),
-            stan='uzywane'
-        ).values('narzedzie_typ').annotate(
-            total=Sum('ilosc_w_komplecie')
-        ).values('total')
-
-        # Subquery dla ilości w użyciu - sumujemy ilosc_w_komplecie egzemplarzy
-        # które mają AKTYWNE wypożyczenie (wpis w historii bez daty zwrotu)
-        w_uzyciu_subquery = HistoriaUzyciaNarzedzia.objects.filter(
-            egzemplarz__narzedzie_typ=OuterRef('pk'),
-            data_zwrotu__isnull=True
-        ).values('egzemplarz__narzedzie_typ').annotate(
-            total=Sum('egzemplarz__ilosc_w_komplecie')
-        ).values('total')
-
-        queryset = NarzedzieMagazynowe.objects.select_related(
-            'podkategoria__kategoria',
-            'ostatni_dostawca',
-            'domyslna_lokalizacja'
-        ).prefetch_related('egzemplarze').annotate(
-            ilosc_nowych=Coalesce(Subquery(nowe_subquery), Value(0)),
-            ilosc_uzywanych_dostepnych=Coalesce(Subquery(uzywane_subquery), Value(0)),
-            ilosc_w_uzyciu=Coalesce(Subquery(w_uzyciu_subquery), Value(0)),
-        ).annotate(
+        queryset = NarzedzieMagazynowe.objects.annotate(
+            ilosc_nowych=Coalesce(F('stan_magazynowy__ilosc_nowych'), Value(0)),
+            ilosc_uzywanych_dostepnych=Coalesce(F('stan_magazynowy__ilosc_uzywanych_dostepnych'), Value(0)),
+            ilosc_w_uzyciu=Coalesce(F('stan_magazynowy__ilosc_w_uzyciu'), Value(0)),
             # Razem = Nowe + Używane (suma dostępnych sztuk)
-            calkowita_ilosc=Coalesce(Subquery(nowe_subquery), Value(0)) + Coalesce(Subquery(uzywane_subquery), Value(0))
+            calkowita_ilosc=Coalesce(F('stan_magazynowy__calkowita_ilosc'), Value(0)),
+            # Zamówione (wysłane / częściowo odebrane), jeszcze niedostarczone
+            ilosc_w_drodze=Coalesce(F('stan_magazynowy__ilosc_w_drodze'), Value(0)),
         )
         return queryset.order_by('podkategoria__kategoria__nazwa', 'podkategoria__nazwa', 'opis')
 
 
-class NarzedzieMagazynoweZakupyViewSet(viewsets.ReadOnlyModelViewSet):
+class NarzedzieMagazynoweViewSet(
+    SynchronizacjaPrzyrostowaMixin, WarunkowyGetMixin, CacheListyMixin, RelacjeSerializeraMixin,
+    NarzedzieZeStanamiMixin, viewsets.ModelViewSet
+):
     serializer_class = NarzedzieMagazynoweSerializer
+    typ_obiektu = 'narzedzie'
+    # Ilości zmieniają się w StanMagazynowy, nie w wierszu narzędzia
+    pola_zmian = ['data_modyfikacji', 'stan_magazynowy__data_aktualizacji']
+    modele_zrodlowe = MODELE_NARZEDZIA
 
-    def get_queryset(self):
-        from django.db.models import Value, Subquery, OuterRef
-        from django.db.models.functions import Coalesce
 
-        # Subquery dla ilości nowych (stan='nowe')
-        nowe_subquery = EgzemplarzNarzedzia.objects.filter(
-            narzedzie_typ=OuterRef('pk'),
-            stan='nowe'
-        ).values('narzedzie_typ').annotate(
-            total=Sum('ilosc_w_komplecie')
-        ).values('total')
-
-        # Subquery dla ilości używanych (stan='uzywane')
-        uzywane_subquery = EgzemplarzNarzedzia.objects.filter(
-            narzedzie_typ=OuterRef('pk'),
-            stan='uzywane'
-        ).values('narzedzie_typ').annotate(
-            total=Sum('ilosc_w_komplecie')
-        ).values('total')
-
-        # Subquery dla ilości w użyciu - sumujemy ilosc_w_komplecie egzemplarzy
-        # które mają AKTYWNE wypożyczenie (wpis w historii bez daty zwrotu)
-        w_uzyciu_subquery = HistoriaUzyciaNarzedzia.objects.filter(
-            egzemplarz__narzedzie_typ=OuterRef('pk'),
-            data_zwrotu__isnull=True
-        ).values('egzemplarz__narzedzie_typ').annotate(
-            total=Sum('egzemplarz__ilosc_w_komplecie')
-        ).values('total')
-
-        queryset = NarzedzieMagazynowe.objects.select_related(
-            'podkategoria__kategoria',
-            'ostatni_dostawca',
-            'domyslna_lokalizacja'
-        ).prefetch_related('egzemplarze').annotate(
-            ilosc_nowych=Coalesce(Subquery(nowe_subquery), Value(0)),
-            ilosc_uzywanych_dostepnych=Coalesce(Subquery(uzywane_subquery), Value(0)),
-            ilosc_w_uzyciu=Coalesce(Subquery(w_uzyciu_subquery), Value(0)),
-        ).annotate(
-            # Razem = Nowe + Używane (suma dostępnych sztuk)
-            calkowita_ilosc=Coalesce(Subquery(nowe_subquery), Value(0)) + Coalesce(Subquery(uzywane_subquery), Value(0))
-        )
-        return queryset.order_by('podkategoria__kategoria__nazwa', 'podkategoria__nazwa', 'opis')
+class NarzedzieMagazynoweZakupyViewSet(
+    SynchronizacjaPrzyrostowaMixin, WarunkowyGetMixin, CacheListyMixin, RelacjeSerializeraMixin,
+    NarzedzieZeStanamiMixin, viewsets.ReadOnlyModelViewSet
+):
+    serializer_class = NarzedzieMagazynoweSerializer
+    typ_obiektu = 'narzedzie'
+    pola_zmian = NarzedzieMagazynoweViewSet.pola_zmian
+    modele_zrodlowe = MODELE_NARZEDZIA
 
 
-class EgzemplarzNarzedziaViewSet(viewsets.ModelViewSet):
-    queryset = EgzemplarzNarzedzia.objects.select_related(
-        'narzedzie_typ__podkategoria__kategoria',
-        'lokalizacja',
-        'faktura_zakupu'
-    ).all()
+class EgzemplarzNarzedziaViewSet(
+    SynchronizacjaPrzyrostowaMixin, WarunkowyGetMixin, RelacjeSerializeraMixin, viewsets.ModelViewSet
+):
+    queryset = EgzemplarzNarzedzia.objects.all()
     serializer_class = EgzemplarzNarzedziaSerializer
+    modele_zrodlowe = MODELE_EGZEMPLARZA
+    typ_obiektu = 'egzemplarz'
+    pagination_class = KursorPagination
+    ordering = ('-data_zakupu', '-id')
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -808,16 +1034,32 @@ class EgzemplarzNarzedziaViewSet(viewsets.ModelViewSet):
         if narzedzie_typ_id:
             queryset = queryset.filter(narzedzie_typ_id=narzedzie_typ_id)
 
-        return queryset.order_by('-data_zakupu')
+        return queryset.order_by(*self.ordering)
 
+    # Zapis egzemplarza i przeliczenie StanMagazynowy w jednej transakcji
 
-class HistoriaUzyciaNarzedziaViewSet(viewsets.ModelViewSet):
-    queryset = HistoriaUzyciaNarzedzia.objects.select_related(
-        'egzemplarz__narzedzie_typ__podkategoria__kategoria',
-        'maszyna',
-        'pracownik'
-    ).all()
+    @transaction.atomic
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+
+
+class HistoriaUzyciaNarzedziaViewSet(
+    SynchronizacjaPrzyrostowaMixin, WarunkowyGetMixin, RelacjeSerializeraMixin, viewsets.ModelViewSet
+):
+    queryset = HistoriaUzyciaNarzedzia.objects.all()
     serializer_class = HistoriaUzyciaNarzedziaSerializer
+    modele_zrodlowe = MODELE_HISTORII
+    typ_obiektu = 'historia'
+    pagination_class = KursorPagination
+    ordering = ('-data_wydania', '-id')
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -825,12 +1067,12 @@ class HistoriaUzyciaNarzedziaViewSet(viewsets.ModelViewSet):
         w_uzyciu = self.request.query_params.get('w_uzyciu', None)
 
         if narzedzie_id:
-            queryset = queryset.filter(egzemplarz__narzedzie_typ_id=narzedzie_id)
+            queryset = queryset.filter(narzedzie_typ_id=narzedzie_id)
 
         if w_uzyciu and w_uzyciu.lower() == 'true':
             queryset = queryset.filter(data_zwrotu__isnull=True)
 
-        return queryset.order_by('-data_wydania')
+        return queryset.order_by(*self.ordering)
 
     @action(detail=False, methods=['post'])
     def wydanie(self, request):
@@ -897,20 +1139,24 @@ class HistoriaUzyciaNarzedziaViewSet(viewsets.ModelViewSet):
             )
 
 
-class UszkodzenieViewSet(viewsets.ModelViewSet):
-    queryset = Uszkodzenie.objects.select_related(
-        'egzemplarz__narzedzie_typ__podkategoria__kategoria',
-        'pracownik'
-    ).all()
+class UszkodzenieViewSet(WarunkowyGetMixin, RelacjeSerializeraMixin, viewsets.ModelViewSet):
+    queryset = Uszkodzenie.objects.all()
     serializer_class = UszkodzenieSerializer
+    modele_zrodlowe = MODELE_USZKODZENIA
+    pagination_class = KursorPagination
+    ordering = ('-data_uszkodzenia', '-id')
 
     def get_queryset(self):
-        return super().get_queryset().order_by('-data_uszkodzenia')
+        from django.db.models import F
+        return super().get_queryset().annotate(stan_biezacy=F('egzemplarz__stan'))
 
 
-class ZamowienieViewSet(viewsets.ModelViewSet):
-    queryset = Zamowienie.objects.select_related('dostawca').prefetch_related('pozycje').all()
+class ZamowienieViewSet(WarunkowyGetMixin, RelacjeSerializeraMixin, viewsets.ModelViewSet):
+    queryset = Zamowienie.objects.all()
     serializer_class = ZamowienieSerializer
+    modele_zrodlowe = MODELE_ZAMOWIENIA
+    pagination_class = KursorPagination
+    ordering = ('-data_utworzenia', '-id')
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -922,7 +1168,7 @@ class ZamowienieViewSet(viewsets.ModelViewSet):
                 narzedzie_typ_id=narzedzie_id
             ).values_list('zamowienie_id', flat=True).distinct()
             queryset = queryset.filter(id__in=zamowienie_ids)
-        return queryset.order_by('-data_utworzenia')
+        return queryset
 
     @action(detail=False, methods=['post'])
     def generuj_automatyczne(self, request):
@@ -940,12 +1186,12 @@ class ZamowienieViewSet(viewsets.ModelViewSet):
         pass
 
 
-class PozycjaZamowieniaViewSet(viewsets.ModelViewSet):
-    queryset = PozycjaZamowienia.objects.select_related(
-        'zamowienie',
-        'narzedzie_typ__podkategoria__kategoria'
-    ).all()
+class PozycjaZamowieniaViewSet(WarunkowyGetMixin, RelacjeSerializeraMixin, viewsets.ModelViewSet):
+    queryset = PozycjaZamowienia.objects.all()
     serializer_class = PozycjaZamowieniaSerializer
+    modele_zrodlowe = MODELE_ZAMOWIENIA
+    pagination_class = KursorPagination
+    ordering = ('id',)
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -955,12 +1201,12 @@ class PozycjaZamowieniaViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class RealizacjaZamowieniaViewSet(viewsets.ModelViewSet):
-    queryset = RealizacjaZamowienia.objects.select_related(
-        'zamowienie__dostawca',
-        'lokalizacja_domyslna'
-    ).prefetch_related('pozycje').all()
+class RealizacjaZamowieniaViewSet(WarunkowyGetMixin, RelacjeSerializeraMixin, viewsets.ModelViewSet):
+    queryset = RealizacjaZamowienia.objects.all()
     serializer_class = RealizacjaZamowieniaSerializer
+    modele_zrodlowe = MODELE_REALIZACJI
+    pagination_class = KursorPagination
+    ordering = ('-data_realizacji', '-id')
 
     @action(detail=True, methods=['post'])
     def zatwierdz(self, request, pk=None):
@@ -968,13 +1214,12 @@ class RealizacjaZamowieniaViewSet(viewsets.ModelViewSet):
         pass
 
 
-class PozycjaRealizacjiViewSet(viewsets.ModelViewSet):
-    queryset = PozycjaRealizacji.objects.select_related(
-        'realizacja',
-        'pozycja_zamowienia__narzedzie_typ',
-        'lokalizacja'
-    ).all()
+class PozycjaRealizacjiViewSet(WarunkowyGetMixin, RelacjeSerializeraMixin, viewsets.ModelViewSet):
+    queryset = PozycjaRealizacji.objects.all()
     serializer_class = PozycjaRealizacjiSerializer
+    modele_zrodlowe = MODELE_REALIZACJI
+    pagination_class = KursorPagination
+    ordering = ('id',)
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -0,0 +1,145 @@
+"""
+TOOLS/wersje.py
+
+Wersje modeli, cache odpowiedzi API i warunkowe GET (ETag / Last-Modified).
+
+Każdy model ze zbioru MODELE_WERSJONOWANE (signals.py) ma w cache wersję -
+znacznik czasu ostatniej zmiany w nanosekundach, ustawiany przy zapisie
+i usunięciu (sygnały, jawnie po bulk_create / bulk_update w serwisach).
+Z wersji modeli, z których czyta serializer, powstają:
+
+- klucz cache odpowiedzi listy (CacheListyMixin) - dopóki żaden z modeli
+  się nie zmieni, lista serwowana jest z cache bez zapytań SQL,
+- ETag i Last-Modified (WarunkowyGetMixin) - klient z aktualną kopią
+  dostaje 304 zanim zostanie wykonane zapytanie i serializer.
+
+Cache wskazuje settings.TOOLS_CACHE_ODPOWIEDZI (alias z CACHES). Cache
+w pamięci (locmem) wystarcza dla jednego procesu - przy kilku procesach
+wersje muszą być współdzielone (FileBasedCache na jednym serwerze,
+Redis / Memcached przy kilku).
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+# Czas przechowywania odpowiedzi w cache (sekundy)
+CZAS_CACHE_ODPOWIEDZI = 3600
+
+
+def pobierz_cache():
+    return caches[getattr(settings, 'TOOLS_CACHE_ODPOWIEDZI', 'default')]
+
+
+def _klucz_wersji(model):
+    return f'wersja:{model._meta.label_lower}'
+
+
+def wersje(modele):
+    """
+    Krotka bieżących wersji modeli (w kolejności argumentu).
+
+    Wersja utracona z cache (restart, wyparcie) dostaje bieżący czas -
+    nie może powtórzyć wcześniejszej wartości, bo wróciłyby zapisane pod
+    nią nieaktualne odpowiedzi.
+    """
+    cache = pobierz_cache()
+    klucze = [_klucz_wersji(model) for model in modele]
+    znalezione = cache.get_many(klucze)
+
+    for klucz in klucze:
+        if klucz not in znalezione:
+            cache.add(klucz, time.time_ns(), None)
+            znalezione[klucz] = cache.get(klucz)
+
+    return tuple(znalezione[klucz] for klucz in klucze)
+
+
+def _podbij(klucze):
+    # Zwykły zapis zamiast incr - równoległe zmiany nie gubią się
+    # w cache bez atomowego incr (FileBasedCache)
+    pobierz_cache().set_many({klucz: time.time_ns() for klucz in klucze}, None)
+
+
+def podbij_wersje(*modele):
+    """
+    Unieważnia odpowiedzi zależne od modeli.
+
+    Wersja podbijana jest od razu i ponownie po zatwierdzeniu transakcji -
+    odpowiedź zbudowana w międzyczasie z danych sprzed zatwierdzenia
+    trafia pod wersję, której nikt już nie odczyta.
+    """
+    klucze = [_klucz_wersji(model) for model in modele]
+    _podbij(klucze)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _podbij(klucze))
+
+
+def _skrot(request, wersje_modeli):
+    """Skrót ścieżki, hosta (adresy plików), parametrów i wersji modeli."""
+    parametry = sorted(request.query_params.lists())
+    zrodlo = repr((request.path, request.get_host(), parametry, wersje_modeli))
+    return hashlib.md5(zrodlo.encode()).hexdigest()
+
+
+class WarunkowyGetMixin:
+    """
+    ETag i Last-Modified dla list i szczegółów viewsetu.
+
+    Walidatory liczone są z wersji modeli_zrodlowych (bez SQL) - przy
+    zgodnym If-None-Match / If-Modified-Since zwracane jest 304 bez
+    zapytania do bazy i serializacji.
+    """
+
+    # Modele, z których czyta serializer (łącznie z zagnieżdżonymi)
+    modele_zrodlowe = ()
+
+    def _warunkowo(self, metoda, request, *args, **kwargs):
+        wersje_modeli = wersje(self.modele_zrodlowe)
+        etag = f'"{_skrot(request, wersje_modeli)}"'
+        ostatnia_zmiana = max(wersje_modeli) // 1_000_000_000
+
+        response = get_conditional_response(request, etag=etag, last_modified=ostatnia_zmiana)
+        if response is None:
+            response = metoda(request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(ostatnia_zmiana)
+            response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._warunkowo(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._warunkowo(super().retrieve, request, *args, **kwargs)
+
+
+class CacheListyMixin:
+    """
+    Lista viewsetu serwowana z cache, dopóki nie zmieni się żaden
+    z modeli_zrodlowych.
+    """
+
+    modele_zrodlowe = ()
+
+    def list(self, request, *args, **kwargs):
+        cache = pobierz_cache()
+        klucz = f'lista:{_skrot(request, wersje(self.modele_zrodlowe))}'
+
+        dane = cache.get(klucz)
+        if dane is not None:
+            return Response(dane)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            # ReturnList / ReturnDict gubią przy serializacji odwołanie do serializera
+            cache.set(klucz, response.data, CZAS_CACHE_ODPOWIEDZI)
+        return response
@@ -0,0 +1,181 @@
+"""
+TOOLS/zdarzenia.py
+
+Zdarzenia czasu rzeczywistego dla otwartych paneli (magazyn, zakupy).
+
+Serwisy publikują zwięzłe zdarzenia (nowe ilości narzędzia, zmienione
+wypożyczenie) po zatwierdzeniu transakcji, a widok zdarzenia_magazynu_view
+przekazuje je klientom jako server-sent events. Klient łata swój stan
+zamiast pobierać wszystkie dane od nowa.
+
+Broker jest wymienny - klasa wskazana w settings.TOOLS_BROKER_ZDARZEN.
+Domyślny LokalnyBroker rozsyła zdarzenia w obrębie jednego procesu,
+co wystarcza dla runservera, jednego procesu ASGI i testów. Przy kilku
+procesach należy podać broker o tym samym interfejsie (opublikuj,
+subskrybuj, anuluj) oparty np. na Redis pub/sub lub PostgreSQL LISTEN/NOTIFY.
+"""
+
+import asyncio
+import itertools
+import json
+import queue
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# Kanał zdarzeń stanów magazynowych i wypożyczeń
+KANAL_MAGAZYN = 'magazyn'
+
+
+class Subskrypcja:
+    """
+    Kolejka zdarzeń jednego klienta.
+
+    Utworzona wewnątrz pętli asyncio (widok pod ASGI) używa asyncio.Queue,
+    poza nią (WSGI, testy) - queue.Queue. Gdy klient nie nadąża i kolejka
+    się zapełni, kolejne zdarzenia są odrzucane, a klient dostaje zdarzenie
+    'reset' - musi pobrać dane od nowa.
+    """
+
+    def __init__(self, kanal, rozmiar):
+        self.kanal = kanal
+        self.przepelniona = False
+        try:
+            self._petla = asyncio.get_running_loop()
+            self._kolejka = asyncio.Queue(rozmiar)
+        except RuntimeError:
+            self._petla = None
+            self._kolejka = queue.Queue(rozmiar)
+
+    def dostarcz(self, zdarzenie):
+        """Wstawia zdarzenie do kolejki - bezpieczne z dowolnego wątku."""
+        if self._petla is not None:
+            self._petla.call_soon_threadsafe(self._wstaw, zdarzenie)
+        else:
+            self._wstaw(zdarzenie)
+
+    def _wstaw(self, zdarzenie):
+        try:
+            self._kolejka.put_nowait(zdarzenie)
+        except (queue.Full, asyncio.QueueFull):
+            self.przepelniona = True
+
+    def pobierz(self, timeout):
+        """Czeka na zdarzenie (synchronicznie); None po upływie timeout."""
+        try:
+            return self._kolejka.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def apobierz(self, timeout):
+        """Czeka na zdarzenie w pętli asyncio; None po upływie timeout."""
+        try:
+            return await asyncio.wait_for(self._kolejka.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LokalnyBroker:
+    """
+    Broker w pamięci procesu: każde zdarzenie trafia do kolejek wszystkich
+    subskrypcji danego kanału. Zdarzenia dostają rosnący numer (id w SSE).
+    """
+
+    ROZMIAR_KOLEJKI = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subskrypcje = {}
+        self._licznik = itertools.count(1)
+
+    def subskrybuj(self, kanal):
+        subskrypcja = Subskrypcja(kanal, self.ROZMIAR_KOLEJKI)
+        with self._lock:
+            self._subskrypcje.setdefault(kanal, set()).add(subskrypcja)
+        return subskrypcja
+
+    def anuluj(self, subskrypcja):
+        with self._lock:
+            self._subskrypcje.get(subskrypcja.kanal, set()).discard(subskrypcja)
+
+    def opublikuj(self, kanal, zdarzenia):
+        with self._lock:
+            odbiorcy = list(self._subskrypcje.get(kanal, ()))
+            zdarzenia = [{**zdarzenie, 'id': next(self._licznik)} for zdarzenie in zdarzenia]
+
+        for subskrypcja in odbiorcy:
+            for zdarzenie in zdarzenia:
+                try:
+                    subskrypcja.dostarcz(zdarzenie)
+                except RuntimeError:
+                    # Pętla klienta została zamknięta - połączenie już nie istnieje
+                    self.anuluj(subskrypcja)
+                    break
+
+
+@lru_cache(maxsize=None)
+def pobierz_broker():
+    """Broker zdarzeń wskazany w settings.TOOLS_BROKER_ZDARZEN (jeden na proces)."""
+    return import_string(getattr(settings, 'TOOLS_BROKER_ZDARZEN', 'TOOLS.zdarzenia.LokalnyBroker'))()
+
+
+def opublikuj_po_zatwierdzeniu(zdarzenia, kanal=KANAL_MAGAZYN):
+    """
+    Publikuje zdarzenia po zatwierdzeniu bieżącej transakcji - klienci nie
+    zobaczą zmian, które zostały wycofane.
+
+    Args:
+        zdarzenia: Lista słowników z kluczem 'typ' i danymi zdarzenia
+        kanal: Nazwa kanału
+    """
+    if zdarzenia:
+        transaction.on_commit(lambda: pobierz_broker().opublikuj(kanal, zdarzenia))
+
+
+def formatuj_sse(zdarzenie):
+    """Zdarzenie w formacie text/event-stream."""
+    dane = {klucz: wartosc for klucz, wartosc in zdarzenie.items() if klucz not in ('id', 'typ')}
+    return f"id: {zdarzenie['id']}\nevent: {zdarzenie['typ']}\ndata: {json.dumps(dane, default=str)}\n\n"
+
+
+# Odstęp komentarzy podtrzymujących połączenie (sekundy) - pozwala też
+# wykryć rozłączonego klienta, gdy nic się nie dzieje
+ODSTEP_PINGU = 15
+
+# Zdarzenie wysyłane klientowi, który nie nadążył - musi pobrać dane od nowa
+RESET = 'event: reset\ndata: {}\n\n'
+
+
+def strumien_sse(kanal=KANAL_MAGAZYN, odstep_pingu=ODSTEP_PINGU):
+    """Generator text/event-stream dla serwera WSGI (jeden wątek na klienta)."""
+    broker = pobierz_broker()
+    subskrypcja = broker.subskrybuj(kanal)
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            zdarzenie = subskrypcja.pobierz(odstep_pingu)
+            if subskrypcja.przepelniona:
+                yield RESET
+                return
+            yield ': ping\n\n' if zdarzenie is None else formatuj_sse(zdarzenie)
+    finally:
+        broker.anuluj(subskrypcja)
+
+
+async def astrumien_sse(kanal=KANAL_MAGAZYN, odstep_pingu=ODSTEP_PINGU):
+    """Asynchroniczny generator text/event-stream dla serwera ASGI (bez wątku na klienta)."""
+    broker = pobierz_broker()
+    subskrypcja = broker.subskrybuj(kanal)
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            zdarzenie = await subskrypcja.apobierz(odstep_pingu)
+            if subskrypcja.przepelniona:
+                yield RESET
+                return
+            yield ': ping\n\n' if zdarzenie is None else formatuj_sse(zdarzenie)
+    finally:
+        broker.anuluj(subskrypcja)
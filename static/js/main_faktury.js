@@ -67,6 +67,9 @@ createApp({
                 if (!urlWithPageSize.searchParams.has('page_size')) {
                     urlWithPageSize.searchParams.set('page_size', this.pagination.pageSize);
                 }
+                if (!urlWithPageSize.searchParams.has('expand')) {
+                    urlWithPageSize.searchParams.set('expand', 'dostawca');
+                }
 
                 const response = await axios.get(urlWithPageSize.toString());
                 this.faktury = response.data.results;
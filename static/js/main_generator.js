@@ -19,6 +19,10 @@ createApp({
             isDeleting: false,
             isAdding: false,
             isGenerating: false,
+            isSavingBulk: false,
+
+            // Zmiany wprowadzone bezpośrednio w tabeli: { narzedzie_id: { pole: wartość } }
+            pendingChanges: {},
 
             editForm: {
                 id: null,
@@ -29,6 +33,7 @@ createApp({
                 cena_jednostkowa: 0
             },
             editError: '',
+            editCeny: null,
 
             deleteItem: null,
 
@@ -48,6 +53,10 @@ createApp({
     },
 
     computed: {
+        pendingCount() {
+            return Object.keys(this.pendingChanges).length;
+        },
+
         filteredPodkategorie() {
             if (!this.addForm.kategoria_id) return [];
             const kategoria = this.kategorie.find(k => k.id === this.addForm.kategoria_id);
@@ -57,7 +66,7 @@ createApp({
         filteredNarzedzia() {
             if (!this.addForm.podkategoria_id) return [];
             return this.narzedzia.filter(n =>
-                n.podkategoria && n.podkategoria.id === this.addForm.podkategoria_id
+                n.podkategoria === this.addForm.podkategoria_id
             );
         }
     },
@@ -97,7 +106,9 @@ createApp({
 
         async fetchKategorie() {
             try {
-                const response = await axios.get(`${API_URL}/kategorie/`);
+                const response = await axios.get(`${API_URL}/kategorie/`, {
+                    params: { expand: 'podkategorie' }
+                });
                 this.kategorie = response.data;
             } catch (error) {
                 console.error("Błąd ładowania kategorii:", error);
@@ -106,7 +117,9 @@ createApp({
 
         async fetchNarzedzia() {
             try {
-                const response = await axios.get(`${API_URL}/narzedzia/`);
+                const response = await axios.get(`${API_URL}/narzedzia/`, {
+                    params: { fields: 'id,opis,numer_katalogowy,opakowanie,podkategoria' }
+                });
                 this.narzedzia = response.data.results || response.data;
             } catch (error) {
                 console.error("Błąd ładowania narzędzi:", error);
@@ -118,7 +131,8 @@ createApp({
 
             try {
                 const response = await axios.get(`${API_URL}/generator-zamowien/`);
-                this.toolsToOrder = response.data;
+                // Niezapisane zmiany z tabeli nakładane są na świeże dane
+                this.toolsToOrder = response.data.map(tool => ({ ...tool, ...(this.pendingChanges[tool.id] || {}) }));
 
             } catch (error) {
                 console.error("Błąd ładowania narzędzi do zamówienia:", error.response?.data || error.message);
@@ -204,21 +218,84 @@ createApp({
                 cena_jednostkowa: tool.cena_jednostkowa || 0
             };
             this.editError = '';
+            this.editCeny = null;
+            this.fetchCeny(tool.id);
 
             if (this.modals.editModal) {
                 this.modals.editModal.show();
             }
         },
 
+        async fetchCeny(narzedzieId) {
+            try {
+                const response = await axios.get(`${API_URL}/generator-zamowien/${narzedzieId}/ceny/`);
+                if (this.editForm.id === narzedzieId) {
+                    this.editCeny = response.data;
+                }
+            } catch (error) {
+                console.error("Błąd ładowania cen:", error);
+            }
+        },
+
+        onEditDostawcaChange() {
+            // Podpowiedz ostatnią cenę u wybranego dostawcy
+            if (!this.editCeny) return;
+            const cena = this.editCeny.aktualne.find(c => c.dostawca_id === this.editForm.dostawca_id);
+            if (cena) {
+                this.editForm.cena_jednostkowa = cena.cena_jednostkowa;
+            }
+        },
+
+        markChanged(tool, field) {
+            this.pendingChanges[tool.id] = {
+                ...(this.pendingChanges[tool.id] || {}),
+                [field]: tool[field]
+            };
+        },
+
+        async saveBulk() {
+            if (this.pendingCount === 0) return;
+            this.isSavingBulk = true;
+
+            const pozycje = Object.entries(this.pendingChanges).map(([id, zmiany]) => ({ id: Number(id), ...zmiany }));
+
+            try {
+                const response = await axios.patch(`${API_URL}/generator-zamowien/bulk-update/`, { pozycje });
+                this.applyBulkResult(response.data);
+            } catch (error) {
+                console.error("Błąd zapisu zbiorczego:", error);
+                if (error.response?.data?.bledy) {
+                    this.applyBulkResult(error.response.data);
+                } else {
+                    alert('Wystąpił błąd podczas zapisu: ' + (error.response?.data?.error || error.message));
+                }
+            } finally {
+                this.isSavingBulk = false;
+            }
+        },
+
+        applyBulkResult(data) {
+            // Zapisane wiersze znikają z listy zmian, błędne zostają do poprawy
+            (data.zaktualizowane || []).forEach(id => delete this.pendingChanges[id]);
+            if (data.bledy && data.bledy.length) {
+                alert('Nie zapisano części pozycji:\n' + data.bledy.map(b => `#${b.id}: ${b.error}`).join('\n'));
+            }
+        },
+
         async saveEdit() {
             this.isSaving = true;
             this.editError = '';
 
             try {
-                await axios.patch(
-                    `${API_URL}/generator-zamowien/${this.editForm.id}/update/`,
-                    this.editForm
+                const response = await axios.patch(
+                    `${API_URL}/generator-zamowien/bulk-update/`,
+                    { pozycje: [this.editForm] }
                 );
+                if (response.data.bledy.length) {
+                    this.editError = response.data.bledy[0].error;
+                    return;
+                }
+                delete this.pendingChanges[this.editForm.id];
 
                 if (this.modals.editModal) {
                     this.modals.editModal.hide();
@@ -228,7 +305,9 @@ createApp({
 
             } catch (error) {
                 console.error("Błąd zapisu:", error);
-                this.editError = error.response?.data?.error || 'Wystąpił błąd podczas zapisu';
+                this.editError = error.response?.data?.bledy?.[0]?.error
+                    || error.response?.data?.error
+                    || 'Wystąpił błąd podczas zapisu';
             } finally {
                 this.isSaving = false;
             }
@@ -273,6 +352,11 @@ createApp({
                 return;
             }
 
+            if (this.pendingCount > 0) {
+                alert('Zapisz zmiany w tabeli przed utworzeniem zamówień.');
+                return;
+            }
+
             // Otwórz modal potwierdzenia
             if (this.modals.confirmOrderModal) {
                 this.modals.confirmOrderModal.show();
@@ -14,6 +14,8 @@ createApp({
             podkategorie: [], // Płaska lista podkategorii dla modali
             invoices: [],
             damages: [],
+            damagesNext: null, // Kursor kolejnej strony archiwum uszkodzeń
+            isLoadingMoreDamages: false,
 
             // Filtry
             selectedKategoriaId: null,
@@ -105,12 +107,33 @@ createApp({
                 ]);
                 this.tools = toolsRes.data;
                 this.kategorie = categoriesRes.data;
-                this.damages = damagesRes.data;
+                this.damages = damagesRes.data.results;
+                this.damagesNext = damagesRes.data.next;
                 this.podkategorie = podkategorieRes.data;
             } catch (error) {
                 console.error("Błąd ładowania danych początkowych:", error);
             }
         },
+        async loadMoreDamages() {
+            if (!this.damagesNext || this.isLoadingMoreDamages) return;
+            this.isLoadingMoreDamages = true;
+            try {
+                const response = await axios.get(this.damagesNext);
+                this.damages.push(...response.data.results);
+                this.damagesNext = response.data.next;
+            } catch (error) {
+                console.error("Błąd ładowania uszkodzeń:", error.response?.data || error.message);
+            } finally {
+                this.isLoadingMoreDamages = false;
+            }
+        },
+        onDamagesScroll(event) {
+            // Kolejna strona, gdy lista jest przewinięta prawie do końca
+            const el = event.target;
+            if (el.scrollTop + el.clientHeight >= el.scrollHeight - 100) {
+                this.loadMoreDamages();
+            }
+        },
         // Resetuje filtr podkategorii, gdy zmienia się kategoria główna
         onKategoriaChange() {
             this.selectedPodkategoriaId = null;
@@ -6,6 +6,12 @@
 const { createApp } = Vue;
 const API_URL = '/api';
 
+// Zagnieżdżone obiekty pobierane z API (?expand=) - domyślnie relacje to same ID
+const EXPAND_TOOL = 'podkategoria,domyslna_lokalizacja';
+const EXPAND_USAGE_IN_USE = 'egzemplarz.narzedzie_typ.podkategoria.kategoria,maszyna,pracownik';
+const EXPAND_TOOL_HISTORY = 'maszyna,pracownik,pracownik_zwracajacy';
+const EXPAND_INSTANCE = 'narzedzie_typ.podkategoria.kategoria,lokalizacja,faktura_zakupu';
+
 axios.defaults.xsrfCookieName = 'csrftoken';
 axios.defaults.xsrfHeaderName = 'X-CSRFToken';
 
@@ -16,14 +22,19 @@ createApp({
         return {
             tools: [],
             kategorie: [],
-            podkategorie: [],
             machines: [],
             pracownicy: [],
-            faktury: [],
             zamowienia: [],
             usagesInUse: [],
+            syncTokens: { tools: null, usages: null },
+            liveSync: false,
+            liveSyncConnected: false,
             toolInstances: [],
             toolHistory: [],
+            // Adresy kolejnych stron (stronicowanie kursorem) - null gdy wczytano wszystko
+            toolInstancesNext: null,
+            toolHistoryNext: null,
+            isLoadingMore: false,
             locations: [],
 
             selectedKategoriaId: null,
@@ -106,12 +117,6 @@ createApp({
             return kategoria ? kategoria.podkategorie : [];
         },
 
-        unsettledInvoices() {
-            return this.faktury
-                .filter(f => !f.rozliczone)
-                .sort((a, b) => new Date(b.data_wystawienia) - new Date(a.data_wystawienia));
-        },
-
         sortedLocations() {
             return [...this.locations].sort((a, b) => {
                 if (a.szafa < b.szafa) return -1;
@@ -171,6 +176,7 @@ createApp({
     async mounted() {
         this.initModals();
         await this.fetchInitialData();
+        this.connectLiveUpdates();
     },
 
     methods: {
@@ -196,8 +202,8 @@ createApp({
             this.isLoading = true;
 
             try {
-                const responses = await this.fetchAllApiData();
-                this.assignFetchedData(responses);
+                const data = await this.fetchAllApiData();
+                this.assignFetchedData(data);
             } catch (error) {
                 this.handleFetchError(error);
             } finally {
@@ -206,51 +212,120 @@ createApp({
         },
 
         async fetchAllApiData() {
-            const [
-                toolsRes,
-                categoriesRes,
-                machinesRes,
-                usagesRes,
-                locationsRes,
-                podkategorieRes,
-                pracownicyRes,
-                fakturyRes,
-                zamowieniaRes
-            ] = await Promise.all([
-                axios.get(`${API_URL}/narzedzia/`),
-                axios.get(`${API_URL}/kategorie/`),
-                axios.get(`${API_URL}/maszyny/`),
-                axios.get(`${API_URL}/historia/?w_uzyciu=true`),
-                axios.get(`${API_URL}/lokalizacje/`),
-                axios.get(`${API_URL}/podkategorie/`),
-                axios.get(`${API_URL}/pracownicy/`),
-                axios.get(`${API_URL}/faktury/`),
-                axios.get(`${API_URL}/zamowienia/`)
-            ]);
-
-            return {
-                toolsRes,
-                categoriesRes,
-                machinesRes,
-                usagesRes,
-                locationsRes,
-                podkategorieRes,
-                pracownicyRes,
-                fakturyRes,
-                zamowieniaRes
+            // Jedno zapytanie z danymi startowymi; przeglądarka rewaliduje je ETagiem
+            const response = await axios.get(`${API_URL}/magazyn/bootstrap/`);
+            return response.data;
+        },
+
+        assignFetchedData(data) {
+            this.tools = data.narzedzia;
+            this.usagesInUse = data.wypozyczenia;
+            this.syncTokens = {
+                tools: data.tokeny.narzedzia,
+                usages: data.tokeny.wypozyczenia
             };
+            this.kategorie = data.kategorie;
+            this.machines = data.maszyny;
+            this.locations = data.lokalizacje;
+            this.pracownicy = data.pracownicy;
+            this.zamowienia = data.zamowienia;
+        },
+
+        connectLiveUpdates() {
+            // Zdarzenia z serwera (SSE) - zmiany stanów i wypożyczeń z innych stanowisk
+            if (!window.EventSource) return;
+
+            const source = new EventSource(`${API_URL}/zdarzenia/magazyn/`);
+
+            source.onopen = () => {
+                // Po ponownym połączeniu część zdarzeń mogła umknąć
+                if (this.liveSyncConnected) {
+                    this.fetchChanges();
+                }
+                this.liveSync = true;
+                this.liveSyncConnected = true;
+            };
+            source.onerror = () => {
+                this.liveSync = false;
+            };
+            source.addEventListener('stan', (e) => this.applyStockEvent(JSON.parse(e.data)));
+            source.addEventListener('wypozyczenie', (e) => this.applyLoanEvent(JSON.parse(e.data)));
+            source.addEventListener('reset', () => this.fetchChanges());
+        },
+
+        applyStockEvent(event) {
+            const tool = this.tools.find(t => t.id === event.narzedzie_id);
+            if (tool) {
+                Object.assign(tool, event.stan);
+            }
+        },
+
+        async applyLoanEvent(event) {
+            const index = this.usagesInUse.findIndex(u => u.id === event.historia_id);
+
+            if (!event.aktywne) {
+                if (index !== -1) this.usagesInUse.splice(index, 1);
+            } else {
+                try {
+                    const response = await axios.get(`${API_URL}/historia/${event.historia_id}/`, {
+                        params: { expand: EXPAND_USAGE_IN_USE }
+                    });
+                    const current = this.usagesInUse.findIndex(u => u.id === event.historia_id);
+                    if (current !== -1) {
+                        this.usagesInUse.splice(current, 1, response.data);
+                    } else {
+                        this.usagesInUse.unshift(response.data);
+                    }
+                } catch (error) {
+                    console.error("Błąd pobierania wypożyczenia:", error.response?.data || error.message);
+                }
+            }
+
+            if (this.selectedToolForDetails && this.selectedToolForDetails.id === event.narzedzie_id) {
+                await this.getToolInstances(this.selectedToolForDetails);
+            }
+        },
+
+        async fetchChanges() {
+            // Synchronizacja przyrostowa - tylko wiersze zmienione i usunięte od ostatniego pobrania
+            if (!this.syncTokens.tools || !this.syncTokens.usages) {
+                return this.fetchInitialData();
+            }
+
+            try {
+                const [toolsRes, usagesRes] = await Promise.all([
+                    axios.get(`${API_URL}/narzedzia/`, {
+                        params: { since: this.syncTokens.tools, expand: EXPAND_TOOL }
+                    }),
+                    axios.get(`${API_URL}/historia/`, {
+                        params: { w_uzyciu: 'true', since: this.syncTokens.usages, expand: EXPAND_USAGE_IN_USE }
+                    })
+                ]);
+
+                this.tools = this.mergeChanges(this.tools, toolsRes.data);
+                this.usagesInUse = this.mergeChanges(this.usagesInUse, usagesRes.data);
+                this.syncTokens = { tools: toolsRes.data.token, usages: usagesRes.data.token };
+            } catch (error) {
+                this.handleFetchError(error);
+            }
         },
 
-        assignFetchedData(responses) {
-            this.tools = responses.toolsRes.data.results || responses.toolsRes.data;
-            this.kategorie = responses.categoriesRes.data;
-            this.machines = responses.machinesRes.data;
-            this.usagesInUse = responses.usagesRes.data.results || responses.usagesRes.data;
-            this.locations = responses.locationsRes.data;
-            this.podkategorie = responses.podkategorieRes.data;
-            this.pracownicy = responses.pracownicyRes.data.results || responses.pracownicyRes.data;
-            this.faktury = responses.fakturyRes.data.results || responses.fakturyRes.data;
-            this.zamowienia = responses.zamowieniaRes.data.results || responses.zamowieniaRes.data;
+        mergeChanges(rows, delta) {
+            if (delta.pelna) {
+                return delta.zmienione;
+            }
+
+            const removed = new Set(delta.usuniete);
+            const changed = new Map(delta.zmienione.map(row => [row.id, row]));
+            const merged = rows
+                .filter(row => !removed.has(row.id))
+                .map(row => changed.get(row.id) || row);
+
+            const known = new Set(merged.map(row => row.id));
+            delta.zmienione.forEach(row => {
+                if (!known.has(row.id)) merged.push(row);
+            });
+            return merged;
         },
 
         handleFetchError(error) {
@@ -267,6 +342,8 @@ createApp({
                 this.selectedToolForDetails = null;
                 this.toolInstances = [];
                 this.toolHistory = [];
+                this.toolInstancesNext = null;
+                this.toolHistoryNext = null;
                 return;
             }
 
@@ -281,12 +358,15 @@ createApp({
             this.isLoadingDetails = true;
 
             try {
-                const response = await axios.get(`${API_URL}/egzemplarze/?narzedzie_typ_id=${tool.id}`);
-                const instances = response.data.results || response.data;
-                this.toolInstances = instances.sort((a, b) => b.id - a.id);
+                const response = await axios.get(`${API_URL}/egzemplarze/`, {
+                    params: { narzedzie_typ_id: tool.id, expand: EXPAND_INSTANCE }
+                });
+                this.toolInstances = response.data.results;
+                this.toolInstancesNext = response.data.next;
             } catch (error) {
                 console.error("Błąd ładowania egzemplarzy:", error.response?.data || error.message);
                 this.toolInstances = [];
+                this.toolInstancesNext = null;
             } finally {
                 this.isLoadingDetails = false;
             }
@@ -296,19 +376,57 @@ createApp({
             this.isLoadingHistory = true;
 
             try {
-                const response = await axios.get(`${API_URL}/historia/?narzedzie_id=${tool.id}`);
-                const history = response.data.results || response.data;
-                this.toolHistory = history.sort((a, b) =>
-                    new Date(b.data_wydania) - new Date(a.data_wydania)
-                );
+                const response = await axios.get(`${API_URL}/historia/`, {
+                    params: { narzedzie_id: tool.id, expand: EXPAND_TOOL_HISTORY }
+                });
+                // Strony przychodzą już od najnowszych wpisów
+                this.toolHistory = response.data.results;
+                this.toolHistoryNext = response.data.next;
             } catch (error) {
                 console.error("Błąd ładowania historii narzędzia:", error.response?.data || error.message);
                 this.toolHistory = [];
+                this.toolHistoryNext = null;
             } finally {
                 this.isLoadingHistory = false;
             }
         },
 
+        async loadMoreInstances() {
+            if (!this.toolInstancesNext || this.isLoadingMore) return;
+            this.isLoadingMore = true;
+            try {
+                const response = await axios.get(this.toolInstancesNext);
+                this.toolInstances.push(...response.data.results);
+                this.toolInstancesNext = response.data.next;
+            } catch (error) {
+                console.error("Błąd ładowania egzemplarzy:", error.response?.data || error.message);
+            } finally {
+                this.isLoadingMore = false;
+            }
+        },
+
+        async loadMoreHistory() {
+            if (!this.toolHistoryNext || this.isLoadingMore) return;
+            this.isLoadingMore = true;
+            try {
+                const response = await axios.get(this.toolHistoryNext);
+                this.toolHistory.push(...response.data.results);
+                this.toolHistoryNext = response.data.next;
+            } catch (error) {
+                console.error("Błąd ładowania historii narzędzia:", error.response?.data || error.message);
+            } finally {
+                this.isLoadingMore = false;
+            }
+        },
+
+        onDetailsScroll(event, loadMore) {
+            // Kolejna strona, gdy lista jest przewinięta prawie do końca
+            const el = event.target;
+            if (el.scrollTop + el.clientHeight >= el.scrollHeight - 100) {
+                loadMore();
+            }
+        },
+
         filterByPodkategoria(tools) {
             return tools.filter(tool => {
                 return tool.podkategoria && tool.podkategoria.id === this.selectedPodkategoriaId;
@@ -437,7 +555,10 @@ createApp({
                     this.modals.issueModal.hide();
                 }
 
-                await this.fetchInitialData();
+                if (!this.liveSync) {
+                    // Bez połączenia ze strumieniem zdarzeń pobierz zmiany
+                    await this.fetchChanges();
+                }
 
                 if (this.selectedToolForDetails) {
                     await this.getToolInstances(this.selectedToolForDetails);
@@ -479,7 +600,10 @@ createApp({
                     this.modals.returnModal.hide();
                 }
 
-                await this.fetchInitialData();
+                if (!this.liveSync) {
+                    // Bez połączenia ze strumieniem zdarzeń pobierz zmiany
+                    await this.fetchChanges();
+                }
 
                 if (this.selectedToolForDetails) {
                     await this.getToolInstances(this.selectedToolForDetails);
@@ -596,7 +720,7 @@ createApp({
                     this.modals.toolModal.hide();
                 }
 
-                await this.fetchInitialData();
+                await this.fetchChanges();
             } catch (error) {
                 console.error("Błąd zapisu typu narzędzia:", error.response?.data || error.message);
                 this.toolValidationError = 'Wystąpił błąd zapisu narzędzia: ' + JSON.stringify(error.response?.data || error.message);
@@ -696,7 +820,10 @@ createApp({
                     await this.getToolInstances(this.selectedToolForDetails);
                 }
 
-                await this.fetchInitialData();
+                if (!this.liveSync) {
+                    // Bez połączenia ze strumieniem zdarzeń pobierz zmiany
+                    await this.fetchChanges();
+                }
 
             } catch (error) {
                 this.handleSaveInstanceError(error, ilosc);
@@ -780,7 +907,10 @@ createApp({
                     await this.getToolInstances(this.selectedToolForDetails);
                 }
 
-                await this.fetchInitialData();
+                if (!this.liveSync) {
+                    // Bez połączenia ze strumieniem zdarzeń pobierz zmiany
+                    await this.fetchChanges();
+                }
                 this.instanceToDelete = null;
             } catch (error) {
                 console.error("Błąd usuwania egzemplarza:", error.response?.data || error.message);
@@ -12,7 +12,10 @@ createApp({
     data() {
         return {
             damages: [],
+            // Adres kolejnej strony (stronicowanie kursorem) - null gdy wczytano wszystko
+            nextPage: null,
             isLoading: false,
+            isLoadingMore: false,
         };
     },
 
@@ -37,7 +40,8 @@ createApp({
             this.isLoading = true;
             try {
                 const response = await axios.get(`${API_URL}/uszkodzenia/`);
-                this.damages = response.data.results || response.data;
+                this.damages = response.data.results;
+                this.nextPage = response.data.next;
             } catch (error) {
                 console.error('Błąd pobierania uszkodzeń:', error);
             } finally {
@@ -45,6 +49,28 @@ createApp({
             }
         },
 
+        async loadMore() {
+            if (!this.nextPage || this.isLoadingMore) return;
+            this.isLoadingMore = true;
+            try {
+                const response = await axios.get(this.nextPage);
+                this.damages.push(...response.data.results);
+                this.nextPage = response.data.next;
+            } catch (error) {
+                console.error('Błąd pobierania uszkodzeń:', error);
+            } finally {
+                this.isLoadingMore = false;
+            }
+        },
+
+        onScroll(event) {
+            // Kolejna strona, gdy lista jest przewinięta prawie do końca
+            const el = event.target;
+            if (el.scrollTop + el.clientHeight >= el.scrollHeight - 100) {
+                this.loadMore();
+            }
+        },
+
         formatCustomDate(dateString) {
             if (!dateString) return '-';
             const date = new Date(dateString);
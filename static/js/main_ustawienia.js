@@ -75,7 +75,7 @@ createApp({
         async fetchAllData() {
             try {
                 const [katRes, macRes, locRes, supRes, praRes] = await Promise.all([
-                    axios.get(`${API_URL}/kategorie/`),
+                    axios.get(`${API_URL}/kategorie/`, { params: { expand: 'podkategorie' } }),
                     axios.get(`${API_URL}/maszyny/`),
                     axios.get(`${API_URL}/lokalizacje/`),
                     axios.get(`${API_URL}/dostawcy/`),
@@ -130,7 +130,7 @@ createApp({
             } else {
                 this.modal.title = `Edytuj ${type}`;
                 if(type === 'podkategoria') {
-                    this.modal.currentItem = { ...item, kategoria: item.kategoria.id };
+                    this.modal.currentItem = { ...item };
                 } else {
                     this.modal.currentItem = { ...item };
                 }
@@ -13,7 +13,7 @@ createApp({
             kategorie: [],
             podkategorie: [],
             orders: [], // Zamówienia powiązane z narzędziem
-            damages: [],
+            ordersNext: null, // Adres kolejnej strony zamówień (stronicowanie kursorem)
 
             selectedKategoriaId: null,
             selectedPodkategoriaId: null,
@@ -21,6 +21,7 @@ createApp({
             selectedTool: null,
             searchQuery: '',
             isLoadingOrders: false,
+            isLoadingMoreOrders: false,
             modals: {},
             isEditMode: false,
             currentTool: {},
@@ -57,6 +58,7 @@ createApp({
     async mounted() {
         this.initModals();
         await this.fetchInitialData();
+        this.connectLiveUpdates();
     },
     methods: {
         initModals() {
@@ -67,23 +69,44 @@ createApp({
 
         async fetchInitialData() {
             try {
-                const [toolsRes, categoriesRes, damagesRes, podkategorieRes] = await Promise.all([
-                    axios.get(`${API_URL}/narzedzia-zakupy/`),
-                    axios.get(`${API_URL}/kategorie/`),
-                    axios.get(`${API_URL}/uszkodzenia/`),
+                const [toolsRes, categoriesRes, podkategorieRes] = await Promise.all([
+                    axios.get(`${API_URL}/narzedzia-zakupy/`, { params: { expand: 'podkategoria.kategoria' } }),
+                    axios.get(`${API_URL}/kategorie/`, { params: { expand: 'podkategorie' } }),
                     axios.get(`${API_URL}/podkategorie/`)
                 ]);
 
                 this.tools = toolsRes.data.results || toolsRes.data;
                 this.kategorie = categoriesRes.data;
-                this.damages = (damagesRes.data.results || damagesRes.data)
-                    .sort((a, b) => new Date(b.data_uszkodzenia) - new Date(a.data_uszkodzenia));
                 this.podkategorie = podkategorieRes.data;
             } catch (error) {
                 console.error("Błąd ładowania danych początkowych:", error.response?.data || error.message);
             }
         },
 
+        connectLiveUpdates() {
+            // Zdarzenia z serwera (SSE) - ilości zmienione na magazynie i w zamówieniach
+            if (!window.EventSource) return;
+
+            let connected = false;
+            const source = new EventSource(`${API_URL}/zdarzenia/magazyn/`);
+
+            source.onopen = () => {
+                // Po ponownym połączeniu część zdarzeń mogła umknąć
+                if (connected) {
+                    this.fetchInitialData();
+                }
+                connected = true;
+            };
+            source.addEventListener('stan', (e) => {
+                const event = JSON.parse(e.data);
+                const tool = this.tools.find(t => t.id === event.narzedzie_id);
+                if (tool) {
+                    Object.assign(tool, event.stan);
+                }
+            });
+            source.addEventListener('reset', () => this.fetchInitialData());
+        },
+
         onKategoriaChange() {
             this.selectedPodkategoriaId = null;
         },
@@ -203,22 +226,17 @@ createApp({
             console.log(`Pobieranie zamówień dla narzędzia ID: ${tool.id}`);
             this.isLoadingOrders = true;
             this.orders = [];
+            this.ordersNext = null;
 
             try {
-                const url = `${API_URL}/zamowienia/?narzedzie_id=${tool.id}`;
+                const url = `${API_URL}/zamowienia/?narzedzie_id=${tool.id}&expand=dostawca`;
                 console.log(`Wysyłanie zapytania GET na: ${url}`);
                 const response = await axios.get(url);
                 console.log("Otrzymano odpowiedź dla zamówień:", JSON.parse(JSON.stringify(response.data)));
 
-                let results = response.data.results || response.data;
-                if (!Array.isArray(results)) {
-                    results = [];
-                }
-
-                // Sortowanie od najnowszych do najstarszych
-                this.orders = results.sort((a, b) =>
-                    new Date(b.data_utworzenia) - new Date(a.data_utworzenia)
-                );
+                // Strony przychodzą już od najnowszych zamówień
+                this.orders = response.data.results || [];
+                this.ordersNext = response.data.next;
 
                 console.log("Stan this.orders po przypisaniu:", JSON.parse(JSON.stringify(this.orders)));
 
@@ -233,6 +251,20 @@ createApp({
             }
         },
 
+        async loadMoreOrders() {
+            if (!this.ordersNext || this.isLoadingMoreOrders) return;
+            this.isLoadingMoreOrders = true;
+            try {
+                const response = await axios.get(this.ordersNext);
+                this.orders.push(...response.data.results);
+                this.ordersNext = response.data.next;
+            } catch (error) {
+                console.error("Błąd ładowania zamówień:", error.response?.data || error.message);
+            } finally {
+                this.isLoadingMoreOrders = false;
+            }
+        },
+
         getStatusLabel(status) {
             const labels = {
                 'draft': 'Szkic',
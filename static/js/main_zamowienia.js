@@ -2,6 +2,8 @@
 
 const { createApp } = Vue;
 const API_URL = '/api';
+// Zagnieżdżone obiekty w liście zamówień (domyślnie API zwraca ID)
+const EXPAND_ZAMOWIENIA = 'dostawca,pozycje';
 
 axios.defaults.xsrfCookieName = 'csrftoken';
 axios.defaults.xsrfHeaderName = 'X-CSRFToken';
@@ -12,6 +14,9 @@ createApp({
     data() {
         return {
             zamowienia: [],
+            // Adres kolejnej strony zamówień (stronicowanie kursorem) - null gdy wczytano wszystko
+            zamowieniaNext: null,
+            isLoadingMore: false,
             dostawcy: [],
             narzedzia: [],
             selectedZamowienie: null,
@@ -78,12 +83,13 @@ createApp({
         async fetchInitialData() {
             try {
                 const [zamowieniaRes, dostawcyRes, narzedziaRes] = await Promise.all([
-                    axios.get(`${API_URL}/zamowienia/`),
+                    axios.get(`${API_URL}/zamowienia/`, { params: { expand: EXPAND_ZAMOWIENIA } }),
                     axios.get(`${API_URL}/dostawcy/`),
                     axios.get(`${API_URL}/narzedzia/`)
                 ]);
 
-                this.zamowienia = zamowieniaRes.data;
+                this.zamowienia = zamowieniaRes.data.results;
+                this.zamowieniaNext = zamowieniaRes.data.next;
                 this.dostawcy = dostawcyRes.data;
                 this.narzedzia = narzedziaRes.data.results || narzedziaRes.data;
             } catch (error) {
@@ -94,13 +100,36 @@ createApp({
 
         async fetchZamowienia() {
             try {
-                const response = await axios.get(`${API_URL}/zamowienia/`);
-                this.zamowienia = response.data;
+                const response = await axios.get(`${API_URL}/zamowienia/`, { params: { expand: EXPAND_ZAMOWIENIA } });
+                this.zamowienia = response.data.results;
+                this.zamowieniaNext = response.data.next;
             } catch (error) {
                 console.error("Błąd ładowania zamówień:", error);
             }
         },
 
+        async loadMoreZamowienia() {
+            if (!this.zamowieniaNext || this.isLoadingMore) return;
+            this.isLoadingMore = true;
+            try {
+                const response = await axios.get(this.zamowieniaNext);
+                this.zamowienia.push(...response.data.results);
+                this.zamowieniaNext = response.data.next;
+            } catch (error) {
+                console.error("Błąd ładowania zamówień:", error);
+            } finally {
+                this.isLoadingMore = false;
+            }
+        },
+
+        onScroll(event) {
+            // Kolejna strona, gdy lista jest przewinięta prawie do końca
+            const el = event.target;
+            if (el.scrollTop + el.clientHeight >= el.scrollHeight - 100) {
+                this.loadMoreZamowienia();
+            }
+        },
+
         selectZamowienie(zamowienie) {
             this.selectedZamowienie = zamowienie;
             if (this.modals.detailsModal) {
@@ -126,7 +155,7 @@ createApp({
             this.isSendingEmail = true;
 
             try {
-                // TODO: Endpoint do wysyłki email
+                // Email trafia do kolejki - wysyła go proces w tle
                 const response = await axios.post(`${API_URL}/zamowienia/${this.selectedEmailZamowienie.id}/wyslij-email/`);
 
                 if (this.modals.emailConfirmModal) {
@@ -135,14 +164,14 @@ createApp({
 
                 this.emailResult = {
                     success: true,
-                    message: 'Email został wysłany pomyślnie!'
+                    message: response.data.message || 'Email został dodany do kolejki wysyłki.'
                 };
 
                 if (this.modals.emailResultModal) {
                     this.modals.emailResultModal.show();
                 }
 
-                await this.fetchZamowienia();
+                this.sledzWysylke(response.data.job_id);
 
             } catch (error) {
                 console.error("Błąd wysyłki email:", error);
@@ -164,6 +193,67 @@ createApp({
             }
         },
 
+        async wyslijWszystkieRobocze() {
+            if (!confirm('Czy na pewno chcesz wysłać e-mailem wszystkie zamówienia robocze?')) {
+                return;
+            }
+
+            this.isSendingEmail = true;
+            try {
+                const response = await axios.post(`${API_URL}/email/wyslij-zamowienia/`);
+                const nieudane = response.data.wyniki.filter(w => w.status !== 'wyslane');
+
+                this.emailResult = {
+                    success: response.data.success,
+                    message: [response.data.message, ...nieudane.map(w => `${w.numer}: ${w.message}`)].join('\n')
+                };
+                await this.fetchZamowienia();
+            } catch (error) {
+                console.error("Błąd wysyłki zamówień:", error);
+                this.emailResult = {
+                    success: false,
+                    message: error.response?.data?.error || 'Wystąpił błąd podczas wysyłki zamówień'
+                };
+            } finally {
+                this.isSendingEmail = false;
+            }
+
+            if (this.modals.emailResultModal) {
+                this.modals.emailResultModal.show();
+            }
+        },
+
+        async sledzWysylke(jobId, proba = 0) {
+            // Sprawdza stan wiadomości w kolejce, aż zostanie wysłana lub odrzucona
+            if (!jobId || proba >= 40) return;
+            try {
+                const response = await axios.get(`${API_URL}/email/zadania/${jobId}/`);
+                const zadanie = response.data;
+
+                if (zadanie.status === 'wyslana') {
+                    this.emailResult = {
+                        success: true,
+                        message: `Email został wysłany na adres: ${zadanie.odbiorca}`
+                    };
+                    await this.fetchZamowienia();
+                    return;
+                }
+                if (zadanie.status === 'blad') {
+                    this.emailResult = {
+                        success: false,
+                        message: `Nie udało się wysłać emaila: ${zadanie.ostatni_blad}`
+                    };
+                    if (this.modals.emailResultModal) {
+                        this.modals.emailResultModal.show();
+                    }
+                    return;
+                }
+            } catch (error) {
+                console.error("Błąd sprawdzania stanu wysyłki:", error);
+            }
+            setTimeout(() => this.sledzWysylke(jobId, proba + 1), 3000);
+        },
+
         openDeleteConfirmModal(zamowienie) {
             this.selectedDeleteZamowienie = zamowienie;
             if (this.modals.deleteConfirmModal) {